@@ -0,0 +1,291 @@
+"""
+Async Pipeline Core for Salon Voice Assistant
+asyncio building blocks for a call: a streaming Ollama client on raw sockets,
+per-stage deadlines, executor offloading for blocking STT/TTS and
+cancellable turns (barge-in) - no polling loops or shared flags between threads
+"""
+
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+OLLAMA_API_URL = os.environ.get("OLLAMA_API_URL", "http://localhost:11434/api/generate")  # fake_ollama.py for tests
+
+# Latency budget per stage in seconds (override e.g. STAGE_DEADLINES="stt=5,llm=20")
+STAGE_DEADLINES = {
+    "vad": 1.0,               # One audio chunk
+    "stt": 10.0,              # Whisper on one utterance
+    "llm_first_token": 8.0,   # Until Ollama starts answering
+    "llm": 30.0,              # Whole reply
+    "tts": 20.0,              # Synthesis + playback
+}
+
+# One worker per blocking resource keeps jobs FIFO across sessions
+EXECUTOR_WORKERS = {"vad": 1, "stt": 1, "tts": 1, "ui": 1}
+
+
+class StageTimeout(Exception):
+    """A pipeline stage ran past its latency budget"""
+
+    def __init__(self, stage, budget):
+        super().__init__(f"{stage} exceeded {budget:g}s budget")
+        self.stage = stage
+        self.budget = budget
+
+
+class OllamaError(ConnectionError):
+    """Ollama unreachable or returned an HTTP error"""
+
+
+def load_deadlines(spec=None):
+    """Defaults merged with 'stage=seconds,...' overrides"""
+    deadlines = dict(STAGE_DEADLINES)
+    spec = spec if spec is not None else os.environ.get("STAGE_DEADLINES", "")
+    for entry in spec.split(","):
+        stage, _, seconds = entry.partition("=")
+        if stage.strip() and seconds.strip():
+            deadlines[stage.strip()] = float(seconds)
+    return deadlines
+
+
+def make_executors(workers=None, initializer=None):
+    """Named thread pools for blocking work ('stt', 'tts', ...); initializer(name) runs in each worker"""
+    return {name: ThreadPoolExecutor(max_workers=count, thread_name_prefix=f"{name}-exec",
+                                     initializer=initializer, initargs=(name,) if initializer else ())
+            for name, count in (workers or EXECUTOR_WORKERS).items()}
+
+
+class StageTimer:
+    """Per-stage durations and deadline overruns"""
+
+    def __init__(self, deadlines=None):
+        self.deadlines = deadlines or load_deadlines()
+        self.durations = {}
+        self.timeouts = {}
+
+    def record(self, stage, seconds):
+        self.durations.setdefault(stage, []).append(seconds)
+
+    async def run(self, stage, awaitable):
+        """
+        Await within the stage's budget; raises StageTimeout. A coroutine is cancelled,
+        but offload() work keeps running in its executor thread until it returns.
+        """
+        budget = self.deadlines.get(stage)
+        start = time.perf_counter()
+        try:
+            if budget is None:
+                return await awaitable
+            return await asyncio.wait_for(awaitable, budget)
+        except asyncio.TimeoutError:
+            self.timeouts[stage] = self.timeouts.get(stage, 0) + 1
+            raise StageTimeout(stage, budget) from None
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def stats(self):
+        """Average/max milliseconds and timeout count per stage"""
+        report = {}
+        for stage, values in self.durations.items():
+            report[stage] = {
+                "count": len(values),
+                "avg_ms": round(sum(values) / len(values) * 1000, 1),
+                "max_ms": round(max(values) * 1000, 1),
+                "timeouts": self.timeouts.get(stage, 0),
+            }
+        return report
+
+
+async def offload(executor, fn, *args):
+    """Run blocking fn(*args) in the given executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, fn, *args)
+
+
+# --- Streaming Ollama client (asyncio streams, no requests/threads) ---
+async def _read_body_lines(reader, chunked):
+    """Yield NDJSON lines from a chunked or close-delimited HTTP body"""
+    buffer = b""
+    while True:
+        if chunked:
+            size_line = await reader.readline()
+            if not size_line:
+                break
+            size = int(size_line.split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                break
+            data = await reader.readexactly(size)
+            await reader.readexactly(2)  # CRLF after each chunk
+        else:
+            data = await reader.read(4096)
+            if not data:
+                break
+        buffer += data
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+async def stream_ollama_async(prompt, system_prompt, model, url=OLLAMA_API_URL, options=None):
+    """Async generator of response text chunks from Ollama's /api/generate"""
+    parts = urlsplit(url)
+    payload = {"model": model, "prompt": prompt, "system": system_prompt, "stream": True}
+    if options:
+        payload["options"] = options
+    body = json.dumps(payload).encode("utf-8")
+
+    try:
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    except OSError as e:
+        raise OllamaError(f"Cannot reach Ollama at {url}: {e}") from e
+
+    try:
+        writer.write(
+            f"POST {parts.path or '/'} HTTP/1.1\r\n"
+            f"Host: {parts.netloc}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode("ascii") + body
+        )
+        await writer.drain()
+
+        status_line = await reader.readline()
+        status = status_line.split(b" ", 2)
+        if len(status) < 2 or status[1] != b"200":
+            raise OllamaError(f"Ollama returned: {status_line.decode(errors='replace').strip()}")
+
+        chunked = False
+        while True:
+            header = await reader.readline()
+            if header in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = header.decode("latin-1").partition(":")
+            if name.strip().lower() == "transfer-encoding" and "chunked" in value.lower():
+                chunked = True
+
+        done = False
+        try:
+            async for line in _read_body_lines(reader, chunked):
+                json_response = json.loads(line.decode("utf-8"))
+                chunk = json_response.get("response", "")
+                if chunk:
+                    yield chunk
+                if json_response.get("done"):
+                    done = True
+                    break
+        except (asyncio.IncompleteReadError, ValueError) as e:  # ValueError covers bad JSON and UTF-8
+            raise OllamaError(f"Broken response stream from Ollama: {e}") from e
+        if not done:
+            raise OllamaError("Ollama closed the stream before the reply was done")
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+
+# --- Audio bridge and turn control ---
+class AudioBridge:
+    """Hands audio from the sounddevice callback thread to an asyncio.Queue"""
+
+    def __init__(self, loop, maxsize=0):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.muted = False
+
+    def callback(self, indata, frames, time_info, status):
+        if not self.muted:
+            self.loop.call_soon_threadsafe(self._put, bytes(indata))
+
+    def _put(self, data):
+        if self.queue.full():
+            self.queue.get_nowait()  # Drop the oldest chunk rather than block audio
+        self.queue.put_nowait(data)
+
+    def flush(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+
+class TurnControl:
+    """At most one running turn per call; starting or barging in cancels the old one"""
+
+    def __init__(self):
+        self.task = None
+        self.cancelled = 0
+
+    @property
+    def active(self):
+        return self.task is not None and not self.task.done()
+
+    def start(self, coro):
+        self.cancel()
+        self.task = asyncio.create_task(coro)
+        return self.task
+
+    def queue(self, coro):
+        """Run coro once the current turn has finished (no barge-in: the caller waits their turn)"""
+        previous = self.task
+
+        async def after_previous():
+            try:
+                if previous is not None and not previous.done():
+                    await asyncio.wait([previous])
+            except asyncio.CancelledError:
+                coro.close()
+                raise
+            return await coro
+
+        self.task = asyncio.create_task(after_previous())
+        return self.task
+
+    def cancel(self):
+        if self.active:
+            self.task.cancel()
+            self.cancelled += 1
+            return True
+        return False
+
+
+# Test functions
+if __name__ == "__main__":
+    async def demo():
+        print("Testing async pipeline core...")
+        timer = StageTimer(load_deadlines("stt=0.05"))
+
+        executors = make_executors()
+        print(f"\n1. Offloaded STT: {await timer.run('stt', offload(executors['stt'], str.upper, 'hello'))}")
+        try:
+            await timer.run("stt", asyncio.sleep(1))
+        except StageTimeout as e:
+            print(f"2. Deadline enforced: {e}")
+
+        turns = TurnControl()
+        turns.start(asyncio.sleep(10))
+        await asyncio.sleep(0)
+        turns.start(asyncio.sleep(0))
+        print(f"3. Barge-in cancelled running turn: {turns.cancelled == 1}")
+
+        order = []
+
+        async def turn(name, seconds):
+            await asyncio.sleep(seconds)
+            order.append(name)
+
+        turns.start(turn("first", 0.05))
+        await turns.queue(turn("second", 0))
+        print(f"4. Without barge-in turns run in order: {order}")
+
+        print(f"\nStage stats: {timer.stats()}")
+        for executor in executors.values():
+            executor.shutdown()
+
+    asyncio.run(demo())
+    print("\n✓ Async pipeline ready!")
@@ -0,0 +1,221 @@
+"""
+Audio Input Adapter for Salon Voice Assistant
+Opens the capture device at its own sample rate and channel count and turns
+its audio into the 16 kHz mono int16 blocks the VAD/Whisper pipeline expects.
+Bluetooth HFP headsets and phone bridges (BlueZ/PulseAudio) usually deliver
+8 kHz (CVSD) or 16 kHz (mSBC) mono; forcing 16 kHz makes PulseAudio resample
+and buffer for us. Here a vectorized polyphase filter runs in the callback.
+
+AUDIO_INPUT_RATE=native     device default rate (or a number, e.g. 8000; 16000 = old behaviour)
+AUDIO_INPUT_CHANNELS=auto   device channels (capped at 2), downmixed to mono
+Reports the latency PortAudio measures for each block next to the resampler's delay.
+"""
+
+import os
+import sys
+import time
+from math import gcd
+
+import numpy as np
+
+AUDIO_INPUT_RATE = os.environ.get("AUDIO_INPUT_RATE", "native")
+AUDIO_INPUT_CHANNELS = os.environ.get("AUDIO_INPUT_CHANNELS", "auto")
+TARGET_RATE = 16000
+BLOCK_SECONDS = 0.5     # Same 8000-sample blocks the pipeline always got
+TAPS_PER_PHASE = 24     # Filter length in input samples (longer = sharper, more delay)
+KAISER_BETA = 8.0       # ~80 dB stopband
+ROLLOFF = 0.95          # Cutoff as a fraction of the lower Nyquist frequency
+LATENCY_WINDOW = 200    # Blocks kept for latency percentiles
+
+
+class PolyphaseResampler:
+    """
+    Streaming rational resampler (up/down polyphase FIR). Keeps the filter
+    history and output phase between blocks, so block edges are seamless.
+    """
+
+    def __init__(self, in_rate, out_rate=TARGET_RATE, taps_per_phase=TAPS_PER_PHASE, beta=KAISER_BETA):
+        g = gcd(int(in_rate), int(out_rate))
+        self.in_rate = int(in_rate)
+        self.out_rate = int(out_rate)
+        self.up = self.out_rate // g
+        self.down = self.in_rate // g
+        self.taps = taps_per_phase
+
+        # Low-pass at the upsampled rate; phase p uses taps h[p], h[p + up], h[p + 2*up], ...
+        length = taps_per_phase * self.up
+        cutoff = ROLLOFF / max(self.up, self.down)
+        t = np.arange(length) - (length - 1) / 2
+        h = cutoff * np.sinc(cutoff * t) * np.kaiser(length, beta)
+        h *= self.up / h.sum()  # Unity gain after zero-stuffing
+        self.phases = h.reshape(taps_per_phase, self.up).T[:, ::-1].astype(np.float32)  # Reversed for dot products
+        self.delay_seconds = (length - 1) / 2 / self.up / self.in_rate
+        self.reset()
+
+    @property
+    def passthrough(self):
+        return self.up == self.down
+
+    def reset(self):
+        self.history = np.zeros(self.taps - 1, dtype=np.float32)
+        self.consumed = 0  # Input samples seen
+        self.next_out = 0  # Upsampled-domain index of the next output sample
+
+    def process(self, samples):
+        """float32 mono block at in_rate -> float32 block at out_rate (length varies by +-1)"""
+        if self.passthrough:
+            return samples
+        buffer = np.concatenate((self.history, samples))
+        end = (self.consumed + len(samples)) * self.up
+        positions = np.arange(self.next_out, end, self.down)
+        if len(positions):
+            inputs = positions // self.up                                 # Newest input sample used
+            starts = inputs - self.consumed                               # Window start within buffer
+            windows = np.lib.stride_tricks.sliding_window_view(buffer, self.taps)[starts]
+            out = np.einsum("kt,kt->k", windows, self.phases[positions % self.up])
+            self.next_out = int(positions[-1]) + self.down
+        else:
+            out = np.zeros(0, dtype=np.float32)
+        self.consumed += len(samples)
+        self.history = buffer[len(buffer) - (self.taps - 1):]
+        return out
+
+
+def device_format(device=None):
+    """(native rate, channels) for a capture device, honouring the env overrides"""
+    import sounddevice as sd
+
+    info = sd.query_devices(device, "input")
+    rate = int(info["default_samplerate"]) if AUDIO_INPUT_RATE == "native" else int(AUDIO_INPUT_RATE)
+    if AUDIO_INPUT_CHANNELS == "auto":
+        channels = max(1, min(2, int(info["max_input_channels"])))
+    else:
+        channels = int(AUDIO_INPUT_CHANNELS)
+    return rate, channels
+
+
+class AudioInput:
+    """
+    Capture at the device's native format and call downstream(block, frames, time_info, status)
+    with 16 kHz mono int16 bytes - the same callback signature the sessions already use.
+    """
+
+    def __init__(self, downstream, device=None, samplerate=None, channels=None,
+                 out_rate=TARGET_RATE, block_seconds=BLOCK_SECONDS):
+        self.downstream = downstream
+        self.device = device
+        if samplerate is None or channels is None:
+            native_rate, native_channels = device_format(device)
+            samplerate = samplerate or native_rate
+            channels = channels or native_channels
+        self.samplerate = int(samplerate)
+        self.channels = int(channels)
+        self.out_rate = out_rate
+        self.block_seconds = block_seconds
+        self.out_block = int(out_rate * block_seconds)
+        self.resampler = PolyphaseResampler(self.samplerate, out_rate)
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.last_callback = None
+        self.stream = None
+
+        # Measurements
+        self.adc_latency = []    # Seconds between the block's first sample at the ADC and the callback
+        self.callback_cost = []  # Seconds spent converting each block
+        self.blocks = 0
+        self.overflows = 0
+        self.gaps = 0            # Stream restarts (e.g. muted for TTS) that reset the filter
+
+    def open(self):
+        """The sounddevice stream (use as a context manager, like RawInputStream)"""
+        import sounddevice as sd
+
+        self.stream = sd.InputStream(samplerate=self.samplerate, blocksize=int(self.samplerate * self.block_seconds),
+                                     device=self.device, dtype="int16", channels=self.channels,
+                                     callback=self.callback)
+        return self.stream
+
+    def callback(self, indata, frames, time_info, status):
+        start = time.perf_counter()
+        if status:
+            self.overflows += bool(status.input_overflow)
+            print(status, file=sys.stderr)
+        now = time.monotonic()
+        if self.last_callback is not None and now - self.last_callback > 2 * self.block_seconds:
+            # Stream was stopped and restarted - audio from before the gap is stale
+            self.resampler.reset()
+            self.pending = np.zeros(0, dtype=np.float32)
+            self.gaps += 1
+        self.last_callback = now
+
+        # Downmix, resample, re-block to exactly out_block samples
+        mono = indata.astype(np.float32).mean(axis=1) if indata.shape[1] > 1 else indata[:, 0].astype(np.float32)
+        self.pending = np.concatenate((self.pending, self.resampler.process(mono)))
+        blocks = []
+        while len(self.pending) >= self.out_block:
+            block, self.pending = self.pending[:self.out_block], self.pending[self.out_block:]
+            blocks.append(np.clip(np.rint(block), -32768, 32767).astype(np.int16).tobytes())
+
+        adc_time = getattr(time_info, "inputBufferAdcTime", 0) or 0
+        current_time = getattr(time_info, "currentTime", 0) or 0
+        if adc_time and current_time:
+            self._keep(self.adc_latency, current_time - adc_time)
+        self._keep(self.callback_cost, time.perf_counter() - start)
+        self.blocks += 1
+
+        for block in blocks:
+            self.downstream(block, self.out_block, time_info, status)
+
+    @staticmethod
+    def _keep(values, value):
+        values.append(value)
+        if len(values) > LATENCY_WINDOW:
+            del values[0]
+
+    def stats(self):
+        def ms(values, q):
+            if not values:
+                return None
+            ordered = sorted(values)
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 2)
+
+        reported = None
+        if self.stream is not None:
+            reported = round(self.stream.latency * 1000, 1)
+        return {
+            "device_rate": self.samplerate,
+            "channels": self.channels,
+            "resampling": f"{self.resampler.up}/{self.resampler.down}" if not self.resampler.passthrough else "none",
+            "stream_latency_ms": reported,                       # What PortAudio/the host API says
+            "adc_latency_ms": {"p50": ms(self.adc_latency, 0.5), "p95": ms(self.adc_latency, 0.95)},
+            "resampler_delay_ms": round(self.resampler.delay_seconds * 1000, 2),
+            "block_ms": round(self.block_seconds * 1000),     # Buffering to fill one pipeline block
+            "callback_cost_ms": {"p50": ms(self.callback_cost, 0.5), "p95": ms(self.callback_cost, 0.95)},
+            "blocks": self.blocks,
+            "overflows": self.overflows,
+            "restarts": self.gaps,
+        }
+
+
+# Test functions
+if __name__ == "__main__":
+    print("Testing polyphase resampler...")
+    for rate, channels in [(8000, 1), (16000, 1), (44100, 2), (48000, 2)]:
+        # 1 kHz tone in, streamed in 0.5 s blocks; expect 16000 samples/s and the tone intact
+        received = []
+        adapter = AudioInput(lambda block, *_: received.append(block), samplerate=rate, channels=channels)
+        t = np.arange(rate * 3) / rate
+        tone = (8000 * np.sin(2 * np.pi * 1000 * t)).astype(np.int16)
+        frames = np.repeat(tone[:, None], channels, axis=1)
+        step = int(rate * BLOCK_SECONDS)
+        start = time.perf_counter()
+        for i in range(0, len(frames), step):
+            adapter.callback(frames[i:i + step], step, None, None)
+        elapsed = time.perf_counter() - start
+        out = np.frombuffer(b"".join(received), dtype=np.int16).astype(np.float32)
+        spectrum = np.abs(np.fft.rfft(out[4000:]))
+        peak_hz = np.argmax(spectrum) * TARGET_RATE / (2 * (len(spectrum) - 1))
+        print(f"   {rate} Hz x{channels}: {len(received)} blocks, peak {peak_hz:.0f} Hz, "
+              f"RMS {np.sqrt(np.mean(out[4000:] ** 2)):.0f} (in {8000 / np.sqrt(2):.0f}), "
+              f"{elapsed / (len(t) / rate) * 1000:.2f} ms CPU per audio-second, "
+              f"delay {adapter.resampler.delay_seconds * 1000:.2f} ms")
+    print("\n✓ Audio input ready!")
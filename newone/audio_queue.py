@@ -0,0 +1,191 @@
+"""
+Bounded Audio Queue for Salon Voice Assistant
+Sits between the sounddevice callback and the VAD loop. The loop stops reading
+while a turn is transcribed and answered, so blocks pile up; an unbounded queue
+then feeds VAD seconds-old audio (lag, phantom turns from old noise). This one
+has a size limit and an explicit overload policy, and counts what it drops.
+
+AUDIO_QUEUE_CHUNKS=20            capacity in blocks (20 x 0.5 s = 10 s of audio)
+AUDIO_QUEUE_POLICY=drop_oldest   drop_oldest   - when full, the oldest block goes
+                                 flush_on_turn - also discard everything queued
+                                                 while a turn was being answered
+AUDIO_LATE_SECONDS=2.0           blocks older than this when VAD gets them count as late
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+AUDIO_QUEUE_CHUNKS = int(os.environ.get("AUDIO_QUEUE_CHUNKS", "20"))
+AUDIO_QUEUE_POLICY = os.environ.get("AUDIO_QUEUE_POLICY", "drop_oldest")
+AUDIO_LATE_SECONDS = float(os.environ.get("AUDIO_LATE_SECONDS", "2.0"))
+POLICIES = ["drop_oldest", "flush_on_turn"]
+DEPTH_SAMPLE_SECONDS = 1.0  # Depth timeline resolution (max depth per interval)
+DEPTH_HISTORY = 3600        # Timeline points kept (an hour at 1 s)
+
+
+class AudioQueue:
+    """
+    Bounded FIFO of audio blocks. put() never blocks (it runs in the audio
+    callback); None is the end-of-input marker and is never dropped.
+    """
+
+    def __init__(self, maxsize=AUDIO_QUEUE_CHUNKS, policy=AUDIO_QUEUE_POLICY, late_seconds=AUDIO_LATE_SECONDS):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown audio queue policy '{policy}' (choose from {', '.join(POLICIES)})")
+        self.maxsize = maxsize  # 0 = unbounded
+        self.policy = policy
+        self.late_seconds = late_seconds
+        self.items = deque()    # (enqueued at, data)
+        self.cond = threading.Condition()
+        self.started = time.monotonic()
+
+        # Counters
+        self.put_count = 0
+        self.delivered = 0
+        self.dropped = 0        # Oldest blocks pushed out by a full queue
+        self.flushed = {}       # reason -> blocks discarded by flush()
+        self.late = 0
+        self.max_lag = 0.0
+        self.depth_counts = {}  # depth seen by a put -> times
+        self.timeline = deque(maxlen=DEPTH_HISTORY)
+        self.bucket = None      # [interval index, max depth]
+
+    # --- Producer (audio callback) ---
+    def put(self, data):
+        with self.cond:
+            if data is not None and self.maxsize and len(self.items) >= self.maxsize:
+                self._drop_oldest()
+            self.items.append((time.monotonic(), data))
+            self.put_count += 1
+            self._record_depth(len(self.items))
+            self.cond.notify()
+
+    def put_nowait(self, data):
+        self.put(data)
+
+    def _drop_oldest(self):
+        for i, (_, data) in enumerate(self.items):
+            if data is not None:
+                del self.items[i]
+                self.dropped += 1
+                return
+
+    def _record_depth(self, depth):
+        self.depth_counts[depth] = self.depth_counts.get(depth, 0) + 1
+        index = int((time.monotonic() - self.started) / DEPTH_SAMPLE_SECONDS)
+        if self.bucket and self.bucket[0] == index:
+            self.bucket[1] = max(self.bucket[1], depth)
+            return
+        if self.bucket:
+            self.timeline.append((round(self.bucket[0] * DEPTH_SAMPLE_SECONDS, 1), self.bucket[1]))
+        self.bucket = [index, depth]
+
+    # --- Consumer (VAD loop) ---
+    def get(self, block=True, timeout=None):
+        """Next block (None = end of input); raises queue.Empty like queue.Queue"""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.items, timeout if block else 0):
+                raise queue.Empty
+            enqueued, data = self.items.popleft()
+            if data is not None:
+                lag = time.monotonic() - enqueued
+                self.max_lag = max(self.max_lag, lag)
+                self.late += lag > self.late_seconds
+                self.delivered += 1
+            return data
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def qsize(self):
+        with self.cond:
+            return len(self.items)
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def flush(self, reason="mute"):
+        """Discard queued audio (keeping an end-of-input marker); returns how many blocks went"""
+        with self.cond:
+            ended = any(data is None for _, data in self.items)
+            count = len(self.items) - ended
+            self.items.clear()
+            if ended:
+                self.items.append((time.monotonic(), None))
+            if count:
+                self.flushed[reason] = self.flushed.get(reason, 0) + count
+            return count
+
+    def turn_boundary(self):
+        """A turn was answered: with flush_on_turn, audio that queued up meanwhile is stale"""
+        return self.flush("turn") if self.policy == "flush_on_turn" else 0
+
+    # --- Reporting ---
+    def depth_percentile(self, q):
+        total = sum(self.depth_counts.values())
+        if not total:
+            return 0
+        seen = 0
+        for depth in sorted(self.depth_counts):
+            seen += self.depth_counts[depth]
+            if seen >= total * q:
+                return depth
+        return max(self.depth_counts)
+
+    def stats(self):
+        with self.cond:
+            return {
+                "policy": self.policy,
+                "maxsize": self.maxsize,
+                "put": self.put_count,
+                "delivered": self.delivered,
+                "dropped_full": self.dropped,
+                "flushed": dict(self.flushed),
+                "late": self.late,
+                "max_lag_ms": round(self.max_lag * 1000),
+                "depth": {"p50": self.depth_percentile(0.5), "p95": self.depth_percentile(0.95),
+                          "p99": self.depth_percentile(0.99), "max": max(self.depth_counts, default=0)},
+            }
+
+    def depth_timeline(self):
+        """[(seconds since start, max depth in that interval)]"""
+        with self.cond:
+            points = list(self.timeline)
+            if self.bucket:
+                points.append((round(self.bucket[0] * DEPTH_SAMPLE_SECONDS, 1), self.bucket[1]))
+            return points
+
+    def save_report(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(dict(self.stats(), timeline=self.depth_timeline()), f, indent=2)
+
+
+# Test functions
+if __name__ == "__main__":
+    print("Testing bounded audio queue...")
+    block = bytes(16000)
+
+    # A 3 s turn while the callback keeps delivering 0.5 s blocks (sped up 10x)
+    for policy in POLICIES:
+        q = AudioQueue(maxsize=4, policy=policy, late_seconds=0.1)
+        for i in range(8):
+            q.put(block)
+            time.sleep(0.03)
+        stale = q.turn_boundary()
+        while not q.empty():
+            q.get_nowait()
+        q.put(None)
+        print(f"\n{policy}: turn boundary dropped {stale}, end marker -> {q.get()}")
+        print(f"   {q.stats()}")
+
+    q = AudioQueue(maxsize=2)
+    q.put(block)
+    q.put(None)
+    q.put(block)
+    q.put(block)  # Full: drops the oldest audio, never the end marker
+    print(f"\nEnd marker kept when full: {[d is None for _, d in q.items]}")
+    print("\n✓ Audio queue ready!")
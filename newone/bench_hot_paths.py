@@ -0,0 +1,319 @@
+"""
+Hot-Path Microbenchmarks for Salon Voice Assistant
+Times the per-turn work outside the models - availability checks, booking,
+today's list, the appointment viewer's load, the KB context and current-time
+context, and the TOOL:BOOK parser - against synthetic bookings stores of 1k,
+10k and 100k appointments, and compares the medians with bench_baseline.json.
+
+Run:  python bench_hot_paths.py [--sizes 1k,10k,100k] [--only check_availability,book]
+                                [--save-baseline] [--threshold 0.25] [--fail-on-regression]
+Each case is timed pytest-benchmark style: calibrated rounds of repeated calls,
+reported as min / median / mean / stddev per call. A median more than
+--threshold slower than the baseline is flagged as a regression. Baselines are
+per machine - re-save after changing hardware (the file records where it was made).
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+SIZES = {"1k": 1000, "10k": 10000, "100k": 100000}
+MIN_ROUND_TIME = 0.02  # Calls per round are calibrated so a round takes at least this long
+MIN_ROUNDS = 5
+MAX_TIME = 1.0         # Seconds spent per case (more rounds on fast cases, MIN_ROUNDS on slow ones)
+REGRESSION_THRESHOLD = 0.25
+CONFIRMED_SHARE = 0.9  # The rest are cancelled, like a real store after a while
+
+DEFAULT_SLOTS = [f"{h % 12 or 12}:{m:02d} {'AM' if h < 12 else 'PM'}" for h in range(9, 19) for m in (0, 30)]
+TOOL_LINES = {
+    "valid": "TOOL:BOOK:Sarah Johnson|555-867-5309|2026-03-04|2:30 PM|Women's Haircut",
+    "fake_phone": "TOOL:BOOK:Sarah Johnson|555-123-4567|2026-03-04|2:30 PM|Women's Haircut",
+}
+
+
+# --- Synthetic stores ---
+def make_store(count, path, seed=1, time_slots=None):
+    """Write a bookings file with count appointments spread over past and future days"""
+    rng = random.Random(seed)
+    if time_slots is None:
+        time_slots = {"monday_to_friday": DEFAULT_SLOTS, "saturday": DEFAULT_SLOTS[:-2], "sunday": []}
+    slots = time_slots["monday_to_friday"]
+    days = max(1, count // len(slots))
+    today = datetime.now().date()
+    start = today - timedelta(days=days // 2)
+    appointments = []
+    for i in range(count):
+        day = start + timedelta(days=i // len(slots))
+        appointments.append({
+            "id": i + 1,
+            "date": day.strftime("%Y-%m-%d"),
+            "time": slots[i % len(slots)],
+            "customer_name": f"Customer {i + 1}",
+            "phone": f"555-{rng.randint(200, 999)}-{rng.randint(1000, 9999)}",
+            "service": rng.choice(["Men's Haircut", "Women's Haircut", "Manicure", "Blowout"]),
+            "staff": "Any",
+            "duration": 30,
+            "price": 25,
+            "status": "confirmed" if rng.random() < CONFIRMED_SHARE else "cancelled",
+        })
+    data = {"appointments": appointments, "time_slots": time_slots, "next_appointment_id": count + 1}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    return {"path": path, "count": count, "today": today.strftime("%Y-%m-%d"),
+            "last_day": start + timedelta(days=days), "slots": slots}
+
+
+def shop_time_slots():
+    """The shop's slot grid from bookings.json, if there is one"""
+    try:
+        with open("bookings.json", "r", encoding="utf-8") as f:
+            return json.load(f).get("time_slots") or None
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+# --- Timing ---
+def bench(fn, max_time=MAX_TIME):
+    """pytest-benchmark style: calibrate calls per round, then time rounds; seconds per call"""
+    fn()  # Warm-up
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_ROUND_TIME or iterations >= 1 << 20:
+            break
+        iterations *= 2 if elapsed == 0 else max(2, min(10, int(MIN_ROUND_TIME / elapsed) + 1))
+
+    timings = [elapsed / iterations]
+    deadline = time.perf_counter() + max_time
+    while len(timings) < MIN_ROUNDS or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        timings.append((time.perf_counter() - start) / iterations)
+    return {
+        "rounds": len(timings),
+        "iterations": iterations,
+        "min_ms": round(min(timings) * 1000, 4),
+        "median_ms": round(statistics.median(timings) * 1000, 4),
+        "mean_ms": round(statistics.mean(timings) * 1000, 4),
+        "stddev_ms": round(statistics.stdev(timings) * 1000, 4) if len(timings) > 1 else 0.0,
+    }
+
+
+# --- Cases: each returns the function to time ---
+def case_check_availability(store):
+    import booking_tools
+    date = store["today"]
+    return lambda: booking_tools.check_availability(date)
+
+
+def case_check_availability_time(store):
+    import booking_tools
+    date = store["today"]
+    return lambda: booking_tools.check_availability(date, "10:00 AM")
+
+
+def case_book_appointment(store):
+    """Books a new weekday slot past the store's last day on every call"""
+    import booking_tools
+    slots = iter([(day, slot) for offset in range(1, 4000)
+                  for day in [store["last_day"] + timedelta(days=offset)] if day.weekday() < 5
+                  for slot in store["slots"]])
+
+    def book():
+        day, slot = next(slots)
+        result = booking_tools.book_appointment("Bench Caller", "555-867-5309", day.strftime("%Y-%m-%d"),
+                                                slot, "Men's Haircut", duration=30, price=25)
+        if not result["success"]:
+            raise RuntimeError(f"Benchmark booking failed: {result}")
+    return book
+
+
+def case_todays_appointments(store):
+    import booking_tools
+    return booking_tools.get_todays_appointments
+
+
+def case_viewer_load_bookings(store):
+    import appointment_viewer
+    appointment_viewer.BOOKINGS_FILE = store["path"]
+    return lambda: appointment_viewer.AppointmentViewer.load_bookings(None)  # Doesn't touch the window
+
+
+def case_build_kb_context(kb):
+    from kb_manager import build_kb_context
+    return lambda: build_kb_context(kb.raw)
+
+
+def case_get_current_context(kb):
+    import voice_assistant  # Needs the full runtime (numpy, requests, ...)
+    return voice_assistant.get_current_context
+
+
+def case_kb_activity_at(kb):
+    """The KB lookup inside get_current_context"""
+    return lambda: kb.activity_at(datetime.now())
+
+
+def case_parse_book_tool(kb, line="valid"):
+    from tool_commands import extract_book_line, parse_book_tool
+    response = f"Let me book that for you.\n{TOOL_LINES[line]}\nAnything else?"
+    return lambda: parse_book_tool(extract_book_line(response), kb.services, kb.assistant_name)
+
+
+# One store per size is shared by these in order - book_appointment (which adds to it) runs last
+STORE_CASES = {
+    "check_availability": case_check_availability,
+    "check_availability_time": case_check_availability_time,
+    "get_todays_appointments": case_todays_appointments,
+    "viewer_load_bookings": case_viewer_load_bookings,
+    "book_appointment": case_book_appointment,
+}
+KB_CASES = {
+    "build_kb_context": case_build_kb_context,
+    "get_current_context": case_get_current_context,
+    "kb_activity_at": case_kb_activity_at,
+    "parse_book_tool": case_parse_book_tool,
+    "parse_book_tool_rejected": lambda kb: case_parse_book_tool(kb, "fake_phone"),
+}
+
+
+def run_cases(sizes, only=None, max_time=MAX_TIME):
+    """{case[size]: stats} for every selected case"""
+    import booking_tools
+    from kb_manager import compile_kb_file
+
+    def selected(name):
+        return not only or any(name.startswith(prefix) for prefix in only)
+
+    results = {}
+    kb = compile_kb_file("knowledge_base.json")
+    for name, make_case in KB_CASES.items():
+        if not selected(name):
+            continue
+        try:
+            fn = make_case(kb)
+        except ImportError as e:
+            print(f"  {name}: skipped ({e})")
+            continue
+        results[name] = bench(fn, max_time)
+        print(f"  {name}: {results[name]['median_ms']} ms")
+
+    work_dir = tempfile.mkdtemp(prefix="bench_hot_paths_")
+    original_file = booking_tools.BOOKINGS_FILE
+    time_slots = shop_time_slots()
+    try:
+        for label in sizes:
+            names = [name for name in STORE_CASES if selected(name)]
+            if not names:
+                continue
+            store = make_store(SIZES[label], os.path.join(work_dir, f"bookings_{label}.json"), time_slots=time_slots)
+            booking_tools.BOOKINGS_FILE = store["path"]
+            for name in names:
+                make_case = STORE_CASES[name]
+                key = f"{name}[{label}]"
+                results[key] = bench(make_case(store), max_time)
+                print(f"  {key}: {results[key]['median_ms']} ms")
+    finally:
+        booking_tools.BOOKINGS_FILE = original_file
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+# --- Baseline ---
+def machine_info():
+    return {"platform": platform.platform(), "python": platform.python_version(),
+            "processor": platform.processor() or platform.machine(), "cpu_count": os.cpu_count()}
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def save_baseline(results, path=BASELINE_PATH, previous=None):
+    """Merge results over the previous baseline (a partial run keeps the other cases)"""
+    merged = dict(previous["results"]) if previous else {}
+    merged.update({name: {k: stats[k] for k in ("median_ms", "min_ms", "stddev_ms")} for name, stats in results.items()})
+    baseline = {"machine": machine_info(), "saved_at": datetime.now().isoformat(timespec="seconds"),
+                "results": dict(sorted(merged.items()))}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """{case: ratio of median to baseline median}; ratios above 1 + threshold are regressions"""
+    ratios = {}
+    for name, stats in results.items():
+        before = (baseline or {}).get("results", {}).get(name)
+        if before and before["median_ms"]:
+            ratios[name] = stats["median_ms"] / before["median_ms"]
+    regressions = [name for name, ratio in ratios.items() if ratio > 1 + threshold]
+    return ratios, regressions
+
+
+def print_table(results, ratios, threshold):
+    print(f"\n{'case':<36} {'rounds':>7} {'min ms':>10} {'median ms':>10} {'mean ms':>10} {'stddev':>9} {'ops/s':>10}  vs baseline")
+    for name, r in results.items():
+        ops = f"{1000 / r['median_ms']:.{0 if r['median_ms'] < 100 else 1}f}" if r["median_ms"] else "-"
+        ratio = ratios.get(name)
+        if ratio is None:
+            verdict = "new"
+        else:
+            verdict = f"x{ratio:.2f}" + ("  REGRESSED" if ratio > 1 + threshold else "")
+        print(f"{name:<36} {r['rounds']:>7} {r['min_ms']:>10.4f} {r['median_ms']:>10.4f} {r['mean_ms']:>10.4f} "
+              f"{r['stddev_ms']:>9.4f} {ops:>10}  {verdict}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark booking, KB and parsing hot paths")
+    parser.add_argument("--sizes", default="1k,10k,100k", help=f"Store sizes ({', '.join(SIZES)})")
+    parser.add_argument("--only", help="Comma-separated case name prefixes")
+    parser.add_argument("--max-time", type=float, default=MAX_TIME, help="Seconds per case")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these numbers as the new baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on a regression")
+    args = parser.parse_args()
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        print(f"[Error] Unknown size(s) {unknown} (choose from {', '.join(SIZES)})")
+        sys.exit(2)
+    only = [o.strip() for o in args.only.split(",")] if args.only else None
+
+    baseline = load_baseline(args.baseline)
+    if baseline and baseline.get("machine", {}).get("cpu_count") != os.cpu_count():
+        print(f"[Bench] Baseline was made on another machine ({baseline['machine']}) - compare with care")
+
+    print(f"Benchmarking hot paths (stores: {', '.join(sizes)})...")
+    results = run_cases(sizes, only, args.max_time)
+    ratios, regressions = compare(results, baseline, args.threshold)
+    print_table(results, ratios, args.threshold)
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline, baseline)
+        print(f"\n[Bench] Baseline saved to {args.baseline}")
+    if regressions:
+        print(f"\n[Bench] {len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        if args.fail_on_regression:
+            sys.exit(1)
+    print("\n✓ Hot-path benchmark done!")
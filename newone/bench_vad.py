@@ -0,0 +1,140 @@
+"""
+VAD Backend Benchmark for Salon Voice Assistant
+Compares the onnx, torch and energy backends on startup time (import + model
+load), memory (RSS added by the backend) and CPU seconds per second of audio.
+Each backend runs in its own fresh process so import costs aren't shared.
+
+Run:  python bench_vad.py [recording.wav] [backend ...]
+      (16 kHz mono 16-bit WAV; without one, 30 s of synthetic audio is used)
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+import wave
+
+SAMPLERATE = 16000
+CHUNK_SAMPLES = 8000         # Same 0.5 s blocks the call loop feeds the VAD
+SYNTHETIC_SECONDS = 30
+BACKEND_NAMES = ["onnx", "torch", "energy"]
+
+
+def rss_mb():
+    """(current RSS, peak RSS) in MB, or (None, None) where we can't tell"""
+    try:
+        with open("/proc/self/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["VmRSS"].split()[0]) / 1024, int(fields["VmHWM"].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+        return None, peak
+    except ImportError:
+        return None, None
+
+
+def load_audio(wav_path=None):
+    """int16 PCM bytes to feed the VAD"""
+    if wav_path:
+        with wave.open(wav_path, "rb") as wf:
+            if wf.getframerate() != SAMPLERATE or wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+                raise ValueError(f"{wav_path} must be 16 kHz mono 16-bit")
+            return wf.readframes(wf.getnframes())
+
+    import numpy as np
+    # Alternate one second of voice-like harmonics with one second of room noise
+    rng = np.random.default_rng(0)
+    t = np.arange(SAMPLERATE) / SAMPLERATE
+    voice = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 6)) * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t))
+    voice = voice / np.max(np.abs(voice)) * 0.3
+    parts = []
+    for second in range(SYNTHETIC_SECONDS):
+        noise = rng.normal(0, 0.003, SAMPLERATE)
+        parts.append(noise + (voice if second % 2 == 0 else 0))
+    return (np.concatenate(parts) * 32767).astype(np.int16).tobytes()
+
+
+def run_worker(name, wav_path):
+    """Measure one backend in this (fresh) process and print the result as JSON"""
+    audio = load_audio(wav_path)  # numpy is imported here, before the baseline
+    base_rss, _ = rss_mb()
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    from vad_backends import BACKENDS
+    backend = BACKENDS[name]()
+    backend.load()  # No fallback here - we want this backend or an error
+    startup = time.perf_counter() - start
+    startup_cpu = time.process_time() - cpu_start
+    loaded_rss, _ = rss_mb()
+
+    chunk_bytes = CHUNK_SAMPLES * 2
+    chunks = [audio[i:i + chunk_bytes] for i in range(0, len(audio), chunk_bytes)]
+    backend.is_speech(chunks[0])  # Warm-up (first inference allocates)
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    speech = sum(1 for chunk in chunks if backend.is_speech(chunk))
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    audio_seconds = len(audio) / 2 / SAMPLERATE
+    _, peak_rss = rss_mb()
+
+    print(json.dumps({
+        "backend": name,
+        "startup_s": round(startup, 3),
+        "startup_cpu_s": round(startup_cpu, 3),
+        "rss_added_mb": round(loaded_rss - base_rss, 1) if base_rss is not None and loaded_rss is not None else None,
+        "peak_rss_mb": round(peak_rss, 1) if peak_rss is not None else None,
+        "cpu_per_audio_s_ms": round(cpu / audio_seconds * 1000, 3),
+        "realtime_factor": round(wall / audio_seconds, 5),
+        "speech_chunks": f"{speech}/{len(chunks)}",
+    }))
+
+
+def bench_backend(name, wav_path=None):
+    """Run one backend in a child process; returns its result dict or {"error": ...}"""
+    command = [sys.executable, os.path.abspath(__file__), "--worker", name]
+    if wav_path:
+        command.append(wav_path)
+    proc = subprocess.run(command, capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    reason = (proc.stderr.strip().splitlines() or ["no output"])[-1]
+    return {"backend": name, "error": reason}
+
+
+def print_table(results):
+    print(f"\n{'backend':<8} {'startup':>9} {'RSS added':>10} {'peak RSS':>9} {'CPU/audio-s':>12} {'RTF':>9}  speech")
+    for r in results:
+        if "error" in r:
+            print(f"{r['backend']:<8} unavailable: {r['error']}")
+            continue
+        added = f"{r['rss_added_mb']:.1f} MB" if r["rss_added_mb"] is not None else "n/a"
+        peak = f"{r['peak_rss_mb']:.0f} MB" if r["peak_rss_mb"] is not None else "n/a"
+        print(f"{r['backend']:<8} {r['startup_s']:>8.2f}s {added:>10} {peak:>9} "
+              f"{r['cpu_per_audio_s_ms']:>9.2f} ms {r['realtime_factor']:>9.4f}  {r['speech_chunks']}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--worker":
+        run_worker(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+        sys.exit(0)
+
+    args = sys.argv[1:]
+    wav = args.pop(0) if args and args[0].lower().endswith(".wav") else None
+    names = args or BACKEND_NAMES
+    print(f"Benchmarking VAD backends on {wav or f'{SYNTHETIC_SECONDS}s of synthetic audio'}...")
+    results = []
+    for name in names:
+        print(f"  {name}...")
+        results.append(bench_backend(name, wav))
+    print_table(results)
+    print("\n✓ VAD benchmark done!")
@@ -6,8 +6,10 @@ Handles appointment scheduling, availability checking, and bookings management
 import json
 from datetime import datetime, timedelta
 import os
+import threading
 
 BOOKINGS_FILE = "bookings.json"
+bookings_lock = threading.RLock()  # Concurrent call sessions share one bookings file
 
 def load_bookings():
     """Load bookings from JSON file"""
@@ -18,14 +20,27 @@ def load_bookings():
         return {"appointments": [], "next_appointment_id": 1}
 
 def save_bookings(data):
-    """Save bookings to JSON file"""
-    with open(BOOKINGS_FILE, 'w', encoding='utf-8') as f:
+    """Save bookings to JSON file (atomically - other lines read it without the lock)"""
+    tmp_path = BOOKINGS_FILE + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, BOOKINGS_FILE)
 
 def parse_time(time_str):
     """Convert time string like '10:00 AM' to datetime object"""
     return datetime.strptime(time_str, "%I:%M %p")
 
+def get_time_slots(date, data=None):
+    """Bookable slot grid for a date (datetime or YYYY-MM-DD), e.g. ['9:00 AM', ...]"""
+    if isinstance(date, str):
+        date = datetime.strptime(date, "%Y-%m-%d")
+    if data is None:
+        data = load_bookings()
+    slots = data.get("time_slots", {})
+    if date.weekday() == 6:
+        return slots.get("sunday", [])
+    return slots.get("saturday" if date.weekday() == 5 else "monday_to_friday", [])
+
 def check_availability(date_str, requested_time=None):
     """
     Check available time slots for a given date
@@ -44,8 +59,7 @@ def check_availability(date_str, requested_time=None):
         return {"error": "We're closed on Sundays"}
     
     # Get appropriate time slots
-    is_saturday = req_date.weekday() == 5
-    available_slots = data["time_slots"]["saturday" if is_saturday else "monday_to_friday"]
+    available_slots = get_time_slots(req_date, data)
     
     # Filter out booked slots
     booked_times = [
@@ -69,37 +83,38 @@ def book_appointment(customer_name, phone, date_str, time_str, service, staff="A
     Book a new appointment
     Returns confirmation details or error
     """
-    data = load_bookings()
-    
-    # Check if slot is available
-    availability = check_availability(date_str, time_str)
-    if not availability.get("available", False):
-        return {"success": False, "error": "Time slot not available", "suggestion": availability.get("open_slots", [])}
-    
-    # Create new appointment
-    new_appointment = {
-        "id": data["next_appointment_id"],
-        "date": date_str,
-        "time": time_str,
-        "customer_name": customer_name,
-        "phone": phone,
-        "service": service,
-        "staff": staff,
-        "duration": duration,
-        "price": price,
-        "status": "confirmed"
-    }
-    
-    data["appointments"].append(new_appointment)
-    data["next_appointment_id"] += 1
-    
-    save_bookings(data)
-    
-    return {
-        "success": True,
-        "appointment": new_appointment,
-        "message": f"Appointment confirmed for {customer_name} on {date_str} at {time_str}"
-    }
+    with bookings_lock:
+        data = load_bookings()
+    
+        # Check if slot is available
+        availability = check_availability(date_str, time_str)
+        if not availability.get("available", False):
+            return {"success": False, "error": "Time slot not available", "suggestion": availability.get("open_slots", [])}
+    
+        # Create new appointment
+        new_appointment = {
+            "id": data["next_appointment_id"],
+            "date": date_str,
+            "time": time_str,
+            "customer_name": customer_name,
+            "phone": phone,
+            "service": service,
+            "staff": staff,
+            "duration": duration,
+            "price": price,
+            "status": "confirmed"
+        }
+    
+        data["appointments"].append(new_appointment)
+        data["next_appointment_id"] += 1
+    
+        save_bookings(data)
+    
+        return {
+            "success": True,
+            "appointment": new_appointment,
+            "message": f"Appointment confirmed for {customer_name} on {date_str} at {time_str}"
+        }
 
 def get_todays_appointments():
     """Get all appointments for today"""
@@ -118,15 +133,16 @@ def get_todays_appointments():
 
 def cancel_appointment(appointment_id):
     """Cancel an appointment by ID"""
-    data = load_bookings()
+    with bookings_lock:
+        data = load_bookings()
     
-    for appt in data["appointments"]:
-        if appt["id"] == appointment_id:
-            appt["status"] = "cancelled"
-            save_bookings(data)
-            return {"success": True, "message": f"Appointment #{appointment_id} has been cancelled"}
+        for appt in data["appointments"]:
+            if appt["id"] == appointment_id:
+                appt["status"] = "cancelled"
+                save_bookings(data)
+                return {"success": True, "message": f"Appointment #{appointment_id} has been cancelled"}
     
-    return {"success": False, "error": "Appointment not found"}
+        return {"success": False, "error": "Appointment not found"}
 
 # Test functions
 if __name__ == "__main__":
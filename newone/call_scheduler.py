@@ -0,0 +1,139 @@
+"""
+Call Scheduler for Salon Voice Assistant
+Multiplexes several call sessions (phone lines) onto shared STT/LLM workers
+Jobs are served round-robin per session so one chatty line can't starve another
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+DEFAULT_WORKERS = {"stt": 1, "llm": 1}  # Whisper and Ollama each run one job at a time
+
+
+class _Pool:
+    """Worker threads for one resource with per-session FIFO queues"""
+
+    def __init__(self, name, workers, initializer=None):
+        self.name = name
+        self.initializer = initializer
+        self.queues = {}          # session_id -> deque of jobs
+        self.rotation = deque()   # session ids with pending jobs, in serving order
+        self.cond = threading.Condition()
+        self.running = True
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.threads = [
+            threading.Thread(target=self._worker, name=f"{name}-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, session_id, fn, args, kwargs):
+        future = Future()
+        with self.cond:
+            if session_id not in self.queues:
+                self.queues[session_id] = deque()
+            if not self.queues[session_id]:
+                self.rotation.append(session_id)
+            self.queues[session_id].append((future, fn, args, kwargs, time.perf_counter()))
+            self.cond.notify()
+        return future
+
+    def _next_job(self):
+        """Pop the oldest job of the next session in rotation (caller holds the lock)"""
+        session_id = self.rotation.popleft()
+        jobs = self.queues[session_id]
+        job = jobs.popleft()
+        if jobs:
+            self.rotation.append(session_id)  # Back of the line for its next job
+        return job
+
+    def _worker(self):
+        if self.initializer:
+            self.initializer(self.name)
+        while True:
+            with self.cond:
+                while self.running and not self.rotation:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                future, fn, args, kwargs, queued_at = self._next_job()
+
+            wait = time.perf_counter() - queued_at
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+            with self.cond:
+                self.completed += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+
+
+class FairScheduler:
+    """Shared worker pools ("stt", "llm", ...) with fair queuing across sessions"""
+
+    def __init__(self, workers=None, initializer=None):
+        """initializer(pool name) runs first in every worker thread (e.g. CPU pinning)"""
+        self.pools = {name: _Pool(name, count, initializer) for name, count in (workers or DEFAULT_WORKERS).items()}
+
+    def submit(self, pool, session_id, fn, *args, **kwargs):
+        """Queue fn(*args) on a pool on behalf of a session. Returns a Future."""
+        return self.pools[pool].submit(session_id, fn, args, kwargs)
+
+    def run(self, pool, session_id, fn, *args, **kwargs):
+        """Queue fn and wait for its result (re-raises its exception)"""
+        return self.submit(pool, session_id, fn, *args, **kwargs).result()
+
+    def stats(self):
+        """Per-pool completed jobs, pending jobs and queue wait times (ms)"""
+        report = {}
+        for name, pool in self.pools.items():
+            with pool.cond:
+                completed = pool.completed
+                avg_wait = pool.total_wait / completed if completed else 0.0
+                report[name] = {
+                    "completed": completed,
+                    "pending": sum(len(jobs) for jobs in pool.queues.values()),
+                    "avg_wait_ms": round(avg_wait * 1000, 1),
+                    "max_wait_ms": round(pool.max_wait * 1000, 1)
+                }
+        return report
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.stop()
+
+
+# Test functions
+if __name__ == "__main__":
+    print("Testing fair scheduler...")
+    scheduler = FairScheduler({"llm": 1})
+    order = []
+
+    def job(session_id, n):
+        time.sleep(0.01)
+        order.append(f"{session_id}#{n}")
+
+    # line1 floods the queue first; line2 still gets every other slot
+    futures = [scheduler.submit("llm", "line1", job, "line1", n) for n in range(4)]
+    futures += [scheduler.submit("llm", "line2", job, "line2", n) for n in range(2)]
+    for future in futures:
+        future.result()
+
+    print(f"\nServing order: {', '.join(order)}")
+    print(f"Stats: {scheduler.stats()}")
+    scheduler.shutdown()
+    print("\n✓ Scheduler ready!")
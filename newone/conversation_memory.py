@@ -0,0 +1,137 @@
+"""
+Conversation Memory for Salon Voice Assistant
+Keeps the LLM prompt inside a fixed token budget for the whole call:
+pinned caller facts + a rolling summary of older turns + the latest turns verbatim
+"""
+
+import copy
+import re
+
+HISTORY_TOKEN_BUDGET = 600   # Tokens for facts + summary + recent turns
+SUMMARY_TOKEN_BUDGET = 120   # Part of the budget the rolling summary may use
+MIN_RECENT_MESSAGES = 2      # Always keep the last exchange verbatim
+SUMMARY_WORDS = 14           # Words kept from each summarized message
+
+ROLE_LABELS = {"user": "User", "assistant": "Assistant"}
+SUMMARY_LABELS = {"user": "Caller said", "assistant": "You replied"}
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token for English) - no tokenizer needed"""
+    return (len(text) + 3) // 4
+
+
+def summarize_message(role, content, max_words=SUMMARY_WORDS):
+    """One short line for an older message: its first sentence, trimmed"""
+    first_sentence = re.split(r"(?<=[.!?])\s+", content.strip(), maxsplit=1)[0]
+    words = first_sentence.split()
+    if len(words) > max_words:
+        first_sentence = " ".join(words[:max_words]) + "..."
+    return f"{SUMMARY_LABELS.get(role, role)}: {first_sentence}"
+
+
+class ConversationMemory:
+    """Per-call message history with a token budget and pinned booking facts"""
+
+    def __init__(self, token_budget=HISTORY_TOKEN_BUDGET, summary_budget=SUMMARY_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.reset()
+
+    def reset(self):
+        """Forget everything - call at the start of each new call"""
+        self.messages = []        # Recent messages kept verbatim
+        self.summary_lines = []   # Compressed older messages
+        self.facts = {}           # Pinned caller details, e.g. {"Name": "Kevin"}
+        self.turns = 0
+
+    def add(self, role, content):
+        """Append a message and compact older ones if over budget"""
+        self.messages.append({"role": role, "content": content.strip()})
+        if role == "user":
+            self.turns += 1
+        self._compact()
+
+    def pin_facts(self, facts):
+        """
+        Pin caller details so they survive summarization. Empty values are
+        ignored - a reset booking form doesn't make the caller anonymous.
+        """
+        changed = False
+        for key, value in facts.items():
+            if value and self.facts.get(key) != value:
+                self.facts[key] = value
+                changed = True
+        if changed:
+            self._compact()
+
+    def unpin(self, keys):
+        """Drop pinned details the caller has to give again (e.g. a date we couldn't book)"""
+        if [self.facts.pop(key) for key in keys if key in self.facts]:
+            self._compact()
+
+    def user_texts(self):
+        """Caller transcripts still held verbatim, oldest first"""
+        return [msg["content"] for msg in self.messages if msg["role"] == "user"]
+
+    def _facts_text(self):
+        if not self.facts:
+            return ""
+        return "Known caller details: " + "; ".join(f"{k}: {v}" for k, v in self.facts.items())
+
+    def _summary_text(self):
+        if not self.summary_lines:
+            return ""
+        return "Earlier in the call:\n" + "\n".join(self.summary_lines)
+
+    def _messages_tokens(self):
+        return sum(estimate_tokens(f"{ROLE_LABELS.get(m['role'], m['role'])}: {m['content']}") + 1
+                   for m in self.messages)
+
+    def token_count(self):
+        """Estimated tokens of the rendered history"""
+        return estimate_tokens(self.render())
+
+    def _compact(self):
+        """Move oldest messages into the summary until everything fits the budget"""
+        fixed = estimate_tokens(self._facts_text())
+        while len(self.messages) > MIN_RECENT_MESSAGES and \
+                fixed + estimate_tokens(self._summary_text()) + self._messages_tokens() > self.token_budget:
+            oldest = self.messages.pop(0)
+            self.summary_lines.append(summarize_message(oldest["role"], oldest["content"]))
+
+        # The summary itself is rolling - drop its oldest lines past its own budget
+        while len(self.summary_lines) > 1 and estimate_tokens(self._summary_text()) > self.summary_budget:
+            self.summary_lines.pop(0)
+
+    def preview(self, role, content):
+        """render() as if the message had been added - the history itself is unchanged"""
+        trial = copy.deepcopy(self)
+        trial.add(role, content)
+        return trial.render()
+
+    def render(self):
+        """History block for the prompt"""
+        parts = [self._facts_text(), self._summary_text()]
+        parts.append("\n".join(
+            f"{ROLE_LABELS.get(m['role'], m['role'])}: {m['content']}" for m in self.messages
+        ))
+        return "\n\n".join(part for part in parts if part)
+
+
+# Test functions
+if __name__ == "__main__":
+    print("Testing conversation memory...")
+    memory = ConversationMemory(token_budget=120, summary_budget=40)
+    memory.pin_facts({"Name": "Kevin", "Phone": "555-234-5678", "Date": "2025-12-28"})
+    memory.pin_facts({"Name": None, "Phone": None})  # Booking form reset - still the same caller
+    memory.unpin({"Date"})  # Sunday rejected - the stale date is unpinned
+
+    for i in range(8):
+        memory.add("user", f"Question number {i}: how much does the deluxe facial cost and how long is it?")
+        memory.add("assistant", f"The deluxe facial is $85 and takes 90 minutes. Anything else?")
+
+    print(f"\nTurns: {memory.turns}, kept verbatim: {len(memory.messages)}, estimated tokens: {memory.token_count()}")
+    print("\n" + memory.render())
+    assert "Date" not in memory.facts and memory.facts["Name"] == "Kevin"
+    print("\n✓ Conversation memory ready!")
@@ -0,0 +1,315 @@
+"""
+Date/Time Resolver for Salon Voice Assistant
+Turns what callers say ("next Monday at ten", "the 23rd", "half past two")
+into booking values (YYYY-MM-DD, "10:00 AM") without asking the LLM
+"""
+
+import re
+from datetime import datetime, timedelta
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MONTHS = ["january", "february", "march", "april", "may", "june", "july",
+          "august", "september", "october", "november", "december"]
+MONTH_ABBREVIATIONS = {m[:3]: i + 1 for i, m in enumerate(MONTHS)}
+
+UNITS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+         "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13,
+         "fourteen": 14, "fifteen": 15, "sixteen": 16, "seventeen": 17, "eighteen": 18,
+         "nineteen": 19}
+TENS = {"twenty": 20, "thirty": 30, "forty": 40, "fifty": 50}
+ORDINALS = {"first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6,
+            "seventh": 7, "eighth": 8, "ninth": 9, "tenth": 10, "eleventh": 11,
+            "twelfth": 12, "thirteenth": 13, "fourteenth": 14, "fifteenth": 15,
+            "sixteenth": 16, "seventeenth": 17, "eighteenth": 18, "nineteenth": 19,
+            "twentieth": 20, "thirtieth": 30}
+
+MONTH_NAME = r"(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*"
+DAY_NUMBER = r"(\d{1,2})(?:st|nd|rd|th)?"
+
+ISO_DATE_PATTERN = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+SLASH_DATE_PATTERN = re.compile(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?\b")
+MONTH_DAY_PATTERN = re.compile(r"\b" + MONTH_NAME + r"\s+(?:the\s+)?" + DAY_NUMBER + r"\b")
+DAY_MONTH_PATTERN = re.compile(r"\b" + DAY_NUMBER + r"\s+(?:of\s+)?" + MONTH_NAME + r"\b")
+ORDINAL_DAY_PATTERN = re.compile(r"\bthe\s+(\d{1,2})(?:st|nd|rd|th)\b")
+IN_DAYS_PATTERN = re.compile(r"\bin\s+(\d+)\s+days?\b")
+WEEKDAY_PATTERN = re.compile(r"\b(this|next|coming)?\s*(week\s+)?(" + "|".join(WEEKDAYS) + r")\b")
+
+CLOCK_PATTERN = re.compile(r"(?<![/\d:])\b(\d{1,2})(?::(\d{2}))?\s*(am|pm|o'?clock)?(?=[^\w/]|$)")
+QUARTER_PATTERN = re.compile(r"\b(half|quarter)\s+(past|after|to|before)\s+(\d{1,2})\b")
+# "10 30" is a clock time only next to a time word: "at 10 30", "10 30 am", "10 30 in the morning"
+SPOKEN_CLOCK_PATTERN = re.compile(r"\b(at )?(1[0-2]|[1-9]) (?:oh |o )?([0-5]?\d)\b"
+                                  r"(?=( ?(?:am|pm|o'?clock)\b| in the (?:morning|afternoon|evening)\b)?)")
+PHONE_DIGITS = 7            # A run of this many spoken or written digits is a phone number, not a time
+
+
+def words_to_numbers(text, bare_clock=False):
+    """
+    Lowercase the text and replace spoken numbers with digits:
+    "twenty third" -> "23rd", "at ten thirty" -> "at 10:30", "two" -> "2".
+    A number pair becomes a clock time only after "at" or before am/pm/o'clock,
+    so phone digits ("... six seven") stay apart; bare_clock also reads a
+    pair that ends the text as a time (the caller is answering "what time?").
+    """
+    words = re.findall(r"[a-z0-9:'/\-]+", text.lower().replace(".", ""))
+    out = []
+    i = 0
+    while i < len(words):
+        word = words[i]
+        nxt = words[i + 1] if i + 1 < len(words) else ""
+
+        if word in TENS and (nxt in UNITS and UNITS[nxt] < 10 or nxt in ORDINALS and ORDINALS[nxt] < 10):
+            if nxt in ORDINALS:
+                out.append(_ordinal(TENS[word] + ORDINALS[nxt]))
+            else:
+                out.append(str(TENS[word] + UNITS[nxt]))
+            i += 2
+            continue
+        if word in ORDINALS:
+            out.append(_ordinal(ORDINALS[word]))
+        elif word in UNITS or word in TENS:
+            out.append(str(UNITS.get(word) or TENS[word]))
+        else:
+            out.append(word)
+        i += 1
+
+    # "at 10 30" / "10 oh 5 pm" -> "at 10:30" / "10:05 pm"
+    text = " ".join(out)
+
+    def clock(match):
+        said_at, hour, minute, time_word = match.groups()
+        if not (said_at or time_word is not None or bare_clock and match.end() == len(text)):
+            return match.group(0)
+        return f"{said_at or ''}{hour}:{int(minute):02d}"
+
+    return SPOKEN_CLOCK_PATTERN.sub(clock, text)
+
+
+def has_phone_number(text):
+    """True when the text contains a phone-length run of digits ("five five five 0 1 2 3", "555-0123")"""
+    run = 0
+    for token in re.split(r"[\s.()\-]+", ISO_DATE_PATTERN.sub(" ", words_to_numbers(text))):
+        if token.isdigit() or token in ("oh", "zero"):
+            run += len(token) if token.isdigit() else 1
+            if run >= PHONE_DIGITS:
+                return True
+        else:
+            run = 0
+    return False
+
+
+def _ordinal(number):
+    suffix = "th" if 10 <= number % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(number % 10, "th")
+    return f"{number}{suffix}"
+
+
+def _safe_date(year, month, day):
+    try:
+        return datetime(year, month, day)
+    except ValueError:
+        return None
+
+
+def _future_date(now, month, day):
+    """This year's month/day, or next year's if it already passed"""
+    candidate = _safe_date(now.year, month, day)
+    if candidate and candidate.date() < now.date():
+        candidate = _safe_date(now.year + 1, month, day)
+    return candidate
+
+
+def resolve_date(text, now=None):
+    """
+    Resolve a spoken date to 'YYYY-MM-DD' (None if there is no date in the text).
+    Handles ISO/slash dates, today/tomorrow, "in 3 days", weekdays with
+    this/next, month names with ordinals and "the 23rd".
+    """
+    now = now or datetime.now()
+    text = words_to_numbers(text)
+
+    match = ISO_DATE_PATTERN.search(text)
+    if match:
+        date = _safe_date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        return date.strftime("%Y-%m-%d") if date else None
+
+    if "day after tomorrow" in text:
+        return (now + timedelta(days=2)).strftime("%Y-%m-%d")
+    if "tomorrow" in text:
+        return (now + timedelta(days=1)).strftime("%Y-%m-%d")
+    if re.search(r"\b(today|tonight|this afternoon|this evening|this morning)\b", text):
+        return now.strftime("%Y-%m-%d")
+
+    match = IN_DAYS_PATTERN.search(text)
+    if match:
+        return (now + timedelta(days=int(match.group(1)))).strftime("%Y-%m-%d")
+
+    match = MONTH_DAY_PATTERN.search(text)
+    if match:
+        date = _future_date(now, MONTH_ABBREVIATIONS[match.group(1)[:3]], int(match.group(2)))
+        return date.strftime("%Y-%m-%d") if date else None
+
+    match = DAY_MONTH_PATTERN.search(text)
+    if match:
+        date = _future_date(now, MONTH_ABBREVIATIONS[match.group(2)[:3]], int(match.group(1)))
+        return date.strftime("%Y-%m-%d") if date else None
+
+    match = SLASH_DATE_PATTERN.search(text)
+    if match:
+        month, day = int(match.group(1)), int(match.group(2))
+        if match.group(3):
+            year = int(match.group(3))
+            date = _safe_date(year + 2000 if year < 100 else year, month, day)
+        else:
+            date = _future_date(now, month, day)
+        return date.strftime("%Y-%m-%d") if date else None
+
+    match = WEEKDAY_PATTERN.search(text)
+    if match:
+        modifier, week, day_name = match.groups()
+        days_ahead = (WEEKDAYS.index(day_name) - now.weekday()) % 7
+        if days_ahead == 0 and modifier != "this":
+            days_ahead = 7  # "Monday" said on a Monday means next week
+        if week:
+            days_ahead += 7  # "next week Tuesday"
+        return (now + timedelta(days=days_ahead)).strftime("%Y-%m-%d")
+
+    match = ORDINAL_DAY_PATTERN.search(text)
+    if match:
+        day = int(match.group(1))
+        date = _safe_date(now.year, now.month, day)
+        if date is None or date.date() < now.date():
+            month = now.month % 12 + 1
+            date = _safe_date(now.year + (1 if month == 1 else 0), month, day)
+        return date.strftime("%Y-%m-%d") if date else None
+
+    return None
+
+
+def resolve_time(text, loose=False):
+    """
+    Resolve a spoken time to minutes after midnight (None if no time found).
+    "10 am", "2:30pm", "ten thirty", "half past two", "noon", "3 o'clock".
+    Bare numbers ("ten") only count when loose, i.e. we just asked for a time.
+    Without am/pm, 8-11 are mornings and 12-7 afternoons (salon hours).
+    Text containing a phone number has no time - its digits aren't hours.
+    """
+    if has_phone_number(text):
+        return None
+    text = words_to_numbers(text, bare_clock=loose)
+
+    if re.search(r"\b(noon|midday)\b", text):
+        return 12 * 60
+
+    meridiem = None
+    if re.search(r"\b(morning|am)\b", text):
+        meridiem = "am"
+    elif re.search(r"\b(afternoon|evening|tonight|pm)\b", text):
+        meridiem = "pm"
+
+    match = QUARTER_PATTERN.search(text)
+    if match:
+        amount = 30 if match.group(1) == "half" else 15
+        hour = int(match.group(3))
+        minutes = hour * 60 + (amount if match.group(2) in ("past", "after") else -amount)
+        return _apply_meridiem(minutes // 60, minutes % 60, meridiem)
+
+    for match in CLOCK_PATTERN.finditer(text):
+        hour = int(match.group(1))
+        minute = int(match.group(2) or 0)
+        suffix = match.group(3)
+        if hour > 23 or minute > 59:
+            continue
+        start = match.start()
+        said_at = text[max(0, start - 3):start] == "at "
+        if not (suffix or match.group(2) or said_at or loose):
+            continue
+        if suffix in ("am", "pm"):
+            return _apply_meridiem(hour, minute, suffix)
+        return _apply_meridiem(hour, minute, meridiem)
+
+    return None
+
+
+def _apply_meridiem(hour, minute, meridiem):
+    if hour > 12:
+        return hour * 60 + minute  # Already 24-hour
+    hour = hour % 12
+    if meridiem == "pm" or (meridiem is None and hour < 8):
+        hour += 12
+    return hour * 60 + minute
+
+
+def format_time(minutes):
+    """Minutes after midnight -> slot format '10:00 AM'"""
+    hour, minute = divmod(minutes, 60)
+    period = "AM" if hour < 12 else "PM"
+    return f"{hour % 12 or 12}:{minute:02d} {period}"
+
+
+def slot_to_minutes(slot):
+    """'10:30 AM' -> 630"""
+    parsed = datetime.strptime(slot, "%I:%M %p")
+    return parsed.hour * 60 + parsed.minute
+
+
+def validate_booking_time(date_str, minutes, hours, slots):
+    """
+    Check a resolved date/time against business hours and the slot grid.
+    hours: (open_minutes, close_minutes) or None when closed; slots: ['9:00 AM', ...]
+    Returns {"date", "time"} or {"error": message, "suggestion": slot}
+    """
+    day_name = datetime.strptime(date_str, "%Y-%m-%d").strftime("%A")
+    if hours is None or not slots:
+        return {"error": f"We're closed on {day_name}s"}
+
+    if minutes is None:
+        return {"date": date_str, "time": None}
+
+    open_minutes, close_minutes = hours
+    if minutes < open_minutes or minutes >= close_minutes:
+        return {"error": f"We're open {format_time(open_minutes)} to {format_time(close_minutes)} on {day_name}s",
+                "suggestion": slots[0] if minutes < open_minutes else slots[-1]}
+
+    slot_minutes = [slot_to_minutes(slot) for slot in slots]
+    if minutes in slot_minutes:
+        return {"date": date_str, "time": format_time(minutes)}
+
+    nearest = min(slots, key=lambda slot: abs(slot_to_minutes(slot) - minutes))
+    return {"error": "Appointments start on the hour and half hour", "suggestion": nearest}
+
+
+def resolve_from_transcripts(texts, now=None):
+    """
+    Latest date and time the caller actually said, scanning newest transcript first.
+    Transcripts with a phone number in them are skipped. Returns (date_str or None, time_str or None).
+    """
+    date_str, minutes = None, None
+    for text in reversed(list(texts)):
+        if has_phone_number(text):
+            continue
+        if date_str is None:
+            date_str = resolve_date(text, now)
+        if minutes is None:
+            minutes = resolve_time(text)
+        if date_str and minutes is not None:
+            break
+    return date_str, (format_time(minutes) if minutes is not None else None)
+
+
+# Test functions
+if __name__ == "__main__":
+    now = datetime.now()
+    print(f"Testing date resolver (now = {now.strftime('%A %Y-%m-%d')})...\n")
+    for phrase in ["next Monday at ten", "tomorrow at half past two", "the twenty third",
+                   "December 3rd at 4pm", "this friday at ten thirty", "in 3 days at noon"]:
+        minutes = resolve_time(phrase)
+        print(f"   '{phrase}' -> {resolve_date(phrase, now)} {format_time(minutes) if minutes is not None else '-'}")
+
+    # Phone digits are not a time, and don't hide the time said earlier
+    transcripts = ["Can I come Monday at 10am", "My number is five five five two three four five six seven eight"]
+    date_str, time_str = resolve_from_transcripts(transcripts, now)
+    assert time_str == "10:00 AM", time_str
+    assert resolve_time("five five five oh one two three") is None
+    assert resolve_time("ten thirty", loose=True) == 10 * 60 + 30
+    assert words_to_numbers("my number ends six seven") == "my number ends 6 7"
+    print(f"   {transcripts} -> {date_str} {time_str}")
+    print("\n✓ Date resolver ready!")
@@ -0,0 +1,311 @@
+"""
+Booking Dialog State for Salon Voice Assistant
+Fills the booking form (name, phone, service, date, time) straight from transcripts
+Asks the next question from templates - the LLM is only used for free-form turns
+"""
+
+import re
+from datetime import datetime
+
+from booking_tools import check_availability, book_appointment, get_time_slots
+from date_resolver import resolve_date, resolve_time, validate_booking_time
+from response_cache import caller_values
+
+SLOT_ORDER = ["name", "phone", "service", "date", "time"]
+
+BOOKING_KEYWORDS = ["book", "appointment", "schedule", "reserve"]
+YES_PHRASES = ["yes", "yeah", "yep", "sure", "okay", "ok", "that works", "sounds good", "perfect"]
+CANCEL_PHRASES = ["never mind", "nevermind", "cancel that", "forget it", "don't book", "stop booking"]
+
+QUESTION_TEMPLATES = {
+    "name": "I'd be happy to help! What's your name?",
+    "phone": "Thanks {name}! What's your phone number?",
+    "service": "What service would you like to book?",
+    "date": "What day would you like to come in for your {service}?",
+    "time": "What time on {date_spoken}?",
+}
+
+NUMBER_WORDS = {
+    "zero": "0", "oh": "0", "one": "1", "two": "2", "three": "3", "four": "4",
+    "five": "5", "six": "6", "seven": "7", "eight": "8", "nine": "9"
+}
+
+NAME_PATTERN = re.compile(r"\b(?:my name is|my name's|name is|this is|i am|i'm|it's|call me)\s+([a-z][a-z'\-]+(?:\s+[a-z][a-z'\-]+)?)", re.IGNORECASE)
+PHONE_PATTERN = re.compile(r"\+?\d[\d\s\-().]{5,}\d")
+
+# Words that are never a caller's name when they answer with a bare word
+NOT_NAMES = {"yes", "yeah", "no", "okay", "ok", "sure", "hello", "hi", "hey", "thanks",
+             "thank", "please", "um", "uh", "the", "a", "book", "appointment", "i", "my",
+             "what", "can", "do", "is", "how", "sorry", "for", "to", "not", "just", "here",
+             "interested", "good", "fine", "great", "available", "free", "ready", "busy"}
+
+
+def extract_phone(text, loose=False):
+    """Phone number from digits, or spoken digits ("five five five ...") when loose"""
+    match = PHONE_PATTERN.search(text)
+    if match:
+        digits = re.sub(r"\D", "", match.group(0))
+        if len(digits) >= 7:
+            return match.group(0).strip()
+    if loose:
+        spoken = "".join(NUMBER_WORDS.get(w, w if w.isdigit() else "")
+                         for w in re.findall(r"[a-z]+|\d+", text.lower()))
+        if len(spoken) >= 7:
+            return spoken
+    return None
+
+
+def extract_name(text, loose=False, assistant_name=""):
+    """Caller name from an introduction, or a bare 1-2 word answer when loose"""
+    candidate = None
+    match = NAME_PATTERN.search(text)
+    if match:
+        candidate = match.group(1)
+    elif loose:
+        words = re.sub(r"[^a-zA-Z'\- ]+", " ", text).split()
+        if 1 <= len(words) <= 2 and not any(w.lower() in NOT_NAMES for w in words):
+            candidate = " ".join(words)
+    if not candidate:
+        return None
+
+    # "I'm looking to book..." - verbs and filler are not names
+    words = []
+    for word in candidate.split():
+        if word.lower() in NOT_NAMES or word.lower().endswith("ing"):
+            break
+        words.append(word)
+    if not words or len(words[0]) < 2:
+        return None
+    name = " ".join(w[0].upper() + w[1:] for w in words)
+    if assistant_name and name.lower() == assistant_name.lower():
+        return None
+    return name
+
+
+class BookingDialog:
+    """Tracks one caller's booking form and answers form-filling turns locally"""
+
+    def __init__(self, kb_provider, now_fn=datetime.now):
+        """kb_provider: callable returning the current CompiledKB (follows KB reloads)"""
+        self.kb_provider = kb_provider
+        self.now_fn = now_fn
+        self.rejected = set()  # Slots the caller must answer again, until take_rejected()
+        self.reset()
+
+    def reset(self):
+        """Forget the current form (new call, finished or cancelled booking)"""
+        self.active = False
+        self.awaiting = None
+        self.slots = {slot: None for slot in SLOT_ORDER}
+        self.offered_time = None  # Slot we suggested; a "yes" accepts it
+        self.offered_service = None  # Only close match to an unclear service; a "yes" accepts it
+
+    def state(self):
+        """Short description used in cache keys: 'general' or 'booking:<awaited slot>'"""
+        return f"booking:{self.awaiting}" if self.active else "general"
+
+    def facts(self):
+        """Readable slot values for pinning in conversation memory"""
+        service = self.slots["service"]
+        return {
+            "Name": self.slots["name"],
+            "Phone": self.slots["phone"],
+            "Service": service["name"] if service else None,
+            "Date": self.slots["date"],
+            "Time": self.slots["time"] if isinstance(self.slots["time"], str) else None,
+        }
+
+    def take_rejected(self):
+        """Fact names (as in facts()) of values rejected since the last call - their pins are stale"""
+        rejected, self.rejected = self.rejected, set()
+        return {slot.capitalize() for slot in rejected}
+
+    def _reject(self, *slots):
+        """Clear slots whose answer didn't work (past date, closed day, taken time)"""
+        for slot in slots:
+            self.slots[slot] = None
+            self.rejected.add(slot)
+
+    def personal_values(self):
+        """Caller details collected so far (never cached)"""
+        return caller_values(self.slots["name"], self.slots["phone"])
+
+    def wants_turn(self, text):
+        """True if handle() might answer this utterance itself (no side effects)"""
+        lowered = text.lower()
+        return self.active or any(keyword in lowered for keyword in BOOKING_KEYWORDS)
+
+    def handle(self, text):
+        """
+        Process one caller utterance.
+        Returns the reply to speak, or None when the turn should go to the LLM.
+        """
+        lowered = text.lower()
+
+        if self.active and any(phrase in lowered for phrase in CANCEL_PHRASES):
+            self.reset()
+            return "No problem, I won't book anything. Is there anything else I can help with?"
+
+        if not self.active:
+            if not any(keyword in lowered for keyword in BOOKING_KEYWORDS):
+                return None
+            self.active = True
+
+        said_yes = any(re.search(r"\b" + phrase + r"\b", lowered) for phrase in YES_PHRASES)
+        if self.offered_time and self.awaiting == "time" and said_yes:
+            self.slots["time"] = self.offered_time
+            self.offered_time = None
+            return self._next_step()
+        if self.offered_service and self.awaiting == "service" and said_yes:
+            self.slots["service"] = self.offered_service
+            self.offered_service = None
+            return self._next_step()
+        self.offered_service = None
+
+        filled = self._fill_slots(text)
+        if not filled and self.awaiting:
+            if self.awaiting == "service":
+                options = self.kb_provider().services.candidates(text)
+                if len(options) == 1:
+                    self.offered_service = options[0]
+                    return f"Did you mean {options[0]['name']}?"
+                if options:
+                    return f"Which one would you like: {', '.join(e['name'] for e in options)}?"
+            return None  # Free-form question in the middle of booking - let the LLM answer
+
+        return self._next_step()
+
+    def _fill_slots(self, text):
+        """Run the extractors; the awaited slot gets the looser variant. Returns filled slot names."""
+        filled = []
+        now = self.now_fn()
+        extracted = {
+            "phone": extract_phone(text, loose=self.awaiting == "phone"),
+            "name": extract_name(text, loose=self.awaiting == "name", assistant_name=self.kb_provider().assistant_name),
+            "service": self.kb_provider().services.resolve(text),
+            "date": resolve_date(text, now),
+            "time": resolve_time(text, loose=self.awaiting == "time"),
+        }
+
+        for slot in SLOT_ORDER:
+            if extracted[slot] is not None and (not self.slots[slot] or slot == self.awaiting):
+                self.slots[slot] = extracted[slot]
+                filled.append(slot)
+        return filled
+
+    def _check_date_time(self):
+        """
+        Validate date/time against business hours and the slot grid.
+        Converts the time slot from minutes to '10:00 AM'. Returns an error reply or None.
+        """
+        date = self.slots["date"]
+        minutes = self.slots["time"]
+        if not date:
+            return None
+        if isinstance(minutes, str):
+            return None  # Already validated
+
+        day = datetime.strptime(date, "%Y-%m-%d")
+        if day.date() < self.now_fn().date():
+            self._reject("date")
+            self.awaiting = "date"
+            return "That date has already passed. What day would you like?"
+
+        result = validate_booking_time(date, minutes, self.kb_provider().hours_for(day), get_time_slots(day))
+        if "error" in result:
+            if minutes is None or "suggestion" not in result:
+                self._reject("date", "time")
+                self.awaiting = "date"
+                return f"{result['error']}. What other day works for you?"
+            self._reject("time")
+            self.awaiting = "time"
+            self.offered_time = result["suggestion"]
+            return f"{result['error']}. Would {result['suggestion']} work?"
+
+        self.slots["time"] = result["time"]
+        return None
+
+    def _next_step(self):
+        """Ask for the next missing slot, or book when the form is complete"""
+        problem = self._check_date_time()
+        if problem:
+            return problem
+
+        for slot in SLOT_ORDER:
+            if not self.slots[slot]:
+                self.awaiting = slot
+                return self._ask(slot)
+
+        return self._book()
+
+    def _ask(self, slot):
+        date_spoken = ""
+        if self.slots["date"]:
+            date_spoken = datetime.strptime(self.slots["date"], "%Y-%m-%d").strftime("%A, %B %d")
+        service = self.slots["service"]
+        return QUESTION_TEMPLATES[slot].format(
+            name=(self.slots["name"] or "").split(" ")[0],
+            service=service["name"] if service else "appointment",
+            date_spoken=date_spoken
+        )
+
+    def _book(self):
+        date, time_slot, service = self.slots["date"], self.slots["time"], self.slots["service"]
+
+        availability = check_availability(date, time_slot)
+        if "error" in availability:
+            self._reject("date", "time")
+            self.awaiting = "date"
+            return f"{availability['error']}. What other day works for you?"
+        if not availability.get("available"):
+            self._reject("time")
+            self.awaiting = "time"
+            open_slots = availability.get("open_slots", [])
+            if open_slots:
+                return f"Sorry, {time_slot} is taken. I have {', '.join(open_slots[:3])}. Which works for you?"
+            return "Sorry, that day is fully booked. What other day works for you?"
+
+        print(f"[Dialog] Form complete - booking {service['name']} for {self.slots['name']}")
+        result = book_appointment(
+            customer_name=self.slots["name"],
+            phone=self.slots["phone"],
+            date_str=date,
+            time_str=time_slot,
+            service=service["name"],
+            price=service["price"],
+            duration=service["duration"]
+        )
+        name = self.slots["name"].split(" ")[0]
+        if result["success"]:
+            print(f"[Dialog] ✓ Appointment #{result['appointment']['id']} created successfully!")
+            self.reset()
+            date_spoken = datetime.strptime(date, "%Y-%m-%d").strftime("%A, %B %d")
+            return f"Perfect! Your {service['name']} is confirmed for {date_spoken} at {time_slot}. See you then, {name}!"
+
+        self._reject("time")
+        self.awaiting = "time"
+        return f"Sorry, that time isn't available. {result.get('error', '')}. What other time works?"
+
+
+# Test functions
+if __name__ == "__main__":
+    from kb_manager import compile_kb_file
+
+    print("Testing booking dialog (no booking is saved)...")
+    compiled = compile_kb_file("knowledge_base.json")
+    dialog = BookingDialog(lambda: compiled)
+
+    for utterance in ["I'd like to book a pedicure", "Kevin", "555 234 5678", "do you have parking?",
+                      "next Sunday", "Tuesday", "quarter past ten"]:
+        print(f"   Caller: {utterance}")
+        print(f"   Reply:  {dialog.handle(utterance) or '(LLM handles this turn)'}")
+
+    print(f"\nSlots: { {k: v for k, v in dialog.slots.items() if k != 'service'} }")
+
+    # One close match is confirmed with a yes/no question, not offered as a list of one
+    dialog.reset()
+    for utterance in ["Book me in please", "Kevin", "555 234 5678", "something gel", "yes"]:
+        print(f"   Caller: {utterance}")
+        print(f"   Reply:  {dialog.handle(utterance) or '(LLM handles this turn)'}")
+    print(f"Service: {dialog.slots['service']['name']}")
+    print("\n✓ Booking dialog ready!")
@@ -0,0 +1,292 @@
+"""
+Fake Ollama Server for Salon Voice Assistant
+A stand-in for Ollama's /api/generate and /api/chat streaming (NDJSON) API
+with scripted replies (including TOOL: lines), configurable time-to-first-token
+and tokens/sec per model, and fault injection - so the client, tool parsing,
+model router and streaming paths can be tested and benchmarked without a model.
+
+Run:  python fake_ollama.py [--port 11435] [--script fake_ollama.json] [--ttft 0.3] [--tps 25]
+                            [--faults timeout=0.1,truncate=0.05,malformed=0.05,error=0.02] [--seed 1]
+Use:  OLLAMA_API_URL=http://127.0.0.1:11435/api/generate python voice_assistant.py
+
+Faults: timeout   - hang before the first token (until hang_seconds or the client gives up)
+        truncate  - close the connection mid-reply without the final done line
+        malformed - send a broken JSON line in the middle of the stream
+        error     - answer HTTP 500 {"error": ...}
+Runtime control: POST /_fake/config with JSON settings to change, GET /_fake/stats
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_PORT = 11435  # Next to the real Ollama (11434) so both can run
+FAULTS = ["timeout", "truncate", "malformed", "error"]
+
+DEFAULT_CONFIG = {
+    "ttft": 0.3,               # Seconds until the first token
+    "tokens_per_sec": 25.0,
+    "models": {},              # Per-model overrides, e.g. {"qwen2.5:3b": {"ttft": 1.5, "tokens_per_sec": 12}}
+    "faults": {},              # Probability per request, e.g. {"truncate": 0.05}
+    "hang_seconds": 120.0,     # How long a "timeout" fault hangs
+    "seed": None,              # Fixed seed = the same faults in the same order every run
+    # First matching rule (regex on the caller's last line) wins; a rule may force a "fault".
+    # {tomorrow} is replaced with tomorrow's date (YYYY-MM-DD) so tool lines stay valid.
+    "responses": [
+        {"match": r"\b(manager|owner|complain)", "response": "TOOL:CALL_MANAGER"},
+        {"match": r"\b(available|availability|openings?|free slots?)\b", "response": "TOOL:CHECK_SLOTS:{tomorrow}"},
+        {"match": r"\b(confirm|book it|go ahead)\b",
+         "response": "TOOL:BOOK:Jordan Lee|555-867-5309|{tomorrow}|10:00 AM|Men's Haircut"},
+        {"match": r"\b(open|close|hours)\b",
+         "response": "We're open 9 AM to 7 PM Monday to Friday and 9 AM to 6 PM on Saturday. Anything else I can help with?"},
+        {"match": r"\b(price|cost|how much)\b",
+         "response": "A men's haircut is $25 and takes about 30 minutes. Would you like to book one?"},
+    ],
+    "default_response": "Sure, I can help with that. Could you tell me a little more about what you need?",
+}
+
+TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def last_caller_line(prompt):
+    """The caller's most recent words in a rendered prompt ('User: ...' lines), else the prompt's tail"""
+    lines = [line for line in prompt.splitlines() if line.startswith("User:")]
+    return lines[-1][len("User:"):].strip() if lines else prompt[-300:]
+
+
+class FakeOllama:
+    """Scripted replies, timing and faults; serve() runs the HTTP server"""
+
+    def __init__(self, config=None):
+        self.config = json.loads(json.dumps(DEFAULT_CONFIG))  # Deep copy
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "active": 0, "completed": 0, "tokens": 0, "faults": {f: 0 for f in FAULTS}}
+        self.server = None
+        self.update(config or {})
+
+    def update(self, settings):
+        with self.lock:
+            self.config.update(settings)
+            self.rules = [(re.compile(rule["match"], re.IGNORECASE), rule) for rule in self.config["responses"]]
+            self.rng = random.Random(self.config["seed"])
+
+    def timing(self, model):
+        settings = self.config["models"].get(model, {})
+        return (settings.get("ttft", self.config["ttft"]),
+                settings.get("tokens_per_sec", self.config["tokens_per_sec"]))
+
+    def plan(self, model, caller_text):
+        """(reply text, fault or None, ttft, tokens/sec) for one request"""
+        with self.lock:
+            rule = next((r for pattern, r in self.rules if pattern.search(caller_text)), None)
+            text = rule["response"] if rule else self.config["default_response"]
+            fault = rule.get("fault") if rule else None
+            if fault is None:
+                for name in FAULTS:
+                    if self.rng.random() < self.config["faults"].get(name, 0.0):
+                        fault = name
+                        break
+            self.stats["requests"] += 1
+            if fault:
+                self.stats["faults"][fault] += 1
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+        ttft, tps = self.timing(model)
+        return text.replace("{tomorrow}", tomorrow), fault, ttft, tps
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps(self.stats))
+
+    def serve(self, host="127.0.0.1", port=FAKE_PORT, background=False):
+        """Start the HTTP server (in a daemon thread when background=True); returns the server"""
+        self.server = ThreadingHTTPServer((host, port), make_handler(self))
+        self.server.daemon_threads = True
+        if background:
+            threading.Thread(target=self.server.serve_forever, name="fake-ollama", daemon=True).start()
+        return self.server
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api/generate"
+
+    def close(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def make_handler(fake):
+    class FakeOllamaHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Chunked streaming like the real server
+
+        def log_message(self, format, *args):
+            pass  # Load tests would flood the console
+
+        def read_json(self):
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def write_chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                models = sorted(set(fake.config["models"]) | {"fake"})
+                self.send_json(200, {"models": [{"name": m, "model": m} for m in models]})
+            elif self.path == "/_fake/stats":
+                self.send_json(200, fake.snapshot())
+            else:
+                self.send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            try:
+                request = self.read_json()
+            except (ValueError, json.JSONDecodeError):
+                self.send_json(400, {"error": "invalid JSON body"})
+                return
+            if self.path == "/_fake/config":
+                fake.update(request)
+                self.send_json(200, {"ok": True})
+            elif self.path == "/api/generate":
+                self.answer(request, last_caller_line(request.get("prompt", "")), chat=False)
+            elif self.path == "/api/chat":
+                users = [m.get("content", "") for m in request.get("messages", []) if m.get("role") == "user"]
+                self.answer(request, users[-1] if users else "", chat=True)
+            else:
+                self.send_json(404, {"error": "not found"})
+
+        def line(self, model, token, chat, done=False, extra=None):
+            payload = {"model": model, "created_at": now_iso()}
+            if chat:
+                payload["message"] = {"role": "assistant", "content": token}
+            else:
+                payload["response"] = token
+            payload["done"] = done
+            payload.update(extra or {})
+            return (json.dumps(payload) + "\n").encode("utf-8")
+
+        def answer(self, request, caller_text, chat):
+            model = request.get("model", "fake")
+            text, fault, ttft, tps = fake.plan(model, caller_text)
+            start = time.perf_counter()
+
+            if fault == "error":
+                self.send_json(500, {"error": "injected server error"})
+                return
+            if fault == "timeout":
+                ttft = fake.config["hang_seconds"]
+
+            with fake.lock:
+                fake.stats["active"] += 1
+            try:
+                if not request.get("stream", True):
+                    time.sleep(ttft + len(TOKEN_PATTERN.findall(text)) / tps)
+                    key = "message" if chat else "response"
+                    value = {"role": "assistant", "content": text} if chat else text
+                    self.send_json(200, {"model": model, "created_at": now_iso(), key: value, "done": True})
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                tokens = TOKEN_PATTERN.findall(text)
+                cut = len(tokens) // 2 if fault in ("truncate", "malformed") else None
+                time.sleep(ttft)
+                for i, token in enumerate(tokens):
+                    if i == cut and fault == "truncate":
+                        self.close_connection = True
+                        return  # No terminating chunk, no done line
+                    if i == cut and fault == "malformed":
+                        self.write_chunk(b'{"model": "' + model.encode() + b'", "response": "brok\n')
+                    if i:
+                        time.sleep(1.0 / tps)
+                    self.write_chunk(self.line(model, token, chat))
+                elapsed_ns = int((time.perf_counter() - start) * 1e9)
+                self.write_chunk(self.line(model, "", chat, done=True, extra={
+                    "done_reason": "stop",
+                    "total_duration": elapsed_ns,
+                    "load_duration": 0,
+                    "prompt_eval_count": len(caller_text.split()),
+                    "eval_count": len(tokens),
+                    "eval_duration": elapsed_ns - int(ttft * 1e9),
+                }))
+                self.wfile.write(b"0\r\n\r\n")
+                with fake.lock:
+                    fake.stats["completed"] += 1
+                    fake.stats["tokens"] += len(tokens)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # Client gave up (e.g. router fallback or barge-in)
+            finally:
+                with fake.lock:
+                    fake.stats["active"] -= 1
+
+    return FakeOllamaHandler
+
+
+def parse_faults(spec):
+    """'timeout=0.1,truncate=0.05' -> {'timeout': 0.1, 'truncate': 0.05}"""
+    faults = {}
+    for entry in spec.split(","):
+        name, _, rate = entry.partition("=")
+        if name.strip():
+            if name.strip() not in FAULTS:
+                raise ValueError(f"Unknown fault '{name.strip()}' (choose from {', '.join(FAULTS)})")
+            faults[name.strip()] = float(rate or 1.0)
+    return faults
+
+
+# Run the server
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama server for tests and benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=FAKE_PORT)
+    parser.add_argument("--script", help="JSON file with settings/responses to merge over the defaults")
+    parser.add_argument("--ttft", type=float, help="Seconds to first token")
+    parser.add_argument("--tps", type=float, help="Tokens per second")
+    parser.add_argument("--faults", default="", help="e.g. timeout=0.1,truncate=0.05")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    settings = {}
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            settings.update(json.load(f))
+    if args.ttft is not None:
+        settings["ttft"] = args.ttft
+    if args.tps is not None:
+        settings["tokens_per_sec"] = args.tps
+    if args.faults:
+        settings["faults"] = parse_faults(args.faults)
+    if args.seed is not None:
+        settings["seed"] = args.seed
+
+    fake = FakeOllama(settings)
+    server = fake.serve(args.host, args.port)
+    print(f"[Fake Ollama] Listening on http://{args.host}:{args.port} "
+          f"(ttft {fake.config['ttft']}s, {fake.config['tokens_per_sec']} tok/s, faults {fake.config['faults'] or 'none'})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n[Fake Ollama] Shutting down... {fake.snapshot()}")
+        server.server_close()
@@ -0,0 +1,276 @@
+"""
+Knowledge Base Manager for Salon Voice Assistant
+Watches knowledge_base.json and compiles it into indexed lookups
+New versions are swapped in between turns - no restart, no model reload
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from service_catalog import ServiceCatalog, display_name
+
+KB_PATH = "knowledge_base.json"
+POLL_INTERVAL = 2.0  # Seconds between mtime checks in the watcher thread
+
+# business_hours / daily_schedule keys -> weekday numbers (Monday=0)
+DAY_KEYS = {
+    "monday": [0], "tuesday": [1], "wednesday": [2], "thursday": [3],
+    "friday": [4], "saturday": [5], "sunday": [6],
+    "monday_to_friday": [0, 1, 2, 3, 4],
+    "weekdays": [0, 1, 2, 3, 4],
+    "weekends": [5, 6],
+}
+
+CLOCK_PATTERN = re.compile(r"(\d{1,2})(?::(\d{2}))?\s*([AaPp][Mm])")
+
+
+def clock_to_minutes(text):
+    """Convert '9:00 AM', '7:30_PM' or '4 PM' to minutes after midnight (None if unparseable)"""
+    match = CLOCK_PATTERN.search(text.replace("_", " "))
+    if not match:
+        return None
+    hour = int(match.group(1)) % 12
+    minute = int(match.group(2) or 0)
+    if match.group(3).upper() == "PM":
+        hour += 12
+    return hour * 60 + minute
+
+
+def build_kb_context(kb):
+    """Build context string from knowledge base for salon"""
+    context = f"""
+SALON INFO:
+- Name: {kb['business_info']['name']}
+- Owner: {kb['business_info']['owner_name']}
+- Phone: {kb['business_info']['phone']}
+- Address: {kb['business_info']['address']}
+
+BUSINESS HOURS:
+- Weekdays: {kb['business_hours']['monday_to_friday']}
+- Saturday: {kb['business_hours']['saturday']}
+- Sunday: {kb['business_hours']['sunday']}
+
+SERVICES:
+"""
+
+    # Add services with pricing
+    for category, services in kb["services"].items():
+        context += f"\n{category.upper()}:\n"
+        for service_name, details in services.items():
+            context += f"  - {display_name(service_name)}: ${details['price']} ({details['duration']} min)\n"
+
+    # Add staff
+    context += f"\nSTAFF:\n"
+    for role, members in kb["staff"].items():
+        context += f"  - {role.replace('_', ' ').title()}: {', '.join(members)}\n"
+
+    # Add policies
+    context += f"\nPOLICIES:\n"
+    for policy_name, policy_text in kb["policies"].items():
+        context += f"  - {policy_name.title()}: {policy_text}\n"
+
+    return context
+
+
+def parse_business_hours(kb):
+    """Return {weekday: (open_minutes, close_minutes) or None when closed}"""
+    hours = {day: None for day in range(7)}
+    for key, text in kb.get("business_hours", {}).items():
+        days = DAY_KEYS.get(key)
+        if not days:
+            continue  # e.g. "holidays" note
+        times = [m for m in (clock_to_minutes(part) for part in text.split("-")) if m is not None]
+        for day in days:
+            hours[day] = (times[0], times[1]) if len(times) == 2 else None
+    return hours
+
+
+def parse_daily_schedule(kb):
+    """Return {weekday: [(minutes, activity), ...]} sorted by time"""
+    schedule = {}
+    for key, slots in kb.get("daily_schedule", {}).items():
+        days = DAY_KEYS.get(key)
+        if not days:
+            continue
+        entries = []
+        for time_key, activity in slots.items():
+            minutes = clock_to_minutes(time_key)
+            if minutes is not None:
+                entries.append((minutes, activity))
+        entries.sort()
+        for day in days:
+            schedule[day] = entries
+    return schedule
+
+
+class CompiledKB:
+    """Read-only, pre-indexed view of one version of knowledge_base.json"""
+
+    def __init__(self, raw, version):
+        self.raw = raw
+        self.version = version
+        self.assistant_name = raw["assistant_info"]["name"]
+        self.business_name = raw["business_info"]["name"]
+        self.owner_name = raw["business_info"]["owner_name"]
+        self.services = ServiceCatalog(raw)
+        self.hours = parse_business_hours(raw)
+        self.daily_schedule = parse_daily_schedule(raw)
+        self.context = build_kb_context(raw)
+
+    def find_service(self, name):
+        """Canonical service entry for a spoken or LLM-emitted name (None if unknown/ambiguous)"""
+        return self.services.resolve(name)
+
+    def hours_for(self, date):
+        """(open_minutes, close_minutes) for a date, or None when closed"""
+        return self.hours.get(date.weekday())
+
+    def activity_at(self, when):
+        """Most recent daily_schedule activity at the given datetime"""
+        minutes = when.hour * 60 + when.minute
+        activity = "unknown"
+        for start, desc in self.daily_schedule.get(when.weekday(), []):
+            if start > minutes:
+                break
+            activity = desc
+        return activity
+
+
+def compile_kb_file(path):
+    """Read and compile a knowledge base file"""
+    with open(path, 'rb') as f:
+        content = f.read()
+    raw = json.loads(content.decode('utf-8'))
+    version = hashlib.sha256(content).hexdigest()[:16]
+    return CompiledKB(raw, version)
+
+
+class KnowledgeBaseManager:
+    """
+    Holds the current CompiledKB and swaps in new versions.
+    Changes are compiled in the background (watcher thread or check_for_updates)
+    and only become current when swap_if_pending() is called between turns.
+    """
+
+    def __init__(self, path=KB_PATH):
+        self.path = path
+        self.current = compile_kb_file(path)
+        self.pending = None
+        self.listeners = []
+        self.lock = threading.Lock()
+        self._stat = self._file_stat()
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def _file_stat(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+
+    def on_swap(self, listener):
+        """Register listener(compiled_kb) called after each swap"""
+        self.listeners.append(listener)
+
+    def check_for_updates(self):
+        """Compile the file into `pending` if it changed on disk. Returns True if a new version is ready."""
+        stat = self._file_stat()
+        if stat is None or stat == self._stat:
+            return self.pending is not None
+        self._stat = stat
+
+        try:
+            compiled = compile_kb_file(self.path)
+        except FileNotFoundError:
+            return self.pending is not None
+        except Exception as e:
+            # Half-saved or broken edit (bad JSON, missing key, "price": "twenty") - keep serving the current version
+            print(f"[KB Error] Ignoring invalid {self.path}: {type(e).__name__}: {e}")
+            return self.pending is not None
+
+        with self.lock:
+            if compiled.version == self.current.version:
+                # Edited and reverted before the next turn
+                self.pending = None
+                return False
+            self.pending = compiled
+        return True
+
+    def swap_if_pending(self):
+        """Make the latest compiled version current. Call only between turns."""
+        if self._watcher is None:
+            self.check_for_updates()
+
+        with self.lock:
+            compiled = self.pending
+            self.pending = None
+            if compiled is None:
+                return False
+            self.current = compiled
+
+        print(f"[KB] Knowledge base reloaded (version {compiled.version})")
+        for listener in self.listeners:
+            try:
+                listener(compiled)
+            except Exception as e:
+                print(f"[KB Error] Reload listener failed: {e}")
+        return True
+
+    def start_watching(self, interval=POLL_INTERVAL):
+        """Poll the file mtime in a daemon thread so compilation happens off the turn path"""
+        if self._watcher:
+            return
+
+        def watch():
+            while not self._stop.wait(interval):
+                try:
+                    self.check_for_updates()
+                except Exception as e:  # Never let one bad poll end hot-reloading
+                    print(f"[KB Error] Reload check failed: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="kb-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+
+
+# Test functions
+if __name__ == "__main__":
+    from datetime import datetime
+
+    print("Testing knowledge base manager...")
+    manager = KnowledgeBaseManager(KB_PATH)
+    kb = manager.current
+
+    print(f"\n1. Version: {kb.version}, assistant: {kb.assistant_name}")
+    print(f"2. Services indexed: {len(kb.services)}")
+    print(f"   Lookup 'mens haircut': {kb.find_service('mens haircut')}")
+    print(f"3. Hours today: {kb.hours_for(datetime.now())}")
+
+    start = time.perf_counter()
+    changed = manager.swap_if_pending()
+    print(f"4. Reload check: changed={changed} ({(time.perf_counter() - start) * 1000:.2f} ms)")
+
+    # A bad value in an edit is reported and skipped; the current version stays
+    import shutil
+    import tempfile
+    scratch = os.path.join(tempfile.mkdtemp(prefix="kb_"), "knowledge_base.json")
+    shutil.copyfile(KB_PATH, scratch)
+    scratch_manager = KnowledgeBaseManager(scratch)
+    with open(scratch, encoding="utf-8") as f:
+        data = json.load(f)
+    category = next(iter(data["services"].values()))
+    next(iter(category.values()))["price"] = "twenty"
+    with open(scratch, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.utime(scratch, (time.time() + 5, time.time() + 5))
+    print(f"5. Bad price: new version ready={scratch_manager.check_for_updates()}, "
+          f"still serving {scratch_manager.current.version}")
+
+    print("\n✓ Knowledge base manager ready!")
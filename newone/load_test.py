@@ -0,0 +1,442 @@
+"""
+Load Test for Salon Voice Assistant
+Simulates N concurrent callers running scripted conversations (questions,
+availability checks and bookings that compete for the same few slots) through
+the real call logic - booking form, response cache, model router, LLM client and
+booking_tools - and reports throughput, p95 turn latency, booking conflicts and
+CPU/RSS over time, so we know how many lines one box can hold before adding one.
+
+Run:  python load_test.py [--callers 1,2,4,8] [--calls 3] [--think 1.0] [--p95-target 2.0]
+                          [--ollama URL] [--ttft 0.3] [--tps 25] [--stt-wav caller.wav] [--out load_out]
+      Without --ollama a fake_ollama.py server runs in-process (scripted replies,
+      fixed timing) so the numbers measure our side; point --ollama at the real
+      server (http://localhost:11434/api/generate) to include the model.
+      --stt-wav transcribes that recording on the shared STT worker before every
+      turn (real Whisper load; the scripted text still drives the conversation).
+
+Each level gets a fresh copy of bookings.json (same slot grid, no appointments)
+in the output folder and an empty in-memory response cache, so runs repeat.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import threading
+import time
+
+from bench_vad import rss_mb
+
+SAMPLE_INTERVAL = 0.5    # Seconds between CPU/RSS samples
+MAX_BOOKING_RETRIES = 3  # A caller told "taken" tries another time this often, then gives up
+
+# Caller lines; {name} {phone} {service} {day} {time} are filled per caller
+SCRIPTS = {
+    "booking": ["Hi, I'd like to book a {service}", "My name is {name}", "{phone}", "{day}", "at {time}"],
+    "questions": ["What time do you close on Saturday?", "How much is a {service}?",
+                  "Do you have any openings {day}?", "Okay, thanks a lot"],
+    "ask_then_book": ["How much is a {service}?", "Great, can I book a {service} appointment?",
+                      "It's {name}", "{phone}", "{day} at {time}"],
+}
+SCRIPT_MIX = ["booking", "questions", "ask_then_book"]
+SERVICES = ["men's haircut", "blowout", "manicure"]
+CONTESTED_TIMES = ["10 am", "11 am", "2 pm"]  # Few times, many callers -> conflicts
+BOOKING_DAY = "next wednesday"
+FIRST_NAMES = ["Alice", "Bruno", "Chloe", "Dmitri", "Elena", "Farid", "Grace", "Hiro",
+               "Ines", "Jamal", "Keiko", "Liam", "Maya", "Nikos", "Olga", "Priya"]
+
+TAKEN_PATTERN = re.compile(r"is taken\. I have ([^.]+)\.")
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def caller_values(caller, call):
+    """Per-caller details for the script placeholders"""
+    name = FIRST_NAMES[caller % len(FIRST_NAMES)]
+    return {
+        "name": f"{name} Tester{call + 1}",
+        "phone": f"555 {caller + 1:03d} {call + 1:04d}",
+        "service": SERVICES[(caller + call) % len(SERVICES)],
+        "day": BOOKING_DAY,
+        "time": CONTESTED_TIMES[(caller + call) % len(CONTESTED_TIMES)],
+    }
+
+
+class ResourceSampler:
+    """Samples this process's CPU (cores busy) and RSS on a background thread"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = []
+        self.probes = {}  # name -> callable added to every sample
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self, **probes):
+        self.samples = []
+        self.probes = probes
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="load-sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+    def _run(self):
+        start = last_wall = time.perf_counter()
+        times = os.times()
+        last_cpu = times.user + times.system
+        while not self.stop_event.wait(self.interval):
+            now = time.perf_counter()
+            times = os.times()
+            cpu = times.user + times.system
+            rss, peak = rss_mb()
+            rss = rss if rss is not None else peak  # Peak only where the current RSS is unknown
+            sample = {"t": round(now - start, 2),
+                      "cpu_cores": round((cpu - last_cpu) / (now - last_wall), 2),
+                      "rss_mb": round(rss, 1) if rss is not None else None}
+            for name, probe in self.probes.items():
+                sample[name] = probe()
+            self.samples.append(sample)
+            last_wall, last_cpu = now, cpu
+
+    def summary(self):
+        cpu = [s["cpu_cores"] for s in self.samples]
+        rss = [s["rss_mb"] for s in self.samples if s["rss_mb"] is not None]
+        return {
+            "cpu_cores_avg": round(sum(cpu) / len(cpu), 2) if cpu else None,
+            "cpu_cores_max": max(cpu) if cpu else None,
+            "rss_mb_max": max(rss) if rss else None,
+        }
+
+
+class BookingCounter:
+    """Wraps book_appointment to count attempts, lost races and errors"""
+
+    def __init__(self, book_fn):
+        self.book_fn = book_fn
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counts = {"attempts": 0, "booked": 0, "lost_races": 0, "errors": 0}
+
+    def _count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def __call__(self, *args, **kwargs):
+        self._count("attempts")
+        try:
+            result = self.book_fn(*args, **kwargs)
+        except Exception:
+            self._count("errors")
+            raise
+        self._count("booked" if result.get("success") else "lost_races")  # Slot went between check and book
+        return result
+
+
+def make_session_class(va):
+    """LoadSession built on voice_assistant.CallSession (imported after OLLAMA_API_URL is set)"""
+
+    class LoadSession(va.CallSession):
+        """A scripted caller: text in, replies recorded instead of spoken"""
+
+        def __init__(self, session_id, models, scheduler, caller, think=1.0, stt_audio=None, seed=0):
+            super().__init__(session_id, models, scheduler)
+            self.caller = caller
+            self.think = think
+            self.stt_audio = stt_audio
+            self.rng = random.Random(seed * 1000 + caller)
+            self.turns = []
+            self.calls = []
+            self.manager_alerts = 0
+
+        def speak(self, text):
+            """No audio - the reply (or a filler) being ready counts as first audio"""
+            trace = self.trace
+            if text and trace and not trace.finished:
+                trace.mark("tts_start")
+                trace.mark("first_audio")
+
+        def alert_manager(self):
+            self.manager_alerts += 1  # No popup during a load test
+
+        def take_turn(self, text):
+            """One caller turn; returns the reply ('' on an error)"""
+            trace = self.start_trace()
+            trace.mark("speech_end")
+            turn = {"caller": self.session_id, "at": time.perf_counter(), "text": text, "error": None}
+            try:
+                if self.stt_audio:
+                    self.scheduler.run("stt", self.session_id, self.transcribe_traced, trace, self.stt_audio)
+                reply = self.respond(text) or ""
+                self.speak(reply)
+                trace.finish()
+            except Exception as e:
+                self.log(f"[Load] Turn failed: {type(e).__name__}: {e}")
+                turn["error"] = type(e).__name__
+                reply = ""
+                trace.finish("error")
+            stages = trace.stages()
+            turn.update(latency=stages.get("turn"), stt=stages.get("stt"),
+                        answered_by=trace.attrs.get("answered_by", "llm"), reply=reply)
+            self.turns.append(turn)
+            return reply
+
+        def pause(self):
+            """Caller speaking / thinking time between turns"""
+            if self.think > 0:
+                time.sleep(self.think * self.rng.uniform(0.5, 1.5))
+
+        def run_call(self, script_name, call):
+            self.start_new_call()
+            values = caller_values(self.caller, call)
+            record = {"script": script_name, "booked": False, "taken": 0, "retries": 0, "gave_up": False}
+            reply = ""
+            for line in SCRIPTS[script_name]:
+                reply = self.take_turn(line.format(**values))
+                self.pause()
+
+            # Told the slot is gone? Take the first time offered, like a real caller
+            while "confirmed" not in reply and ("is taken" in reply or "isn't available" in reply):
+                record["taken"] += 1
+                if record["retries"] >= MAX_BOOKING_RETRIES:
+                    record["gave_up"] = True
+                    break
+                record["retries"] += 1
+                offered = TAKEN_PATTERN.search(reply)
+                if offered:
+                    next_time = offered.group(1).split(",")[0].strip()
+                else:
+                    next_time = CONTESTED_TIMES[(self.caller + call + record["retries"]) % len(CONTESTED_TIMES)]
+                reply = self.take_turn(f"how about {next_time}")
+                self.pause()
+            record["booked"] = "confirmed" in reply
+            self.calls.append(record)
+
+        def run_calls(self, calls, start_delay=0.0):
+            time.sleep(start_delay)
+            for call in range(calls):
+                self.run_call(SCRIPT_MIX[(self.caller + call) % len(SCRIPT_MIX)], call)
+
+    return LoadSession
+
+
+def prepare_bookings(source, sandbox_path):
+    """Empty bookings file with the shop's slot grid"""
+    try:
+        with open(source, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        data = {}
+    data["appointments"] = []
+    data["next_appointment_id"] = 1
+    with open(sandbox_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def double_bookings(path):
+    """Confirmed appointments sharing a date and time (must always be 0)"""
+    with open(path, "r", encoding="utf-8") as f:
+        appointments = json.load(f)["appointments"]
+    seen, doubles = set(), 0
+    for appt in appointments:
+        if appt["status"] != "confirmed":
+            continue
+        key = (appt["date"], appt["time"])
+        doubles += key in seen
+        seen.add(key)
+    return doubles
+
+
+def summarize_level(callers, sessions, wall_seconds, counter, sampler, scheduler, bookings_path):
+    turns = [t for s in sessions for t in s.turns]
+    calls = [c for s in sessions for c in s.calls]
+    latencies = [t["latency"] for t in turns if t["latency"] is not None]
+    by_answer = {}
+    for turn in turns:
+        if turn["latency"] is not None:
+            by_answer.setdefault(turn["answered_by"], []).append(turn["latency"])
+    stt = [t["stt"] for t in turns if t["stt"] is not None]
+    minutes = wall_seconds / 60
+
+    def ms(seconds):
+        return round(seconds * 1000) if seconds is not None else None
+
+    return {
+        "callers": callers,
+        "wall_s": round(wall_seconds, 1),
+        "calls": len(calls),
+        "turns": len(turns),
+        "turns_per_min": round(len(turns) / minutes, 1) if minutes else None,
+        "calls_per_min": round(len(calls) / minutes, 2) if minutes else None,
+        "latency_ms": {"p50": ms(percentile(latencies, 0.5)), "p95": ms(percentile(latencies, 0.95)),
+                       "max": ms(max(latencies) if latencies else None)},
+        "latency_by_answer_ms": {name: {"count": len(values), "p95": ms(percentile(values, 0.95))}
+                                 for name, values in sorted(by_answer.items())},
+        "stt_ms": {"p50": ms(percentile(stt, 0.5)), "p95": ms(percentile(stt, 0.95))} if stt else None,
+        "bookings": dict(counter.counts,
+                         confirmed_calls=sum(c["booked"] for c in calls),
+                         taken_replies=sum(c["taken"] for c in calls),
+                         gave_up=sum(c["gave_up"] for c in calls),
+                         double_bookings=double_bookings(bookings_path)),
+        "errors": sum(1 for t in turns if t["error"]),
+        "manager_alerts": sum(s.manager_alerts for s in sessions),
+        "resources": sampler.summary(),
+        "workers": scheduler.stats(),
+        "timeline": sampler.samples,
+    }
+
+
+def run_level(va, LoadSession, callers, args, models, stt_audio, counter, bookings_source, bookings_path):
+    """Run every caller's calls concurrently on a fresh bookings file and cache"""
+    from response_cache import ResponseCache
+
+    prepare_bookings(bookings_source, bookings_path)
+    va.response_cache = ResponseCache(max_entries=va.RESPONSE_CACHE_SIZE, kb_version=va.kb_manager.current.version)
+    counter.reset()
+    scheduler = va.FairScheduler()
+    sessions = [LoadSession(f"caller{i + 1}", models, scheduler, i, args.think, stt_audio, args.seed)
+                for i in range(callers)]
+
+    def in_flight():
+        return sum(pool["pending"] for pool in scheduler.stats().values())
+
+    sampler = ResourceSampler()
+    sampler.start(queued_jobs=in_flight)
+    threads = [threading.Thread(target=s.run_calls, args=(args.calls, i * args.think / max(callers, 1)),
+                                name=s.session_id, daemon=True) for i, s in enumerate(sessions)]
+    started = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        wall_seconds = time.perf_counter() - started
+        sampler.stop()
+        scheduler.shutdown()
+    return summarize_level(callers, sessions, wall_seconds, counter, sampler, scheduler, bookings_path)
+
+
+def capacity(levels, p95_target):
+    """Most concurrent callers that stayed under the p95 target with no errors or double bookings"""
+    ok = [level["callers"] for level in levels
+          if level["latency_ms"]["p95"] is not None and level["latency_ms"]["p95"] <= p95_target * 1000
+          and not level["errors"] and not level["bookings"]["double_bookings"]]
+    return max(ok) if ok else 0
+
+
+def print_report(report):
+    print(f"\n{'callers':>7} {'turns/min':>10} {'calls/min':>10} {'p50':>7} {'p95':>7} {'max':>7} "
+          f"{'taken':>6} {'lost':>5} {'double':>7} {'errors':>7} {'CPU avg/max':>12} {'RSS max':>8}")
+    for level in report["levels"]:
+        latency, bookings, res = level["latency_ms"], level["bookings"], level["resources"]
+        cpu = f"{res['cpu_cores_avg']}/{res['cpu_cores_max']}" if res["cpu_cores_avg"] is not None else "n/a"
+        rss = f"{res['rss_mb_max']:.0f} MB" if res["rss_mb_max"] is not None else "n/a"
+        cells = [f"{latency[k]}" if latency[k] is not None else "-" for k in ("p50", "p95", "max")]
+        print(f"{level['callers']:>7} {level['turns_per_min']:>10} {level['calls_per_min']:>10} "
+              f"{cells[0]:>7} {cells[1]:>7} {cells[2]:>7} {bookings['taken_replies']:>6} "
+              f"{bookings['lost_races']:>5} {bookings['double_bookings']:>7} {level['errors']:>7} "
+              f"{cpu:>12} {rss:>8}")
+    for level in report["levels"]:
+        print(f"\n[{level['callers']} callers] by answer: {level['latency_by_answer_ms']}")
+        print(f"[{level['callers']} callers] workers: {level['workers']}")
+    print(f"\nLLM: {report['llm']}")
+    print(f"Capacity: {report['capacity']} concurrent caller(s) with p95 turn latency <= {report['p95_target_s']}s "
+          f"(latency in ms, CPU in busy cores)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent-caller load test and capacity report")
+    parser.add_argument("--callers", default="1,2,4,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--calls", type=int, default=3, help="Calls per caller at each level")
+    parser.add_argument("--think", type=float, default=1.0, help="Average seconds between a caller's turns")
+    parser.add_argument("--p95-target", type=float, default=2.0, help="Turn latency target in seconds")
+    parser.add_argument("--ollama", help="Real Ollama /api/generate URL (default: in-process fake server)")
+    parser.add_argument("--ttft", type=float, default=0.3, help="Fake server: seconds to first token")
+    parser.add_argument("--tps", type=float, default=25.0, help="Fake server: tokens per second")
+    parser.add_argument("--faults", default="", help="Fake server faults, e.g. truncate=0.05,timeout=0.01")
+    parser.add_argument("--stt-wav", help="Recording transcribed before every turn (loads Whisper)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default="load_out", help="Folder for bookings copies, traces and report.json")
+    args = parser.parse_args()
+    levels = [int(n) for n in args.callers.split(",") if n.strip()]
+
+    os.makedirs(args.out, exist_ok=True)
+    fake = None
+    if args.ollama:
+        os.environ["OLLAMA_API_URL"] = args.ollama
+    else:
+        from fake_ollama import FakeOllama, parse_faults
+        fake = FakeOllama({"ttft": args.ttft, "tokens_per_sec": args.tps,
+                           "faults": parse_faults(args.faults) if args.faults else {}, "seed": args.seed})
+        fake.serve(port=0, background=True)
+        os.environ["OLLAMA_API_URL"] = fake.url
+        print(f"[Load] Fake Ollama at {fake.url} (ttft {args.ttft}s, {args.tps} tok/s)")
+    os.environ.setdefault("TRACE_DIR", os.path.join(args.out, "traces"))
+
+    import booking_tools
+    import dialog_state
+    import voice_assistant as va
+
+    # Sandbox: bookings on a copy; count every booking attempt
+    bookings_source = booking_tools.BOOKINGS_FILE
+    bookings_path = os.path.join(args.out, "bookings.json")
+    booking_tools.BOOKINGS_FILE = bookings_path
+    counter = BookingCounter(booking_tools.book_appointment)
+    dialog_state.book_appointment = counter
+    va.book_appointment = counter
+
+    models, stt_audio = None, None
+    if args.stt_wav:
+        from replay import load_call_audio
+        stt_audio = load_call_audio(args.stt_wav, va.SAMPLERATE)
+        models = va.RemoteModels(va.parse_address(va.MODEL_SERVER)) if va.MODEL_SERVER else va.SharedModels()
+        if va.MODEL_SERVER:
+            models.load()
+        else:
+            models.load_whisper()
+
+    LoadSession = make_session_class(va)
+    results = []
+    try:
+        for callers in levels:
+            print(f"\n[Load] {callers} concurrent caller(s), {args.calls} call(s) each...")
+            results.append(run_level(va, LoadSession, callers, args, models, stt_audio, counter,
+                                     bookings_source, bookings_path))
+            shutil.copyfile(bookings_path, os.path.join(args.out, f"bookings_{callers}.json"))
+    except KeyboardInterrupt:
+        print("\n[Load] Interrupted - reporting finished levels")
+    finally:
+        if fake:
+            fake.close()
+        if models is not None and va.MODEL_SERVER:
+            models.close()
+
+    if not results:
+        sys.exit(1)
+    report = {
+        "ollama": args.ollama or "fake",
+        "p95_target_s": args.p95_target,
+        "levels": results,
+        "capacity": capacity(results, args.p95_target),
+        "llm": va.model_router.stats(),
+        "fake_ollama": fake.snapshot() if fake else None,
+    }
+    print_report(report)
+    with open(os.path.join(args.out, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[Load] Report saved to {os.path.join(args.out, 'report.json')}")
+    print("\n✓ Load test done!")
@@ -0,0 +1,433 @@
+"""
+Model Router for Salon Voice Assistant
+Sends simple turns to a small fast model and heavier ones to the default model,
+tracks rolling latency per model and never leaves the caller in silence:
+if the first token misses its deadline we switch to the fast model, then
+say a filler phrase while the answer finishes. A fast model that fails
+(e.g. not pulled yet) hands the turn to the default model.
+Tiering is off unless FAST_MODEL_NAME is set (ollama pull it first).
+"""
+
+import asyncio
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+
+DEFAULT_MODEL = "qwen2.5:3b"
+FAST_MODEL = os.environ.get("FAST_MODEL_NAME", "")  # e.g. "qwen2.5:0.5b"; unset = no tiering
+FIRST_TOKEN_DEADLINE = float(os.environ.get("FIRST_TOKEN_DEADLINE", "3.0"))  # Seconds of silence we accept
+RESPONSE_TIMEOUT = 30.0      # Give up on a reply entirely after this long
+LATENCY_WINDOW = 20          # Turns remembered per model
+SIMPLE_MAX_WORDS = 6         # "yes please", "what time do you close" ...
+
+# Turns that may need a tool call stay on the default model
+TOOL_KEYWORDS = re.compile(r"\b(book|booking|appointment|available|availability|opening|openings|"
+                           r"schedule|reschedule|cancel|slot|slots|manager|owner|complain\w*)\b", re.IGNORECASE)
+
+FILLER_PHRASES = [
+    "One moment, let me check that for you.",
+    "Just a second please.",
+    "Let me look that up.",
+]
+
+
+class GenerationCancelled(Exception):
+    """The caller's cancel_event was set (e.g. a speculative reply was discarded)"""
+
+
+_local = threading.local()  # .generation: the _Generation a stream_fn runs for
+
+
+def on_cancel(callback):
+    """
+    Called by a stream_fn from inside its generation: run callback (e.g. close
+    the HTTP response) as soon as the generation is cancelled, instead of when
+    the next chunk arrives. Does nothing outside ModelRouter.generate.
+    """
+    generation = getattr(_local, "generation", None)
+    if generation is not None:
+        generation.add_cancel_hook(callback)
+
+
+def classify_turn(user_text, dialog_state="general"):
+    """'tool', 'simple' (short or a booking-form answer) or 'general'"""
+    if TOOL_KEYWORDS.search(user_text):
+        return "tool"
+    if dialog_state.startswith("booking:") or len(user_text.split()) <= SIMPLE_MAX_WORDS:
+        return "simple"
+    return "general"
+
+
+class RollingLatency:
+    """Recent time-to-first-token and total times for one model"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.first_token = deque(maxlen=window)
+        self.total = deque(maxlen=window)
+        self.misses = 0
+        self.errors = 0
+
+    def record(self, first_token, total):
+        self.first_token.append(first_token)
+        self.total.append(total)
+
+    @staticmethod
+    def _percentile(values, pct):
+        if not values:
+            return None
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+    def p90_first_token(self):
+        return self._percentile(self.first_token, 0.9)
+
+    def stats(self):
+        p50 = self._percentile(self.first_token, 0.5)
+        p90 = self.p90_first_token()
+        return {
+            "turns": len(self.total),
+            "first_token_p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "first_token_p90_ms": round(p90 * 1000) if p90 is not None else None,
+            "total_p50_ms": round(self._percentile(self.total, 0.5) * 1000) if self.total else None,
+            "deadline_misses": self.misses,
+            "errors": self.errors,
+        }
+
+
+class ModelRouter:
+    """Picks a model per turn and runs it with first-token fallback"""
+
+    def __init__(self, default_model=DEFAULT_MODEL, fast_model=FAST_MODEL,
+                 first_token_deadline=FIRST_TOKEN_DEADLINE, response_timeout=RESPONSE_TIMEOUT):
+        self.default_model = default_model
+        self.fast_model = fast_model if fast_model and fast_model != default_model else None
+        self.first_token_deadline = first_token_deadline
+        self.response_timeout = response_timeout
+        self.latency = {m: RollingLatency() for m in (default_model, self.fast_model) if m}
+        self.routed = {m: 0 for m in self.latency}
+        self.fillers = 0
+        self.filler_index = 0
+        self.lock = threading.Lock()
+
+    def choose(self, user_text, dialog_state="general"):
+        """Model for this turn"""
+        if not self.fast_model:
+            return self.default_model
+        kind = classify_turn(user_text, dialog_state)
+        if kind == "simple":
+            return self.fast_model
+        if kind == "general":
+            # Default model has been too slow lately - answer general questions fast instead
+            p90 = self.latency[self.default_model].p90_first_token()
+            if p90 is not None and p90 >= self.first_token_deadline:
+                return self.fast_model
+        return self.default_model
+
+    def fallback_for(self, model):
+        """Model to switch to after a first-token miss (None = only a filler is left)"""
+        return self.fast_model if self.fast_model and model != self.fast_model else None
+
+    def next_filler(self):
+        with self.lock:
+            phrase = FILLER_PHRASES[self.filler_index % len(FILLER_PHRASES)]
+            self.filler_index += 1
+            self.fillers += 1
+        return phrase
+
+    def record(self, model, first_token, total):
+        with self.lock:
+            self.latency[model].record(first_token, total)
+            self.routed[model] += 1
+
+    def record_miss(self, model, waited):
+        """A missed deadline still tells us the model took at least `waited` seconds"""
+        with self.lock:
+            self.latency[model].misses += 1
+            self.latency[model].first_token.append(waited)
+
+    def record_error(self, model):
+        with self.lock:
+            self.latency[model].errors += 1
+
+    def stats(self):
+        return {
+            "routed": dict(self.routed),
+            "fillers": self.fillers,
+            "models": {m: lat.stats() for m, lat in self.latency.items()},
+        }
+
+    # --- Threaded path ---
+    def generate(self, user_text, dialog_state, stream_fn, prompt, system_prompt, on_filler=None, cancel_event=None):
+        """
+        stream_fn(model, prompt, system_prompt) yields text chunks (blocking).
+        Returns (full_text, model). Re-raises stream errors; TimeoutError if nothing
+        arrives; GenerationCancelled as soon as cancel_event is set.
+        """
+        model = self.choose(user_text, dialog_state)
+        start = time.perf_counter()
+        try:
+            generation, model, first = self._first_chunk(model, stream_fn, prompt, system_prompt, cancel_event)
+
+            if first is _PENDING:
+                self.record_miss(model, self.first_token_deadline)
+                fallback = self.fallback_for(model)
+                if fallback:
+                    print(f"[Router] No first token from {model} in {self.first_token_deadline}s - switching to {fallback}")
+                    generation.cancel()
+                    generation, model, first = self._first_chunk(fallback, stream_fn, prompt, system_prompt,
+                                                                 cancel_event)
+                    if first is _PENDING:
+                        self.record_miss(model, self.first_token_deadline)
+
+            if first is _PENDING:
+                if on_filler:
+                    on_filler(self.next_filler())
+                remaining = self.response_timeout - (time.perf_counter() - start)
+                first = generation.next_chunk(max(remaining, 0.0))
+                if first is _PENDING:
+                    generation.cancel()
+                    raise TimeoutError(f"{model} did not answer within {self.response_timeout}s")
+
+            first_token = time.perf_counter() - start
+            chunks = [] if first is _DONE else [first]
+            while first is not _DONE:
+                remaining = self.response_timeout - (time.perf_counter() - start)
+                chunk = generation.next_chunk(max(remaining, 0.0))
+                if chunk is _DONE:
+                    break
+                if chunk is _PENDING:
+                    generation.cancel()
+                    print(f"[Router] {model} reply cut off after {self.response_timeout}s")
+                    break
+                chunks.append(chunk)
+        except (TimeoutError, GenerationCancelled):
+            raise
+        except Exception:
+            self.record_error(model)
+            raise
+
+        self.record(model, first_token, time.perf_counter() - start)
+        return "".join(chunks), model
+
+    def _first_chunk(self, model, stream_fn, prompt, system_prompt, cancel_event):
+        """Start a generation and wait for its first chunk -> (generation, model, chunk or _PENDING/_DONE)"""
+        generation = _Generation(stream_fn, model, prompt, system_prompt, cancel_event)
+        try:
+            return generation, model, generation.next_chunk(self.first_token_deadline)
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            if model != self.fast_model:
+                raise
+            self.record_error(model)
+            print(f"[Router] {model} failed ({e}) - answering with {self.default_model}")
+            generation = _Generation(stream_fn, self.default_model, prompt, system_prompt, cancel_event)
+            return generation, self.default_model, generation.next_chunk(self.first_token_deadline)
+
+    # --- asyncio path ---
+    async def generate_async(self, user_text, dialog_state, open_stream, on_filler=None):
+        """
+        open_stream(model) returns an async iterator of text chunks.
+        on_filler(phrase) is a coroutine function, started without waiting on it.
+        Returns (full_text, model); raises asyncio.TimeoutError if nothing arrives.
+        """
+        model = self.choose(user_text, dialog_state)
+        start = time.perf_counter()
+        stream = open_stream(model)
+        pending = asyncio.ensure_future(stream.__anext__())
+        try:
+            model, stream, pending, done = await self._first_chunk_async(model, stream, pending, open_stream)
+            if not done:
+                self.record_miss(model, self.first_token_deadline)
+                fallback = self.fallback_for(model)
+                if fallback:
+                    print(f"[Router] No first token from {model} in {self.first_token_deadline}s - switching to {fallback}")
+                    await _abandon(pending, stream)
+                    stream = open_stream(fallback)
+                    pending = asyncio.ensure_future(stream.__anext__())
+                    model, stream, pending, done = await self._first_chunk_async(fallback, stream, pending,
+                                                                                 open_stream)
+                    if not done:
+                        self.record_miss(model, self.first_token_deadline)
+
+            if not done:
+                if on_filler:
+                    asyncio.ensure_future(on_filler(self.next_filler()))
+                remaining = self.response_timeout - (time.perf_counter() - start)
+                done, _ = await asyncio.wait({pending}, timeout=max(remaining, 0.0))
+                if not done:
+                    raise asyncio.TimeoutError(f"{model} did not answer within {self.response_timeout}s")
+
+            try:
+                chunks = [pending.result()]
+            except StopAsyncIteration:
+                chunks = []
+            first_token = time.perf_counter() - start
+            if chunks:
+                remaining = self.response_timeout - first_token
+                try:
+                    await asyncio.wait_for(_drain(stream, chunks), max(remaining, 0.01))
+                except asyncio.TimeoutError:
+                    print(f"[Router] {model} reply cut off after {self.response_timeout}s")
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            raise
+        except Exception:
+            self.record_error(model)
+            raise
+        finally:
+            await _abandon(pending, stream)
+
+        self.record(model, first_token, time.perf_counter() - start)
+        return "".join(chunks), model
+
+    async def _first_chunk_async(self, model, stream, pending, open_stream):
+        """Wait for the first chunk of an opened stream -> (model, stream, pending, done)"""
+        done, _ = await asyncio.wait({pending}, timeout=self.first_token_deadline)
+        if done and model == self.fast_model and _failed(pending):
+            self.record_error(model)
+            print(f"[Router] {model} failed ({pending.exception()}) - answering with {self.default_model}")
+            await _abandon(pending, stream)
+            model = self.default_model
+            stream = open_stream(model)
+            pending = asyncio.ensure_future(stream.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=self.first_token_deadline)
+        return model, stream, pending, done
+
+
+def _failed(pending):
+    """A finished __anext__ that raised something other than the end of the stream"""
+    return not pending.cancelled() and pending.exception() is not None \
+        and not isinstance(pending.exception(), StopAsyncIteration)
+
+
+async def _abandon(pending, stream):
+    """Cancel an in-flight __anext__ and close the stream (closes the HTTP connection)"""
+    if not pending.done():
+        pending.cancel()
+    await asyncio.gather(pending, return_exceptions=True)
+    await stream.aclose()
+
+
+async def _drain(stream, chunks):
+    async for chunk in stream:
+        chunks.append(chunk)
+
+
+_PENDING = object()  # No chunk within the timeout
+_DONE = object()     # Stream finished
+
+
+class _Generation:
+    """One streaming request running on a daemon thread, read with timeouts"""
+
+    def __init__(self, stream_fn, model, prompt, system_prompt, cancel_event=None):
+        self.chunks = queue.Queue()
+        self.cancelled = threading.Event()
+        self.cancel_event = cancel_event
+        self.finished = False
+        self.hooks = []  # on_cancel callbacks registered by the stream_fn
+        self.lock = threading.Lock()
+        threading.Thread(target=self._run, args=(stream_fn, model, prompt, system_prompt),
+                         name=f"llm-{model}", daemon=True).start()
+
+    def _run(self, stream_fn, model, prompt, system_prompt):
+        _local.generation = self
+        try:
+            for chunk in stream_fn(model, prompt, system_prompt):
+                if self.cancelled.is_set():
+                    return  # Closing the generator closes the HTTP response
+                self.chunks.put(chunk)
+            self.chunks.put(_DONE)
+        except Exception as e:
+            self.chunks.put(e)
+        finally:
+            _local.generation = None
+
+    def next_chunk(self, timeout):
+        """Next text chunk, _DONE, or _PENDING on timeout (stream errors are raised)"""
+        if self.finished:
+            return _DONE
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                self.cancel()
+                raise GenerationCancelled()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return _PENDING
+            try:
+                # Short waits when cancellable so a discarded reply frees the LLM worker quickly
+                item = self.chunks.get(timeout=min(remaining, 0.05) if self.cancel_event else remaining)
+                break
+            except queue.Empty:
+                continue
+        if isinstance(item, Exception):
+            self.finished = True
+            raise item
+        if item is _DONE:
+            self.finished = True
+        return item
+
+    def add_cancel_hook(self, callback):
+        with self.lock:
+            if not self.cancelled.is_set():
+                self.hooks.append(callback)
+                return
+        callback()  # Already cancelled
+
+    def cancel(self):
+        """Stop reading; hooks close the stream now rather than at its next chunk"""
+        with self.lock:
+            self.cancelled.set()
+            hooks, self.hooks = self.hooks, []
+        for hook in hooks:
+            try:
+                hook()
+            except Exception as e:
+                print(f"[Router] Closing cancelled stream failed: {e}")
+
+
+# Test functions
+if __name__ == "__main__":
+    print("Testing model router...")
+    router = ModelRouter("big-model", "small-model", first_token_deadline=0.1, response_timeout=2.0)
+
+    def fake_stream(model, prompt, system_prompt):
+        time.sleep(0.3 if model == "big-model" else 0.02)  # Big model is cold
+        for word in f"answer from {model}".split():
+            yield word + " "
+
+    for text in ["yes please", "Do you do balayage on curly hair and how long does it take?",
+                 "Can I book an appointment for Friday?"]:
+        print(f"\n'{text}' -> {classify_turn(text)} -> {router.choose(text)}")
+        reply, model = router.generate(text, "general", fake_stream, "prompt", "system",
+                                       on_filler=lambda phrase: print(f"   (filler) {phrase}"))
+        print(f"   reply: {reply.strip()} [{model}]")
+
+    # Fast model not pulled: the default model answers instead of the caller hearing an error
+    def missing_fast_model(model, prompt, system_prompt):
+        if model == "small-model":
+            raise ConnectionError("model 'small-model' not found")
+        yield f"answer from {model}"
+
+    reply, model = router.generate("yes please", "general", missing_fast_model, "prompt", "system")
+    print(f"\n'yes please' with the fast model missing -> {reply} [{model}]")
+
+    # Cancelling runs the stream's close hook right away, not at its next chunk
+    closed = threading.Event()
+
+    def stalled_stream(model, prompt, system_prompt):
+        on_cancel(closed.set)
+        closed.wait()  # Blocked in a read until the "response" is closed
+        yield "too late"
+
+    generation = _Generation(stalled_stream, "big-model", "prompt", "system")
+    time.sleep(0.05)
+    generation.cancel()
+    print(f"Stalled stream closed on cancel: {closed.wait(1.0)}")
+
+    print(f"\nStats: {router.stats()}")
+    print("\n✓ Model router ready!")
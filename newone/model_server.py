@@ -0,0 +1,387 @@
+"""
+Model Server for Salon Voice Assistant
+Hosts Whisper (STT) and Silero (VAD) once for every call process on this machine.
+Callers write audio into a shared-memory ring buffer and send only its offset
+over a local socket. VAD requests from different sessions run as one batched
+pass; STT requests are queued and transcribed one after another.
+
+Run:  python model_server.py
+Use:  MODEL_SERVER=127.0.0.1:6055 python voice_assistant.py
+
+The socket carries pickled messages, so it is protected by a secret key:
+MODEL_SERVER_AUTHKEY if set, otherwise a random key the server writes to
+MODEL_SERVER_KEY_FILE (default ~/.salon_model_server.key, readable only by
+its owner) and the call processes of the same user read back.
+"""
+
+import os
+import secrets
+import stat
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client, Listener
+
+from whisper_tuner import load_whisper_profile
+
+# --- CONFIGURATION ---
+SERVER_ADDRESS = ("127.0.0.1", 6055)
+MODEL_SERVER_KEY_FILE = os.environ.get("MODEL_SERVER_KEY_FILE",
+                                       os.path.join(os.path.expanduser("~"), ".salon_model_server.key"))
+WHISPER_PROFILE = load_whisper_profile()  # Calibrated by whisper_tuner.py
+WHISPER_MODEL_SIZE = WHISPER_PROFILE["model_size"]
+SAMPLERATE = 16000
+RING_SECONDS = 60            # Shared audio buffer per client thread (longest utterance)
+BATCH_WINDOW = 0.01          # Seconds to wait for other sessions' requests
+BATCH_MAX = {"vad": 16, "stt": 4}
+
+
+def load_authkey(create=False, path=MODEL_SERVER_KEY_FILE):
+    """
+    The connection secret: MODEL_SERVER_AUTHKEY, else the key file. The server
+    (create=True) generates the file on first run; a key file other users can
+    read is refused, since the key lets a client run code in the server.
+    """
+    if os.environ.get("MODEL_SERVER_AUTHKEY"):
+        return os.environ["MODEL_SERVER_AUTHKEY"].encode()
+    if create and not os.path.exists(path):
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+        print(f"[Model Server] Generated a connection key in {path}")
+    if not os.path.exists(path):
+        raise RuntimeError(f"No model server key: set MODEL_SERVER_AUTHKEY or start model_server.py "
+                           f"as this user first (it writes {path})")
+    if os.name == "posix" and os.stat(path).st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+        raise RuntimeError(f"{path} is readable by other users - run: chmod 600 {path}")
+    with open(path, "r", encoding="utf-8") as f:
+        key = f.read().strip()
+    if not key:
+        raise RuntimeError(f"{path} is empty - delete it and restart model_server.py")
+    return key.encode()
+
+
+def parse_address(spec):
+    """'127.0.0.1:6055' -> ('127.0.0.1', 6055)"""
+    host, _, port = spec.rpartition(":")
+    return (host or SERVER_ADDRESS[0], int(port))
+
+
+class AudioRing:
+    """Shared-memory ring buffer owned by one client; each write is contiguous"""
+
+    def __init__(self, size):
+        self.size = size
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.pos = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, data):
+        """Copy audio in and return its offset (None if it can never fit)"""
+        length = len(data)
+        if length > self.size:
+            return None
+        if self.pos + length > self.size:
+            self.pos = 0  # Wrap - the previous request was already answered
+        offset = self.pos
+        self.shm.buf[offset:offset + length] = data
+        self.pos += length
+        return offset
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+# --- Server Side ---
+class ServerModels:
+    """Whisper + VAD backend with batch entry points (heavy imports happen in load)"""
+
+    def __init__(self, whisper_size=WHISPER_MODEL_SIZE, profile=WHISPER_PROFILE):
+        self.whisper_size = whisper_size
+        self.profile = profile
+
+    def load(self):
+        global np
+        import numpy as np
+        from faster_whisper import WhisperModel
+        from resource_manager import ResourceManager
+        from vad_backends import create_vad
+
+        self.resources = ResourceManager()
+        print(f"[Model Server] CPU budget: preset {self.resources.name}, threads {self.resources.threads}")
+        print("[Model Server] Loading VAD backend...")
+        self.vad = create_vad(threads=self.resources.vad_threads())
+        print(f"[Model Server] Loading Whisper {self.whisper_size} model (profile: {self.profile})...")
+        self.resources.pin("stt")
+        self.whisper_model = WhisperModel(self.whisper_size, device="cpu", compute_type=self.profile["compute_type"],
+                                          **self.resources.whisper_kwargs())
+        self.resources.pin("vad")  # Batches run on this process's threads; keep them off the STT cores
+        print("[Model Server] Models loaded!")
+
+    def _to_float(self, audio_data):
+        return np.frombuffer(audio_data, dtype=np.int16).astype(np.float32) / 32768.0
+
+    def new_vad_state(self):
+        return self.vad.new_state()
+
+    def detect_speech_batch(self, chunks, states=None):
+        """One padded pass for all chunks where the backend supports it"""
+        with self.resources.stage("vad"):
+            return self.vad.is_speech_batch(chunks, states)
+
+    def transcribe_batch(self, chunks, states=None):
+        """
+        One request after another on the one loaded Whisper model (no per-process
+        copies) - not a batched decode; the batcher only saves the queue hand-offs
+        """
+        results = []
+        with self.resources.stage("stt"):
+            for audio_data in chunks:
+                try:
+                    segments, info = self.whisper_model.transcribe(
+                        self._to_float(audio_data),
+                        language="en",
+                        vad_filter=self.profile["vad_filter"],
+                        beam_size=self.profile["beam_size"]
+                    )
+                    results.append(" ".join(segment.text for segment in segments).strip())
+                except Exception as e:
+                    print(f"[Whisper Error] {e}")
+                    results.append("")
+        return results
+
+
+class _Batcher:
+    """Collects requests for one operation and runs them in batches"""
+
+    def __init__(self, name, run_batch, max_batch, window=BATCH_WINDOW, initializer=None):
+        self.name = name
+        self.initializer = initializer
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.window = window
+        self.pending = []
+        self.cond = threading.Condition()
+        self.batches = 0
+        self.items = 0
+        threading.Thread(target=self._loop, name=f"{name}-batcher", daemon=True).start()
+
+    def submit(self, audio_data, state=None):
+        future = Future()
+        with self.cond:
+            self.pending.append((audio_data, state, future))
+            self.cond.notify()
+        return future
+
+    def _loop(self):
+        if self.initializer:
+            self.initializer(self.name)  # The batch runs here - pin it to its stage's cores
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                # Give other sessions a moment to join this batch
+                deadline = time.monotonic() + self.window
+                while len(self.pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                batch = self.pending[:self.max_batch]
+                self.pending = self.pending[self.max_batch:]
+
+            try:
+                results = self.run_batch([audio for audio, _, _ in batch], [state for _, state, _ in batch])
+                for (_, _, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+            self.batches += 1
+            self.items += len(batch)
+
+
+class ModelServer:
+    """Accepts call-process connections and answers VAD/STT requests"""
+
+    def __init__(self, models, address=SERVER_ADDRESS, authkey=None):
+        self.models = models
+        self.address = address
+        self.authkey = authkey or load_authkey(create=True)
+        initializer = models.resources.thread_initializer if hasattr(models, "resources") else None
+        self.batchers = {
+            "vad": _Batcher("vad", models.detect_speech_batch, BATCH_MAX["vad"], initializer=initializer),
+            "stt": _Batcher("stt", models.transcribe_batch, BATCH_MAX["stt"], initializer=initializer),
+        }
+        self.listener = None
+
+    def serve_forever(self):
+        self.listener = Listener(self.address, authkey=self.authkey)
+        print(f"[Model Server] Listening on {self.address[0]}:{self.address[1]}")
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                break  # Listener closed
+            except Exception as e:
+                print(f"[Model Server] Rejected connection: {e}")
+                continue
+            threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+
+    def close(self):
+        if self.listener:
+            self.listener.close()
+
+    def _attach(self, rings, name):
+        """Open a client's ring buffer once per connection"""
+        if name not in rings:
+            shm = shared_memory.SharedMemory(name=name)
+            # The client owns (and unlinks) the segment - don't let our tracker remove it
+            resource_tracker.unregister(shm._name, "shared_memory")
+            rings[name] = shm
+        return rings[name]
+
+    def _serve_client(self, conn):
+        rings = {}
+        vad_state = self.models.new_vad_state()  # One connection per session thread = one call line
+        try:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    break
+
+                op = request.get("op")
+                if op == "stats":
+                    conn.send({"result": self.stats()})
+                    continue
+                if op not in self.batchers:
+                    conn.send({"error": f"Unknown operation: {op}"})
+                    continue
+
+                try:
+                    if "shm" in request:
+                        shm = self._attach(rings, request["shm"])
+                        offset, length = request["offset"], request["length"]
+                        audio_data = bytes(shm.buf[offset:offset + length])
+                    else:
+                        audio_data = request["audio"]  # Too long for the ring
+                    result = self.batchers[op].submit(audio_data, vad_state if op == "vad" else None).result()
+                    conn.send({"result": result})
+                except Exception as e:
+                    conn.send({"error": str(e)})
+        finally:
+            for shm in rings.values():
+                shm.close()
+            conn.close()
+
+    def stats(self):
+        """Batches run and average batch size per operation"""
+        return {
+            name: {"batches": b.batches, "items": b.items,
+                   "avg_batch": round(b.items / b.batches, 2) if b.batches else 0.0}
+            for name, b in self.batchers.items()
+        }
+
+
+# --- Client Side ---
+class RemoteModels:
+    """
+    Drop-in for SharedModels in voice_assistant.py backed by the model server.
+    Each session thread opens its own connection and ring buffer on its first
+    request; close() releases them all at shutdown.
+    """
+
+    def __init__(self, address=SERVER_ADDRESS, authkey=None, ring_bytes=RING_SECONDS * SAMPLERATE * 2):
+        self.address = address
+        self.authkey = authkey
+        self.ring_bytes = ring_bytes
+        self.local = threading.local()
+        self.channels = []
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Check the server is reachable and accepts our key (models are already loaded there)"""
+        print(f"[System] Using model server at {self.address[0]}:{self.address[1]}")
+        if self.authkey is None:
+            self.authkey = load_authkey()
+        Client(self.address, authkey=self.authkey).close()  # Sessions open their own channels
+
+    def _channel(self):
+        if not hasattr(self.local, "conn"):
+            if self.authkey is None:
+                self.authkey = load_authkey()
+            self.local.conn = Client(self.address, authkey=self.authkey)
+            self.local.ring = AudioRing(self.ring_bytes)
+            with self.lock:
+                self.channels.append((self.local.conn, self.local.ring))
+        return self.local.conn, self.local.ring
+
+    def _request(self, op, audio_data):
+        conn, ring = self._channel()
+        offset = ring.write(audio_data)
+        if offset is None:
+            conn.send({"op": op, "audio": bytes(audio_data)})
+        else:
+            conn.send({"op": op, "shm": ring.name, "offset": offset, "length": len(audio_data)})
+        reply = conn.recv()
+        if "error" in reply:
+            raise RuntimeError(f"Model server: {reply['error']}")
+        return reply["result"]
+
+    def detect_speech(self, audio_data, session_id=None):
+        """The server keeps VAD state per connection, and each session thread has its own"""
+        return self._request("vad", audio_data)
+
+    def transcribe(self, audio_data):
+        try:
+            return self._request("stt", audio_data)
+        except (RuntimeError, OSError, EOFError) as e:
+            print(f"[Whisper Error] {e}")
+            return ""
+
+    def new_stream(self):
+        """The server transcribes whole utterances, one at a time - no streaming STT over the socket"""
+        return None
+
+    def stats(self):
+        conn, _ = self._channel()
+        conn.send({"op": "stats"})
+        return conn.recv()["result"]
+
+    def close(self):
+        """Close every session's connection and free its ring buffer (call at shutdown)"""
+        with self.lock:
+            for conn, ring in self.channels:
+                conn.close()
+                ring.close()
+            self.channels = []
+
+
+# Run the server
+if __name__ == "__main__":
+    address = parse_address(os.environ["MODEL_SERVER"]) if os.environ.get("MODEL_SERVER") else SERVER_ADDRESS
+    models = ServerModels(os.environ.get("WHISPER_MODEL_SIZE", WHISPER_MODEL_SIZE))
+    try:
+        models.load()
+    except ImportError as e:
+        print(f"[Error] Missing model dependency: {e}")
+        sys.exit(1)
+
+    try:
+        server = ModelServer(models, address)
+    except (RuntimeError, OSError) as e:
+        print(f"[Error] {e}")
+        sys.exit(1)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n[Model Server] Shutting down... {server.stats()}")
+        print(f"[Model Server] CPU contention: {models.resources.stats()}")
+        server.close()
@@ -0,0 +1,349 @@
+"""
+Sampling Profiler for Salon Voice Assistant
+A stack-sampling thread that can be switched on while the assistant runs - no
+debugger, no restart. Send SIGUSR1 (kill -USR1 <pid>) or type 'p' + Enter in the
+console to start/stop it. While it is on, every call gets its own profile in
+PROFILE_DIR (with several PHONE_LINES the calls overlap, so one profile covers the
+whole time it was on, named after when it started):
+
+  <call>.collapsed         collapsed stacks (flamegraph.pl, speedscope, inferno)
+  <call>.speedscope.json   open at https://www.speedscope.app (one profile per thread)
+  <call>.threads.json      CPU per thread and per stage (audio callback, VAD, Whisper, LLM, TTS)
+
+PROFILE_DIR=profiles        PROFILE_INTERVAL_MS=10 (sampling period)
+PROFILE_ON_START=1          profile from startup instead of waiting for the toggle
+"""
+
+import json
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL_MS", "10")) / 1000
+PROFILE_ON_START = os.environ.get("PROFILE_ON_START") == "1"
+PROFILE_KEY = "p"
+MAX_DEPTH = 96              # Frames kept per stack (deepest ones)
+MAX_TIMELINE = 200000       # Ordered samples kept for speedscope; collapsed counts keep going
+CPU_EVERY = 10              # Read thread CPU clocks every N samples
+
+# First function found walking a stack from the innermost frame decides its stage
+STAGE_FUNCTIONS = {
+    "audio_callback": {"callback"},
+    "vad": {"detect_speech", "detect_speech_batch", "is_speech", "is_speech_batch"},
+    "whisper": {"transcribe", "transcribe_batch", "transcribe_traced"},
+    "llm": {"iter_ollama", "stream_ollama_async", "iter_lines"},
+    "tts": {"synthesize_to_file", "runAndWait", "play_wav", "speak", "speak_async", "render_cached_speech"},
+}
+FUNCTION_STAGES = {name: stage for stage, names in STAGE_FUNCTIONS.items() for name in names}
+
+# Innermost Python frames of a thread that is blocked rather than running
+WAIT_FUNCTIONS = {"wait", "sleep", "select", "poll", "get", "acquire", "join", "result", "accept",
+                  "_wait_for_tstate_lock", "readinto", "recv_into", "serve_forever", "_worker", "_run_once"}
+
+
+def thread_cpu_seconds(ident):
+    """CPU time used by one thread (None where the OS can't tell us)"""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError, OverflowError):
+        return None
+
+
+def stage_of(stack):
+    """Stage name for a stack of (file, function, line) tuples, outermost first"""
+    for _, function, _ in reversed(stack):
+        stage = FUNCTION_STAGES.get(function)
+        if stage:
+            return stage
+    return "other"
+
+
+class ProfileWindow:
+    """Samples collected between start and stop (one call, or until toggled off)"""
+
+    def __init__(self, label):
+        self.label = label
+        self.started = time.perf_counter()
+        self.started_at = datetime.now()
+        self.frames = {}        # (file, function, line) -> index
+        self.stack_ids = {}     # tuple of frame indexes -> stack id
+        self.stacks = []        # stack id -> tuple of frame indexes
+        self.collapsed = {}     # (thread, stack id) -> samples
+        self.timeline = {}      # thread -> [(stack id, weight ms)]
+        self.threads = {}       # thread -> {"samples", "active", "stages": {stage: samples}}
+        self.cpu_start = {}     # ident -> (thread, CPU seconds when first seen)
+        self.cpu_last = {}      # ident -> CPU seconds at the latest reading
+        self.samples = 0
+        self.overhead = 0.0     # Seconds spent sampling
+
+    def stack_id(self, stack):
+        key = tuple(self.frames.setdefault(frame, len(self.frames)) for frame in stack)
+        if key not in self.stack_ids:
+            self.stack_ids[key] = len(self.stacks)
+            self.stacks.append(key)
+        return self.stack_ids[key]
+
+    def add(self, thread, stack, weight_ms):
+        sid = self.stack_id(stack)
+        self.collapsed[(thread, sid)] = self.collapsed.get((thread, sid), 0) + 1
+        if self.samples < MAX_TIMELINE:
+            self.timeline.setdefault(thread, []).append((sid, weight_ms))
+        info = self.threads.setdefault(thread, {"samples": 0, "active": 0, "stages": {}})
+        info["samples"] += 1
+        if stack and stack[-1][1] not in WAIT_FUNCTIONS:
+            info["active"] += 1
+            stage = stage_of(stack)
+            info["stages"][stage] = info["stages"].get(stage, 0) + 1
+        self.samples += 1
+
+    def read_cpu(self, threads):
+        for ident, name in threads.items():
+            seconds = thread_cpu_seconds(ident) if ident is not None else None  # None: still starting
+            if seconds is None:
+                continue
+            if self.cpu_start.setdefault(ident, (name, seconds))[0] == name:  # Else a reused ident
+                self.cpu_last[ident] = seconds
+
+    # --- Output ---
+    def frame_list(self):
+        return sorted(self.frames, key=self.frames.get)
+
+    def collapsed_text(self):
+        frames = self.frame_list()
+        lines = []
+        for (thread, sid), count in sorted(self.collapsed.items()):
+            names = [thread] + [f"{function} ({os.path.basename(file)}:{line})"
+                                for file, function, line in (frames[i] for i in self.stacks[sid])]
+            lines.append(";".join(name.replace(";", ":") for name in names) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self):
+        profiles = []
+        for thread, samples in sorted(self.timeline.items()):
+            total = sum(weight for _, weight in samples)
+            profiles.append({
+                "type": "sampled",
+                "name": thread,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(total, 3),
+                "samples": [list(self.stacks[sid]) for sid, _ in samples],
+                "weights": [round(weight, 3) for _, weight in samples],
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.label,
+            "exporter": "salon profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": [{"name": function, "file": file, "line": line}
+                                  for file, function, line in self.frame_list()]},
+            "profiles": profiles,
+        }
+
+    def cpu_breakdown(self, wall_seconds):
+        """Per-thread CPU (thread clocks) with each thread's main stage, plus totals per stage"""
+        cpu = {}
+        for ident, (name, start) in self.cpu_start.items():
+            cpu[name] = cpu.get(name, 0.0) + self.cpu_last.get(ident, start) - start
+        threads, stages = {}, {}
+        for name, info in sorted(self.threads.items()):
+            stage = max(info["stages"], key=info["stages"].get) if info["stages"] else "idle"
+            seconds = cpu.get(name)
+            threads[name] = {
+                "stage": stage,
+                "cpu_s": round(seconds, 3) if seconds is not None else None,
+                "cpu_pct": round(seconds / wall_seconds * 100, 1) if seconds is not None and wall_seconds else None,
+                "samples": info["samples"],
+                "active_samples": info["active"],
+                "stage_samples": info["stages"],
+            }
+            totals = stages.setdefault(stage, {"cpu_s": 0.0, "active_samples": 0, "threads": 0})
+            totals["cpu_s"] = round(totals["cpu_s"] + (seconds or 0.0), 3)
+            totals["active_samples"] += info["active"]
+            totals["threads"] += 1
+        return {"label": self.label, "started_at": self.started_at.isoformat(timespec="seconds"),
+                "wall_s": round(wall_seconds, 3), "samples": self.samples,
+                "stages": stages, "threads": threads}
+
+
+class SamplingProfiler:
+    """Toggleable stack sampler over every thread of this process"""
+
+    def __init__(self, out_dir=PROFILE_DIR, interval=PROFILE_INTERVAL, per_call=True):
+        self.out_dir = out_dir
+        self.interval = interval
+        self.per_call = per_call  # Off when several lines share the process - their calls overlap
+        self.lock = threading.Lock()
+        self.window = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.writers = []  # Background threads still writing closed windows
+
+    @property
+    def active(self):
+        return self.window is not None
+
+    def start(self, label=None):
+        with self.lock:
+            if self.window:
+                return False
+            self.window = ProfileWindow(label or f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+            self.stop_event = threading.Event()  # Per window: the previous sampler may still be winding down
+            self.thread = threading.Thread(target=self._run, args=(self.window, self.stop_event),
+                                           name="profiler", daemon=True)
+            self.thread.start()
+        print(f"[Profiler] Sampling every {self.interval * 1000:.0f} ms ({self.window.label})")
+        return True
+
+    def stop(self, background=False):
+        """
+        Stop sampling and write the profile; returns the written paths. With
+        background=True the files are written on a separate thread (returns []),
+        so a call thread doesn't wait on serializing the samples; a plain stop()
+        also waits for those writes.
+        """
+        with self.lock:
+            window, self.window = self.window, None
+            if window:
+                self.stop_event.set()
+                thread = self.thread
+            self.writers = [writer for writer in self.writers if writer.is_alive()]
+            if background and window:
+                wall_seconds = time.perf_counter() - window.started
+                writer = threading.Thread(target=self._finish, args=(thread, window, wall_seconds),
+                                          name="profiler-writer")
+                self.writers.append(writer)
+                writer.start()
+                return []
+            writers = list(self.writers)
+        paths = self._finish(thread, window, time.perf_counter() - window.started) if window else []
+        for writer in writers:
+            writer.join()
+        return paths
+
+    def _finish(self, thread, window, wall_seconds):
+        thread.join()
+        return self.write(window, wall_seconds)
+
+    def toggle(self):
+        if self.active:
+            self.stop()
+        else:
+            self.start()
+
+    def next_call(self, call_id):
+        """A new call started: close the running profile and continue in one named after the call"""
+        if self.per_call and self.active:
+            self.stop(background=True)
+            self.start(call_id)
+
+    def _run(self, window, stop_event):
+        own = threading.get_ident()
+        last = time.perf_counter()
+        count = 0
+        while not stop_event.wait(self.interval):
+            began = time.perf_counter()
+            weight_ms = (began - last) * 1000
+            last = began
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_name, code.co_firstlineno))
+                    frame = frame.f_back
+                stack.reverse()
+                window.add(names.get(ident, f"thread-{ident}"), stack, weight_ms)
+            if count % CPU_EVERY == 0:
+                window.read_cpu(names)
+            count += 1
+            window.overhead += time.perf_counter() - began
+        window.read_cpu({t.ident: t.name for t in threading.enumerate()})
+
+    def write(self, window, wall_seconds):
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, re.sub(r"[^\w.-]+", "_", window.label))
+        breakdown = window.cpu_breakdown(wall_seconds)
+        breakdown["sampler_overhead_pct"] = round(window.overhead / wall_seconds * 100, 2) if wall_seconds else None
+        outputs = [(base + ".collapsed", window.collapsed_text()),
+                   (base + ".speedscope.json", json.dumps(window.speedscope())),
+                   (base + ".threads.json", json.dumps(breakdown, indent=2))]
+        for path, content in outputs:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+        busy = {stage: totals["cpu_s"] for stage, totals in breakdown["stages"].items() if totals["cpu_s"]}
+        print(f"[Profiler] {window.samples} samples over {wall_seconds:.1f}s -> {base}.* (CPU s by stage: {busy})")
+        return [path for path, _ in outputs]
+
+    # --- Runtime toggles ---
+    def install(self, use_signal=True, use_key=True):
+        """SIGUSR1 and/or 'p' + Enter on the console toggle profiling; starts now if PROFILE_ON_START=1"""
+        hooks = []
+        if use_signal and hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+            # Writing files inside a signal handler would stall the main thread - hand it off
+            signal.signal(signal.SIGUSR1, lambda signum, frame: threading.Thread(
+                target=self.toggle, name="profiler-toggle", daemon=True).start())
+            hooks.append(f"kill -USR1 {os.getpid()}")
+        if use_key and sys.stdin and sys.stdin.isatty():
+            threading.Thread(target=self._watch_keys, name="profiler-keys", daemon=True).start()
+            hooks.append(f"'{PROFILE_KEY}' + Enter")
+        if hooks:
+            print(f"[Profiler] Toggle with {' or '.join(hooks)} (profiles go to {self.out_dir}/)")
+        if PROFILE_ON_START:
+            self.start()
+
+    def _watch_keys(self):
+        for line in sys.stdin:
+            if line.strip().lower() == PROFILE_KEY:
+                self.toggle()
+
+
+# Test functions
+if __name__ == "__main__":
+    import tempfile
+
+    print("Testing sampling profiler...")
+    profiler = SamplingProfiler(tempfile.mkdtemp(prefix="profiles_"), interval=0.005)
+
+    def transcribe(seconds):
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            sum(i * i for i in range(500))
+
+    def iter_ollama(seconds):
+        time.sleep(seconds / 2)
+        end = time.perf_counter() + seconds / 2
+        while time.perf_counter() < end:
+            sorted(range(300), reverse=True)
+
+    profiler.start("call-1")
+    workers = [threading.Thread(target=transcribe, args=(0.3,), name="stt-worker-0"),
+               threading.Thread(target=iter_ollama, args=(0.4,), name="llm-worker-0")]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    profiler.next_call("call-2")  # call-1 is written in the background
+    time.sleep(0.05)
+    paths = profiler.stop()  # Also waits for the background write
+
+    with open(os.path.join(profiler.out_dir, "call-1.threads.json"), encoding="utf-8") as f:
+        breakdown = json.load(f)
+    print(f"\n1. Stages: {breakdown['stages']}")
+    print(f"2. Sampler overhead: {breakdown['sampler_overhead_pct']}%")
+    print(f"3. Files: {sorted(os.listdir(profiler.out_dir))} (last stop wrote {len(paths)})")
+
+    # Several lines: a new call keeps the running profile instead of cutting it
+    profiler.per_call = False
+    profiler.start("shared")
+    profiler.next_call("line2-call-1")
+    print(f"4. Per-call off, still on '{profiler.window.label}'")
+    profiler.stop()
+    print("\n✓ Sampling profiler ready!")
@@ -0,0 +1,446 @@
+"""
+Offline Replay for Salon Voice Assistant
+Drives the real call pipeline (VAD endpointing, Whisper, dialog, LLM, tools)
+from caller recordings instead of a microphone. Each WAV file is one call; the
+assistant's speech is written to WAV files instead of the speakers, and a
+per-turn latency + transcript report is printed and saved as report.json.
+
+Run:  python replay.py calls/*.wav [--speed 1] [--out replay_out] [--no-tts] [--stt whisper,vosk]
+      --speed 1  real time (caller audio spoken while the assistant talks is lost, like a live call)
+      --speed 4  four times faster; --speed 0 as fast as possible (the caller waits for every reply)
+      --stt      replay every call once per STT backend and compare their latency and accuracy;
+                 a call.txt next to call.wav (what the caller said) enables word error rate
+
+Bookings go to a copy of bookings.json in the output folder and the response
+cache starts empty, so replays are repeatable and never touch the real files.
+Works without a sound card (PortAudio isn't needed).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import wave
+
+import numpy as np
+
+from audio_queue import AudioQueue, AUDIO_QUEUE_CHUNKS, AUDIO_QUEUE_POLICY
+
+CHUNK_SAMPLES = 8000     # Same 0.5 s blocks as the live RawInputStream
+TRAILING_SILENCE = 10    # Chunks appended so the last utterance is endpointed
+
+
+def load_call_audio(path, samplerate):
+    """WAV -> 16-bit mono PCM bytes at samplerate (downmixed / linearly resampled if needed)"""
+    with wave.open(path, "rb") as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV files are supported")
+        channels = wf.getnchannels()
+        rate = wf.getframerate()
+        audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    audio = audio.reshape(-1, channels).mean(axis=1)
+    if rate != samplerate:
+        positions = np.arange(int(len(audio) * samplerate / rate)) * rate / samplerate
+        audio = np.interp(positions, np.arange(len(audio)), audio)
+    return audio.astype(np.int16).tobytes()
+
+
+def wav_seconds(path):
+    with wave.open(path, "rb") as wf:
+        return wf.getnframes() / wf.getframerate()
+
+
+class PositionQueue(AudioQueue):
+    """Audio queue whose items carry their offset in the recording"""
+
+    def __init__(self, speed=1.0):
+        # As fast as possible means the caller waits for every reply - nothing may be dropped
+        if speed > 0:
+            super().__init__(AUDIO_QUEUE_CHUNKS, AUDIO_QUEUE_POLICY)
+        else:
+            super().__init__(0, "drop_oldest")
+        self.position = 0.0  # Seconds into the call of the chunk last taken
+
+    def get(self, *args, **kwargs):
+        item = super().get(*args, **kwargs)
+        if item is None:
+            return None
+        self.position, data = item
+        return data
+
+
+class TimedStream:
+    """Times a streaming STT backend: per-chunk decoding and the final result after endpointing"""
+
+    def __init__(self, stream, timings):
+        self.stream = stream
+        self.timings = timings
+
+    @property
+    def partial(self):
+        return self.stream.partial
+
+    def push(self, audio_data):
+        self.stream.push(audio_data)
+
+    def update(self):
+        start = time.perf_counter()
+        text = self.stream.update()
+        self.timings["stt_chunk"].append(time.perf_counter() - start)
+        return text
+
+    def accept(self, audio_data):
+        self.push(audio_data)
+        return self.update()
+
+    def result(self):
+        start = time.perf_counter()
+        text = self.stream.result()
+        self.timings["stt"].append(time.perf_counter() - start)
+        return text
+
+
+class TimedModels:
+    """Wraps the shared models to time every VAD chunk and STT call"""
+
+    def __init__(self, models):
+        self.models = models
+        self.timings = {"vad": [], "stt": [], "stt_chunk": []}
+
+    def detect_speech(self, audio_data, session_id=None):
+        start = time.perf_counter()
+        result = self.models.detect_speech(audio_data, session_id)
+        self.timings["vad"].append(time.perf_counter() - start)
+        return result
+
+    def transcribe(self, audio_data):
+        start = time.perf_counter()
+        text = self.models.transcribe(audio_data)
+        self.timings["stt"].append(time.perf_counter() - start)
+        return text
+
+    def new_stream(self):
+        stream = self.models.new_stream()
+        return TimedStream(stream, self.timings) if stream is not None else None
+
+    def stats(self):
+        stats = {}
+        for name, values in self.timings.items():
+            if values:
+                stats[name] = {"calls": len(values),
+                               "avg_ms": round(sum(values) / len(values) * 1000, 2),
+                               "max_ms": round(max(values) * 1000, 2)}
+        return stats
+
+
+def make_session_class(va):
+    """ReplaySession built on voice_assistant.CallSession (imported after TRACE_DIR is set)"""
+
+    class ReplaySession(va.CallSession):
+        """A CallSession fed from WAV files that speaks into WAV files"""
+
+        def __init__(self, models, scheduler, out_dir, speed=1.0, synthesize=True):
+            super().__init__("replay", models, scheduler)
+            self.Q = PositionQueue(speed)
+            self.out_dir = out_dir
+            self.speed = speed
+            self.synthesize = synthesize
+            self.call_name = None
+            self.turns = []
+            self.greetings = []
+            self.speech_count = 0
+            self.call_over = threading.Event()  # 'exit' was said - stop feeding
+            self.greeted = threading.Event()    # Caller audio starts after the greeting
+
+        def current_turn(self):
+            if self.turns and self.turns[-1]["trace"] is self.trace and not self.trace.finished:
+                return self.turns[-1]
+            return None
+
+        def start_trace(self):
+            trace = super().start_trace()
+            self.turns.append({"call": self.call_name, "turn_id": trace.turn_id, "trace": trace,
+                               "speech_start_s": self.Q.position, "speech_end_s": None,
+                               "heard": None, "reply": None, "audio": []})
+            return trace
+
+        def handle_utterance(self, audio_buffer):
+            turn = self.current_turn()
+            if turn:
+                turn["speech_end_s"] = self.Q.position
+            return super().handle_utterance(audio_buffer)
+
+        def transcribe_traced(self, trace, audio_data, stream=None):
+            text = super().transcribe_traced(trace, audio_data, stream)
+            for turn in self.turns:
+                if turn["trace"] is trace:
+                    turn["heard"] = text
+            return text
+
+        def respond(self, user_input, speculation=None):
+            reply = super().respond(user_input, speculation)
+            turn = self.current_turn()
+            if turn:
+                turn["reply"] = reply
+            return reply
+
+        def speak(self, text):
+            """Render to a WAV file; at --speed > 0 the mic stays muted for the playback time"""
+            print(f"\n{va.ASSISTANT_NAME} speaking ({self.session_id}): {text}")
+            if not text:
+                return
+            trace, turn = self.trace, self.current_turn()
+            with self.stream_lock:
+                self.is_speaking = True
+                if self.speed > 0:
+                    self.Q.flush("tts")  # What muting does live
+                if trace:
+                    trace.mark("tts_start")
+                self.speech_count += 1
+                base = os.path.join(self.out_dir, self.call_name, f"{self.speech_count:03d}_assistant")
+                try:
+                    path = base + ".txt"
+                    with open(path, "w", encoding="utf-8") as f:
+                        f.write(text)
+                    if self.synthesize:
+                        with va.resources.stage("tts"):
+                            va.synthesize_to_file(text, base + ".wav")
+                        path = base + ".wav"
+                    self.mark_first_audio()  # Playback would start now
+                    (turn["audio"] if turn else self.greetings).append(os.path.relpath(path, self.out_dir))
+                    if self.synthesize and self.speed > 0:
+                        time.sleep(wav_seconds(path) / self.speed)
+                except Exception as e:
+                    print(f"[TTS Error] {e}")
+                finally:
+                    self.is_speaking = False
+                    self.greeted.set()
+
+        def feed(self, audio):
+            """Deliver the recording chunk by chunk, paced by --speed, like the audio callback"""
+            chunk_bytes = CHUNK_SAMPLES * 2
+            audio += bytes(chunk_bytes * TRAILING_SILENCE)
+            chunk_seconds = CHUNK_SAMPLES / va.SAMPLERATE
+            self.greeted.wait()
+            start = time.perf_counter()
+            for i in range(0, len(audio), chunk_bytes):
+                if self.call_over.is_set():
+                    break
+                index = i // chunk_bytes
+                if self.speed > 0:
+                    delay = start + index * chunk_seconds / self.speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                if self.speed == 0 or not self.is_speaking:  # Muted while speaking, exactly like callback()
+                    self.Q.put((index * chunk_seconds, audio[i:i + chunk_bytes].ljust(chunk_bytes, b"\0")))
+            self.Q.put(None)
+
+        def run_call(self, wav_path):
+            """Replay one recorded call through the endpointing loop"""
+            self.call_name = os.path.splitext(os.path.basename(wav_path))[0]
+            os.makedirs(os.path.join(self.out_dir, self.call_name), exist_ok=True)
+            self.speech_count = 0
+            self.call_over.clear()
+            self.greeted.clear()
+            self.Q = PositionQueue(self.speed)
+            audio = load_call_audio(wav_path, va.SAMPLERATE)
+            feeder = threading.Thread(target=self.feed, args=(audio,), name="replay-feed", daemon=True)
+            feeder.start()
+            try:
+                self.converse()
+            finally:
+                self.call_over.set()
+                self.greeted.set()  # In case the call ended before the greeting was spoken
+                feeder.join()
+                self.speculator.cancel()
+                self.log_speculation_stats()
+                self.log_queue_stats()
+                if self.trace and not self.trace.finished:
+                    self.trace.finish("unfinished")
+            return len(audio) / 2 / va.SAMPLERATE
+
+    return ReplaySession
+
+
+def load_references(wavs):
+    """call name -> what the caller said, from call.txt next to call.wav"""
+    references = {}
+    for wav_path in wavs:
+        path = os.path.splitext(wav_path)[0] + ".txt"
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                references[os.path.splitext(os.path.basename(wav_path))[0]] = f.read().strip()
+    return references
+
+
+def accuracy(turns, references):
+    """Word error rate of everything heard in each call against its reference transcript"""
+    from whisper_tuner import word_errors
+
+    calls = {}
+    errors = words = 0
+    for name, reference in references.items():
+        heard = " ".join(turn["heard"] for turn in turns if turn["call"] == name and turn["heard"])
+        call_errors, call_words = word_errors(reference, heard)
+        errors += call_errors
+        words += call_words
+        calls[name] = {"wer": round(call_errors / call_words, 3) if call_words else 0.0, "heard": heard}
+    return {"wer": round(errors / words, 3) if words else None, "calls": calls}
+
+
+def build_report(session, tracer, timed_models, audio_seconds, wall_seconds):
+    turns = []
+    for turn in session.turns:
+        trace = turn["trace"]
+        turns.append({
+            "call": turn["call"],
+            "turn_id": turn["turn_id"],
+            "outcome": trace.outcome,
+            "speech_start_s": turn["speech_start_s"],
+            "speech_end_s": turn["speech_end_s"],
+            "heard": turn["heard"],
+            "reply": turn["reply"],
+            "answered_by": trace.attrs.get("answered_by"),
+            "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in trace.stages().items()},
+            "audio": turn["audio"],
+        })
+    return {
+        "audio_seconds": round(audio_seconds, 2),
+        "wall_seconds": round(wall_seconds, 2),
+        "speed": session.speed,
+        "turns": turns,
+        "stages": tracer.summary(),
+        "models": timed_models.stats(),
+    }
+
+
+def print_comparison(reports):
+    """One line per STT backend: final STT wait after endpointing, turn latency, WER"""
+    print(f"\n{'backend':<16} {'stt p50':>8} {'stt p95':>8} {'chunk avg':>10} {'turn p50':>9} {'turn p95':>9} {'WER':>6}")
+    for name, report in reports.items():
+        stt = report["stages"].get("stt", {})
+        turn = report["stages"].get("turn", {})
+        chunk = report["models"].get("stt_chunk", {})
+        wer = report.get("accuracy", {}).get("wer")
+        cells = [stt.get("p50_ms", "-"), stt.get("p95_ms", "-"), chunk.get("avg_ms", "-"),
+                 turn.get("p50_ms", "-"), turn.get("p95_ms", "-"), "-" if wer is None else f"{wer:.1%}"]
+        print(f"{name:<16} {cells[0]:>8} {cells[1]:>8} {cells[2]:>10} {cells[3]:>9} {cells[4]:>9} {cells[5]:>6}")
+
+
+def print_report(report):
+    print(f"\n{'turn':<28} {'audio':>13} {'stt':>7} {'1st tok':>8} {'turn':>7}  heard -> reply")
+    for turn in report["turns"]:
+        stages = turn["stages_ms"]
+        span = (f"{turn['speech_start_s']:.1f}-{turn['speech_end_s']:.1f}s"
+                if turn["speech_end_s"] is not None else f"{turn['speech_start_s']:.1f}s-")
+        cells = [f"{stages[s]:.0f}" if s in stages else "-" for s in ("stt", "llm_first_token", "turn")]
+        heard = turn["heard"] or f"({turn['outcome']})"
+        reply = (turn["reply"] or "")[:60]
+        print(f"{turn['turn_id'][-28:]:<28} {span:>13} {cells[0]:>7} {cells[1]:>8} {cells[2]:>7}  {heard} -> {reply}")
+    print(f"\nStages (ms): {report['stages']}")
+    print(f"Models: {report['models']}")
+    if report.get("accuracy"):
+        print(f"WER: {report['accuracy']['wer']:.1%} over {len(report['accuracy']['calls'])} call(s) with a transcript")
+    print(f"Replayed {report['audio_seconds']}s of audio in {report['wall_seconds']}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded calls through the voice assistant")
+    parser.add_argument("wavs", nargs="+", help="Caller recordings (.wav files or folders of them), one call each")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = real time, 0 = as fast as possible")
+    parser.add_argument("--out", default="replay_out", help="Folder for assistant audio, traces and report.json")
+    parser.add_argument("--no-tts", action="store_true", help="Write the assistant's replies as text only")
+    parser.add_argument("--stt", help="STT backend(s), comma-separated to compare: whisper,whisper_stream,vosk "
+                                      "(default: STT_BACKEND)")
+    args = parser.parse_args()
+
+    wavs = []
+    for path in args.wavs:
+        if os.path.isdir(path):
+            wavs += sorted(os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(".wav"))
+        else:
+            wavs.append(path)
+    if not wavs:
+        print("[Error] No WAV files to replay")
+        sys.exit(1)
+
+    backends = args.stt.split(",") if args.stt else [None]
+    os.makedirs(args.out, exist_ok=True)
+    os.environ.setdefault("TRACE_DIR", os.path.join(args.out, "traces"))
+    import booking_tools
+    import voice_assistant as va
+    from response_cache import ResponseCache
+
+    if va.MODEL_SERVER:
+        models = va.RemoteModels(va.parse_address(va.MODEL_SERVER))
+        models.load()
+        if args.stt:
+            print("[Replay] MODEL_SERVER is set - the server transcribes, --stt is ignored")
+            backends = [None]
+    else:
+        models = va.SharedModels()
+        models.load_vad()
+    synthesize = not args.no_tts
+    if synthesize:
+        try:
+            va.warm_tts()
+        except Exception as e:
+            print(f"[Replay] TTS unavailable ({e}) - writing replies as text only")
+            synthesize = False
+
+    bookings_source = booking_tools.BOOKINGS_FILE
+    references = load_references(wavs)
+    reports = {}
+    for backend in backends:
+        out_dir = os.path.join(args.out, backend) if len(backends) > 1 else args.out
+        os.makedirs(out_dir, exist_ok=True)
+        if len(backends) > 1:
+            print(f"\n[Replay] === STT backend: {backend} ===")
+            va.tracer = va.Tracer(os.path.join(out_dir, "traces"))  # Separate latency stats per backend
+        if not va.MODEL_SERVER:
+            models.stt_backend = backend
+            models.whisper_ready.clear()
+            models.load_whisper()
+
+        # Sandbox: bookings on a copy, cache starts empty and stays in memory
+        sandbox_bookings = os.path.join(out_dir, "bookings.json")
+        if os.path.exists(bookings_source):
+            shutil.copyfile(bookings_source, sandbox_bookings)
+        booking_tools.BOOKINGS_FILE = sandbox_bookings
+        va.response_cache = ResponseCache(max_entries=va.RESPONSE_CACHE_SIZE, kb_version=va.kb_manager.current.version)
+
+        timed_models = TimedModels(models)
+        scheduler = va.FairScheduler()
+        session = make_session_class(va)(timed_models, scheduler, out_dir, args.speed, synthesize)
+
+        audio_seconds = 0.0
+        started = time.perf_counter()
+        try:
+            for wav_path in wavs:
+                print(f"\n[Replay] Call {wav_path}")
+                audio_seconds += session.run_call(wav_path)
+        finally:
+            scheduler.shutdown()
+        report = build_report(session, va.tracer, timed_models, audio_seconds, time.perf_counter() - started)
+        report["stt_backend"] = models.stt.name if not va.MODEL_SERVER else "model_server"
+        if references:
+            report["accuracy"] = accuracy(report["turns"], references)
+
+        print_report(report)
+        with open(os.path.join(out_dir, "report.json"), "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[Replay] Report saved to {os.path.join(out_dir, 'report.json')}")
+        name = report["stt_backend"]
+        reports[name if backend in (None, name) else f"{backend}->{name}"] = report  # Shows a fallback
+    if va.MODEL_SERVER:
+        models.close()
+
+    if len(reports) > 1:
+        print_comparison(reports)
+        with open(os.path.join(args.out, "stt_comparison.json"), "w", encoding="utf-8") as f:
+            json.dump({name: {"stages": r["stages"], "models": r["models"], "accuracy": r.get("accuracy")}
+                       for name, r in reports.items()}, f, indent=2)
+    print("\n✓ Replay done!")
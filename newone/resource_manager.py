@@ -0,0 +1,234 @@
+"""
+CPU Resource Manager for Salon Voice Assistant
+faster-whisper, the VAD runtime and Ollama each default to every core, so they
+fight when stages overlap. This hands each stage a thread budget (and optional
+CPU affinity) from a preset, and measures how often stages actually contend.
+
+RESOURCE_PRESET=off|auto|4core|8core   (off, the default = library defaults; auto scales to the core count)
+STAGE_THREADS="stt=3,llm=4"            per-stage overrides
+CPU_AFFINITY=1                         pin our threads to the preset's cores (Linux)
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+RESOURCE_PRESET = os.environ.get("RESOURCE_PRESET", "off")
+CPU_AFFINITY = os.environ.get("CPU_AFFINITY", "0") == "1"
+TIMING_WINDOW = 50  # Stage durations remembered for the solo/contended comparison
+
+# Stage names match async_pipeline: vad, stt, llm, tts.
+# llm is Ollama's num_thread - its cores are kept free of our own pinned threads.
+PRESETS = {
+    "4core": {
+        "threads": {"vad": 1, "stt": 2, "llm": 2, "tts": 1},
+        "stt_workers": 1,
+        "affinity": {"vad": [1], "stt": [0, 1], "tts": [1], "llm": [2, 3]},
+    },
+    "8core": {
+        "threads": {"vad": 1, "stt": 3, "llm": 4, "tts": 1},
+        "stt_workers": 1,
+        "affinity": {"vad": [3], "stt": [0, 1, 2], "tts": [3], "llm": [4, 5, 6, 7]},
+    },
+}
+
+
+def cpu_count():
+    """Cores this process may use (respects an outer affinity mask/container limit)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def auto_preset(cores):
+    """Budgets for this machine: half the cores for Ollama, the rest for Whisper but one for VAD/TTS"""
+    llm = max(1, cores // 2)
+    stt = max(1, cores - llm - 1)
+    shared = min(stt, cores - 1)  # VAD/TTS core (shares the last STT core on 1-2 core boxes)
+    return {
+        "threads": {"vad": 1, "stt": stt, "llm": llm, "tts": 1},
+        "stt_workers": 1,
+        "affinity": {"vad": [shared], "stt": list(range(stt)), "tts": [shared],
+                     "llm": list(range(cores - llm, cores))},
+    }
+
+
+def resolve_preset(name=None):
+    """Preset name -> config dict (None for 'off')"""
+    name = (name or RESOURCE_PRESET).lower()
+    if name == "off":
+        return None
+    if name == "auto":
+        return dict(auto_preset(cpu_count()), name=f"auto ({cpu_count()} cores)")
+    if name not in PRESETS:
+        raise ValueError(f"Unknown resource preset '{name}' (choose from {', '.join(PRESETS)}, auto or off)")
+    return dict(PRESETS[name], name=name)
+
+
+def parse_threads(spec):
+    """'stt=3,llm=4' -> {'stt': 3, 'llm': 4}"""
+    threads = {}
+    for entry in spec.split(","):
+        stage, _, count = entry.partition("=")
+        if stage.strip() and count.strip():
+            threads[stage.strip()] = int(count)
+    return threads
+
+
+class ResourceManager:
+    """Thread budgets per stage, affinity pinning and contention metrics"""
+
+    def __init__(self, preset=None, overrides=None, affinity=CPU_AFFINITY):
+        self.preset = resolve_preset(preset)
+        self.threads = dict(self.preset["threads"]) if self.preset else {}
+        self.threads.update(overrides if overrides is not None else parse_threads(os.environ.get("STAGE_THREADS", "")))
+        self.affinity = self.preset["affinity"] if self.preset and affinity else {}
+        self.cores = cpu_count()
+
+        # Contention metrics
+        self.lock = threading.Lock()
+        self.active = {}                 # stage -> running count
+        self.overlaps = {}               # "stt+llm" -> times one started while the other ran
+        self.solo = {}                   # stage -> recent durations with nothing else running
+        self.contended = {}              # stage -> recent durations that overlapped another stage
+        self.oversubscribed_seconds = 0.0
+        self.oversubscribed_since = None
+        self.pinned = 0
+        self.pin_errors = 0
+
+    @property
+    def name(self):
+        return self.preset["name"] if self.preset else "off"
+
+    # --- Settings for each library ---
+    def whisper_kwargs(self):
+        """Extra WhisperModel(...) arguments"""
+        if "stt" not in self.threads:
+            return {}
+        return {"cpu_threads": self.threads["stt"],
+                "num_workers": self.preset["stt_workers"] if self.preset else 1}
+
+    def vad_threads(self):
+        return self.threads.get("vad", 1)
+
+    def ollama_options(self):
+        """Ollama request 'options' (num_thread caps the LLM's share of the CPU)"""
+        return {"num_thread": self.threads["llm"]} if "llm" in self.threads else {}
+
+    # --- Affinity ---
+    def pin(self, stage):
+        """
+        Pin the calling thread to the stage's cores. Threads started afterwards inherit
+        it - pin a loader thread before creating a model and its worker pool follows.
+        """
+        cores = self.affinity.get(stage)
+        if not cores or not hasattr(os, "sched_setaffinity"):
+            return False
+        allowed = [c for c in cores if c < (os.cpu_count() or 1)]
+        if not allowed:
+            return False
+        try:
+            os.sched_setaffinity(threading.get_native_id(), allowed)
+        except OSError as e:
+            self.pin_errors += 1
+            print(f"[Resources] Could not pin {stage} to cores {allowed}: {e}")
+            return False
+        self.pinned += 1
+        return True
+
+    def thread_initializer(self, stage):
+        """
+        For ThreadPoolExecutor(initializer=...) and the call scheduler - pins each worker
+        of a stage's pool. llm's cores are Ollama's; our HTTP client threads stay off them.
+        """
+        if stage != "llm":
+            self.pin(stage)
+
+    # --- Contention metrics ---
+    @contextmanager
+    def stage(self, name):
+        """Wrap a stage's work to count overlaps and compare solo vs contended timings"""
+        start = time.perf_counter()
+        with self.lock:
+            contended = any(count for other, count in self.active.items() if other != name)
+            for other, count in self.active.items():
+                if count and other != name:
+                    pair = "+".join(sorted((name, other)))
+                    self.overlaps[pair] = self.overlaps.get(pair, 0) + 1
+            self.active[name] = self.active.get(name, 0) + 1
+            self._update_oversubscription(start)
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self.lock:
+                self.active[name] -= 1
+                contended = contended or any(count for other, count in self.active.items() if other != name)
+                timings = self.contended if contended else self.solo
+                timings.setdefault(name, deque(maxlen=TIMING_WINDOW)).append(end - start)
+                self._update_oversubscription(end)
+
+    def demanded_threads(self):
+        """Threads the running stages want right now (holding self.lock)"""
+        return sum(self.threads.get(stage, self.cores) * count for stage, count in self.active.items())
+
+    def _update_oversubscription(self, now):
+        if self.oversubscribed_since is not None:
+            self.oversubscribed_seconds += now - self.oversubscribed_since
+            self.oversubscribed_since = None
+        if self.demanded_threads() > self.cores:
+            self.oversubscribed_since = now
+
+    def stats(self):
+        with self.lock:
+            slowdown = {}
+            for stage in set(self.solo) & set(self.contended):
+                solo = sum(self.solo[stage]) / len(self.solo[stage])
+                contended = sum(self.contended[stage]) / len(self.contended[stage])
+                slowdown[stage] = round(contended / solo, 2) if solo else None
+            oversubscribed = self.oversubscribed_seconds
+            if self.oversubscribed_since is not None:
+                oversubscribed += time.perf_counter() - self.oversubscribed_since
+            stats = {
+                "preset": self.name,
+                "cores": self.cores,
+                "threads": dict(self.threads),
+                "overlaps": dict(self.overlaps),
+                "contended_runs": {s: len(t) for s, t in self.contended.items()},
+                "slowdown_when_contended": slowdown,
+                "oversubscribed_s": round(oversubscribed, 2),
+                "pinned_threads": self.pinned,
+            }
+        if hasattr(os, "getloadavg"):
+            stats["load_per_core"] = round(os.getloadavg()[0] / self.cores, 2)
+        return stats
+
+
+# Test functions
+if __name__ == "__main__":
+    print("Testing resource manager...")
+    for preset in ["4core", "8core", "auto", "off"]:
+        manager = ResourceManager(preset, overrides={})
+        print(f"\n{preset} -> {manager.name}: whisper {manager.whisper_kwargs()}, "
+              f"ollama {manager.ollama_options()}, vad threads {manager.vad_threads()}")
+    for cores in [2, 6, 16]:
+        print(f"auto on {cores} cores: {auto_preset(cores)['threads']}")
+
+    manager = ResourceManager("4core", overrides={"llm": 3})
+
+    def work(stage, seconds):
+        with manager.stage(stage):
+            time.sleep(seconds)
+
+    work("stt", 0.02)  # Alone
+    threads = [threading.Thread(target=work, args=args) for args in [("llm", 0.1), ("stt", 0.05), ("vad", 0.03)]]
+    for t in threads:
+        t.start()
+        time.sleep(0.01)
+    for t in threads:
+        t.join()
+    print(f"\nPinned current thread to stt cores: {manager.pin('stt')} (needs CPU_AFFINITY=1)")
+    print(f"Contention: {manager.stats()}")
+    print("\n✓ Resource manager ready!")
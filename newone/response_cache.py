@@ -0,0 +1,283 @@
+"""
+Response Cache for Salon Voice Assistant
+Remembers LLM answers to repeated caller questions ("are you open Sunday?")
+Keyed by normalized transcript + dialog state + knowledge base version
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+# Words that callers add to a question without changing its meaning
+FILLER_WORDS = {"uh", "um", "er", "ah", "oh", "hmm", "mm", "like", "so", "well",
+                "please", "hi", "hello", "hey", "okay", "ok", "yeah"}
+
+# Questions containing these words depend on the current date/time
+TIME_RELATIVE_WORDS = {"tomorrow", "open", "weekend", "week"}
+
+# Answers to these depend on the clock (open or closed right now) - never replayed
+CLOCK_WORDS = {"today", "tonight", "now", "currently", "still", "anymore"}
+
+# Replies and back-references only make sense after what the assistant just said
+# ("yes", "sure", "how much is that") - the same words mean something else next time
+REPLY_WORDS = {"yes", "no", "yep", "yup", "nope", "nah", "sure", "fine", "right", "correct",
+               "great", "perfect", "thanks", "thank", "alright", "definitely", "absolutely"}
+CONTEXT_WORDS = {"it", "that", "this", "those", "them", "one", "same", "then", "instead"}
+MIN_QUESTION_WORDS = 3
+
+# Caller introductions - anything said after these is personal
+INTRO_PATTERN = re.compile(r"\b(?:my name is|my name's|this is|i am|i'm|it's)\s+([a-z][a-z'\-]+)", re.IGNORECASE)
+PHONE_PATTERN = re.compile(r"\d[\d\s\-().]{5,}\d")
+
+TOOL_MARKER = "TOOL:"
+SAVE_DELAY = 5.0  # Seconds changes wait before they are written - a burst of stores is one write
+
+
+def kb_fingerprint(kb_path):
+    """Return a short hash of the knowledge base file contents"""
+    try:
+        with open(kb_path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:16]
+    except FileNotFoundError:
+        return "no-kb"
+
+
+def normalize_text(text):
+    """Lowercase, strip punctuation and filler words so near-identical questions share a key"""
+    words = re.sub(r"[^a-z0-9' ]+", " ", text.lower()).split()
+    return " ".join(w for w in words if w not in FILLER_WORDS)
+
+
+def extract_personal_values(texts):
+    """Find caller names and phone numbers mentioned in the given transcripts"""
+    values = set()
+    for text in texts:
+        for match in INTRO_PATTERN.finditer(text):
+            values.add(match.group(1).lower())
+        for match in PHONE_PATTERN.finditer(text):
+            values.add(re.sub(r"\D", "", match.group(0)))
+    return values
+
+
+def caller_values(name=None, phone=None):
+    """Personal values for a known caller name/phone in the form is_cacheable() expects"""
+    values = set()
+    if name:
+        values.update(w.lower() for w in name.split())
+    if phone:
+        values.add(re.sub(r"\D", "", phone))
+    return values
+
+
+def is_cacheable(user_text, response, personal_values=()):
+    """
+    Decide whether an exchange is safe to replay for another caller.
+    Never caches tool calls, turns carrying numbers (phones, dates, times),
+    short or contextual replies, questions about right now, or answers that
+    mention anything personal the caller said.
+    """
+    if not response or TOOL_MARKER in response:
+        return False
+    if any(c.isdigit() for c in user_text):
+        return False
+    if INTRO_PATTERN.search(user_text):
+        return False
+    words = normalize_text(user_text).split()
+    if len(words) < MIN_QUESTION_WORDS or words[0] in REPLY_WORDS:
+        return False
+    if set(words) & (CONTEXT_WORDS | CLOCK_WORDS):
+        return False
+
+    response_lower = response.lower()
+    response_digits = re.sub(r"\D", "", response)
+    for value in personal_values:
+        if not value:
+            continue
+        if value.isdigit():
+            if len(value) >= 7 and value in response_digits:
+                return False
+        elif re.search(r"\b" + re.escape(value) + r"\b", response_lower):
+            return False
+    return True
+
+
+class ResponseCache:
+    """
+    LRU cache of assistant responses with optional JSON persistence. Changes
+    are written off the turn path, SAVE_DELAY after the first unsaved one,
+    and once more at exit.
+    """
+
+    def __init__(self, max_entries=256, path=None, kb_version="", save_delay=SAVE_DELAY):
+        self.max_entries = max_entries
+        self.path = path
+        self.kb_version = kb_version
+        self.save_delay = save_delay
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()  # One writer of the file at a time
+        self.dirty = False
+        self.save_timer = None
+
+        if self.path:
+            self._load()
+            atexit.register(self.save)
+
+    def make_key(self, user_text, dialog_state=""):
+        """Build cache key from transcript, dialog state and KB version"""
+        normalized = normalize_text(user_text)
+        words = set(normalized.split())
+        # Date-sensitive questions only repeat within the same day
+        day = datetime.now().strftime("%Y-%m-%d") if words & TIME_RELATIVE_WORDS else ""
+        return f"{self.kb_version}|{dialog_state}|{day}|{normalized}"
+
+    def get(self, user_text, dialog_state=""):
+        """Return cached response or None"""
+        key = self.make_key(user_text, dialog_state)
+        with self.lock:
+            response = self.entries.get(key)
+            if response is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return response
+
+    def peek(self, user_text, dialog_state=""):
+        """Like get() but without counting a hit/miss or touching LRU order"""
+        with self.lock:
+            return self.entries.get(self.make_key(user_text, dialog_state))
+
+    def put(self, user_text, response, dialog_state="", personal_values=()):
+        """Store response if the cacheability rules allow it. Returns True if stored."""
+        if not is_cacheable(user_text, response, personal_values):
+            return False
+
+        key = self.make_key(user_text, dialog_state)
+        if not key.rsplit("|", 1)[-1]:
+            return False
+
+        with self.lock:
+            self.entries[key] = response
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        self._schedule_save()
+        return True
+
+    def set_kb_version(self, kb_version):
+        """Drop every entry when the knowledge base changes"""
+        if kb_version == self.kb_version:
+            return
+        with self.lock:
+            self.kb_version = kb_version
+            self.entries.clear()
+        print(f"[Cache] Knowledge base changed - response cache cleared")
+        self._schedule_save()
+
+    def clear(self):
+        """Remove all cached responses"""
+        with self.lock:
+            self.entries.clear()
+        self._schedule_save()
+
+    def stats(self):
+        """Return hit/miss counters"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0
+        }
+
+    def _load(self):
+        """Load persisted entries, ignoring them if the KB version differs"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+
+        if data.get("kb_version") != self.kb_version:
+            print("[Cache] Stored responses are for an older knowledge base - discarding")
+            return
+
+        for key, response in data.get("entries", [])[-self.max_entries:]:
+            self.entries[key] = response
+        print(f"[Cache] Loaded {len(self.entries)} cached responses")
+
+    def _schedule_save(self):
+        """Mark the cache changed and make sure a save is coming"""
+        if not self.path:
+            return
+        with self.lock:
+            self.dirty = True
+            if self.save_timer is None:
+                self.save_timer = threading.Timer(self.save_delay, self.save)
+                self.save_timer.daemon = True
+                self.save_timer.start()
+
+    def save(self):
+        """Write unsaved changes to disk now (atomic replace); runs from the timer and at exit"""
+        if not self.path:
+            return
+        with self.save_lock:
+            with self.lock:
+                if self.save_timer is not None:
+                    self.save_timer.cancel()
+                    self.save_timer = None
+                if not self.dirty:
+                    return
+                self.dirty = False
+                data = {"kb_version": self.kb_version, "entries": list(self.entries.items())}
+            tmp_path = self.path + ".tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=2, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"[Cache Error] Could not save response cache: {e}")
+
+
+# Test functions
+if __name__ == "__main__":
+    print("Testing response cache...")
+    cache = ResponseCache(max_entries=2, kb_version=kb_fingerprint("knowledge_base.json"))
+
+    cache.put("Um, are you open on Sunday?", "Sorry, we're closed on Sundays.")
+    print(f"\n1. Lookup with different wording: {cache.get('are you open on sunday')}")
+
+    stored = cache.put("My name is Kevin", "Thanks Kevin! What's your phone number?")
+    print(f"2. Personalized response stored: {stored}")
+
+    stored = cache.put("Book me in", "TOOL:BOOK:Kevin|555-8888|2025-12-29|10:00 AM|Men's Haircut")
+    print(f"3. Tool response stored: {stored}")
+
+    stored = cache.put("Yes", "Great, what day works for you?")
+    print(f"4. Contextual reply stored: {stored}")
+
+    stored = cache.put("Are you open right now?", "Yes, we're open until 7 PM today.")
+    print(f"5. 'Right now' question stored: {stored}")
+    assert cache.get("yes") is None and cache.get("are you open right now") is None
+
+    print(f"6. Stats: {cache.stats()}")
+
+    # Stores are written together, after the delay, not one file write per turn
+    import tempfile
+    path = os.path.join(tempfile.mkdtemp(prefix="cache_"), "response_cache.json")
+    persisted = ResponseCache(path=path, save_delay=0.2)
+    persisted.put("What are your prices for a haircut?", "A haircut is $45.")
+    persisted.put("Do you sell gift cards at all?", "Yes, in any amount.")
+    written_now = os.path.exists(path)
+    persisted.save_timer.join()
+    with open(path, encoding="utf-8") as f:
+        print(f"7. Written right away: {written_now}, after the delay: {len(json.load(f)['entries'])} entries")
+    print("\n✓ Response cache ready!")
@@ -0,0 +1,206 @@
+"""
+Response Sanitizer for Salon Voice Assistants
+One pass over the LLM output (whole text or streamed chunks) that strips
+Markdown, stops at tool/hallucination markers, tracks sentence boundaries and
+caps length - all markers are matched by a single precompiled regex.
+Every sentence counts toward max_sentences, however short.
+Shared by newone/voice_assistant.py and the legacy ../voice_assistant.py
+"""
+
+import re
+
+SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s")
+
+
+class SanitizerProfile:
+    """Which markers to strip or stop at, and how much text to keep"""
+
+    def __init__(self, strip_tokens=(), stop_markers=(), max_sentences=None, max_chars=None,
+                 drop_line_prefixes=()):
+        self.max_sentences = max_sentences
+        self.max_chars = max_chars
+        self.drop_line_prefixes = tuple(drop_line_prefixes)
+
+        # Longest first so "You are an" wins over "You are a"
+        stop = sorted(set(stop_markers), key=len, reverse=True)
+        strip = sorted(set(strip_tokens) - set(stop), key=len, reverse=True)
+        parts = []
+        if stop:
+            parts.append("(?P<stop>" + "|".join(re.escape(m) for m in stop) + ")")
+        if strip:
+            parts.append("(?P<strip>" + "|".join(re.escape(t) for t in strip) + ")")
+        self.pattern = re.compile("|".join(parts)) if parts else None
+        # Text we must hold back between chunks in case a marker is split across them
+        self.holdback = max((len(m) for m in list(stop) + list(strip)), default=1) - 1
+
+
+# newone assistant: 2 short sentences, never read a tool command aloud
+VOICE_PROFILE = SanitizerProfile(
+    strip_tokens=["**", "```", "###"],
+    stop_markers=["TOOL:", "---", "Example:", "Transcript:", "Caller:", "NOTE:", "RULES:"],
+    max_sentences=2,
+    max_chars=300,
+)
+
+# Legacy Vosk/phi3 assistant: cut at prompt echoes and CLI noise
+LEGACY_PROFILE = SanitizerProfile(
+    stop_markers=["---", "**", "```", "NOTE:", "RULES:", "Constraints:",
+                  "You are an", "You are a", "<|", ">>>", "Loading"],
+    max_chars=500,
+    drop_line_prefixes=["[", ">>>"],
+)
+
+
+class StreamingSanitizer:
+    """
+    Feed LLM chunks as they arrive; complete, cleaned sentences come out as
+    soon as they end. `stopped` turns True once a stop marker or limit is
+    hit - the rest can be dropped.
+    """
+
+    def __init__(self, profile=VOICE_PROFILE):
+        self.profile = profile
+        self.pending = ""      # Raw text not yet scanned for markers
+        self.line = ""         # Current line (only when dropping lines by prefix)
+        self.sentence = ""     # Clean text of the sentence being built
+        self.sentences = []    # Emitted sentences
+        self.length = 0        # Characters emitted (joined with spaces)
+        self.stopped = False
+        self.finished = False
+
+    def feed(self, chunk):
+        """Add raw LLM text; returns sentences completed by it"""
+        if self.stopped or not chunk:
+            return []
+        self.pending += chunk
+        return self._scan(final=False)
+
+    def finish(self):
+        """End of stream; returns whatever sentences remain"""
+        if self.finished:
+            return []
+        self.finished = True
+        emitted = [] if self.stopped else self._scan(final=True)
+        if self.line:
+            emitted += self._add_line(self.line)
+            self.line = ""
+        tail = self.sentence.strip()
+        self.sentence = ""
+        if tail:
+            emitted += self._emit(tail)
+        self.stopped = True
+        return emitted
+
+    def text(self):
+        """Everything emitted so far as one string"""
+        return " ".join(self.sentences)
+
+    # --- internals ---
+    def _scan(self, final):
+        """Remove strip tokens and stop at the first stop marker in the scannable text"""
+        buffer = self.pending
+        safe_end = len(buffer) if final else max(0, len(buffer) - self.profile.holdback)
+        clean = []
+        pos = 0
+        if self.profile.pattern is not None:
+            for match in self.profile.pattern.finditer(buffer):
+                if match.start() >= safe_end:
+                    break
+                clean.append(buffer[pos:match.start()])
+                if match.lastgroup == "stop":
+                    self.stopped = True
+                    self.pending = ""
+                    return self._add_text("".join(clean), final=True)
+                pos = match.end()
+        if pos < safe_end:
+            clean.append(buffer[pos:safe_end])
+            pos = safe_end
+        self.pending = buffer[pos:]
+        return self._add_text("".join(clean), final=final)
+
+    def _add_text(self, text, final):
+        if not self.profile.drop_line_prefixes:
+            return self._add_clean(text.replace("\n", " "))
+        emitted = []
+        self.line += text
+        while "\n" in self.line:
+            line, self.line = self.line.split("\n", 1)
+            emitted += self._add_line(line)
+        if final and self.stopped and self.line:
+            emitted += self._add_line(self.line)
+            self.line = ""
+        return emitted
+
+    def _add_line(self, line):
+        if not line.strip() or line.startswith(self.profile.drop_line_prefixes):
+            return []
+        return self._add_clean(line.strip() + " ")
+
+    def _add_clean(self, text):
+        """Append clean text and emit every sentence it completes"""
+        emitted = []
+        self.sentence += text
+        while self.sentences_left():
+            match = SENTENCE_END.search(self.sentence)
+            if not match:
+                break
+            sentence = self.sentence[:match.end()].strip()
+            self.sentence = self.sentence[match.end():]
+            if sentence:
+                emitted += self._emit(sentence)
+        if not self.sentences_left():
+            self.sentence = ""
+            self.stopped = True
+        return emitted
+
+    def sentences_left(self):
+        if self.profile.max_sentences is None:
+            return True
+        return len(self.sentences) < self.profile.max_sentences
+
+    def _emit(self, sentence):
+        if not self.sentences_left() and self.sentences:
+            return []
+        max_chars = self.profile.max_chars
+        separator = 1 if self.sentences else 0
+        if max_chars is not None and self.length + separator + len(sentence) > max_chars:
+            room = max_chars - self.length - separator
+            if self.sentences and room < 20:
+                self.stopped = True
+                return []  # Ending on the previous full sentence reads better
+            sentence = sentence[:max(room, 0)].rsplit(" ", 1)[0].rstrip(",;:") + "."
+            self.stopped = True
+        self.sentences.append(sentence)
+        self.length += separator + len(sentence)
+        return [sentence]
+
+
+def sanitize(text, profile=VOICE_PROFILE):
+    """Clean a complete LLM response in one pass"""
+    sanitizer = StreamingSanitizer(profile)
+    sanitizer.feed(text)
+    sanitizer.finish()
+    return sanitizer.text()
+
+
+# Test functions
+if __name__ == "__main__":
+    print("Testing response sanitizer...")
+    raw = ("**Sure!** We're open 9 AM to 7 PM on weekdays. A haircut is $45.00 and takes "
+           "45 minutes. Want to book? --- Example: Caller: hi")
+    print(f"\n1. One pass: {sanitize(raw)}")
+
+    spoken = []
+    streamer = StreamingSanitizer()
+    for chunk in ["Yes, we do", " pedicures. They take", " an hour. TO", "OL:BOOK:Kevin|555"]:
+        spoken += streamer.feed(chunk)
+    spoken += streamer.finish()
+    print(f"2. Streamed: {spoken} (stopped={streamer.stopped})")
+
+    legacy = "[INFO] loading\nThanks for calling!\nWe can help with that.\n>>> You are an assistant"
+    print(f"3. Legacy profile: {sanitize(legacy, LEGACY_PROFILE)}")
+    print(f"4. Length cap: {len(sanitize('word ' * 200))} chars")
+    short = sanitize("Hello there. How are you. Fine thanks. Bye.")
+    assert short == "Hello there. How are you.", short  # Short sentences count too
+    print(f"5. Sentence cap: {short}")
+    print("\n✓ Response sanitizer ready!")
@@ -0,0 +1,163 @@
+"""
+Service Catalog for Salon Voice Assistant
+Resolves spoken/LLM service names ("mens haircut", "gel manicure") to the
+canonical KB entry so price and duration always come from knowledge_base.json
+"""
+
+import difflib
+import re
+
+# Key words that read better as possessives: men_haircut -> "Men's Haircut"
+POSSESSIVE_WORDS = {"men", "women", "kids"}
+
+FUZZY_CUTOFF = 0.75  # difflib ratio needed for a typo-level match
+
+
+def normalize_name(name):
+    """Normalize a service/staff name for lookups: "Men's Haircut" -> "mens haircut" """
+    name = name.lower().replace("'", "").replace("_", " ")
+    return " ".join(re.sub(r"[^a-z0-9 ]+", " ", name).split())
+
+
+def _stem(word):
+    """Very small stemmer so "nails"/"nail" and "mens"/"men" compare equal"""
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _tokens(text):
+    return frozenset(_stem(w) for w in normalize_name(text).split())
+
+
+def display_name(key):
+    """men_haircut -> "Men's Haircut", basic_facial -> "Basic Facial" """
+    words = []
+    for word in key.split("_"):
+        if word in POSSESSIVE_WORDS:
+            word += "'" if word.endswith("s") else "'s"
+        words.append(word.title() if "'" not in word else word[0].upper() + word[1:])
+    return " ".join(words)
+
+
+class ServiceCatalog:
+    """Index of kb["services"] with exact, token and fuzzy name matching"""
+
+    def __init__(self, kb):
+        self.entries = []
+        self.by_alias = {}
+        self.token_aliases = []  # (token set, entry), longest first
+
+        for category, services in kb.get("services", {}).items():
+            for key, details in services.items():
+                entry = {
+                    "key": key,
+                    "category": category,
+                    "name": display_name(key),
+                    "price": int(details["price"]),
+                    "duration": int(details["duration"]),
+                    "description": details.get("description", "")
+                }
+                self.entries.append(entry)
+
+                aliases = [key, entry["name"]] + list(details.get("aliases", []))
+                for alias in aliases:
+                    normalized = normalize_name(alias)
+                    self.by_alias.setdefault(normalized, entry)
+                    self.token_aliases.append((_tokens(alias), entry))
+
+        self.token_aliases.sort(key=lambda item: len(item[0]), reverse=True)
+        self.alias_names = list(self.by_alias)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def resolve(self, text):
+        """
+        Return the KB entry for a service name or free-form phrase, or None.
+        1. exact alias ("Men's Haircut", "men_haircut")
+        2. every word of an alias appears in the text ("a haircut for men please"); the
+           longest such alias wins, unless another service shares as many of the text's
+           words through a longer alias ("gel manicure" without a "gel manicure" alias
+           could be Manicure or Gel Nails)
+        3. close spelling of a whole alias ("pedicur", "hilights")
+        Ambiguous phrases ("haircut") return None - see candidates().
+        """
+        if not text:
+            return None
+        normalized = normalize_name(text)
+        entry = self.by_alias.get(normalized)
+        if entry:
+            return entry
+
+        words = _tokens(text)
+        best = None
+        for alias_tokens, candidate in self.token_aliases:
+            if best and len(alias_tokens) < len(best[0]):
+                break  # Only consider the most specific matches
+            if alias_tokens <= words:
+                if best and best[1] is not candidate:
+                    return None  # Two different services match equally - ambiguous
+                best = (alias_tokens, candidate)
+        if best:
+            matched = len(best[0])
+            for alias_tokens, candidate in self.token_aliases:
+                shared = alias_tokens & words
+                if (candidate is not best[1] and len(alias_tokens) > matched
+                        and len(shared) >= matched and shared - best[0]):
+                    return None  # A more specific service explains other words as well - ambiguous
+            return best[1]
+
+        # "haircut" alone is part of several services - let the caller choose
+        partial = {id(entry) for alias_tokens, entry in self.token_aliases if words < alias_tokens}
+        if len(partial) > 1:
+            return None
+
+        close = difflib.get_close_matches(normalized, self.alias_names, n=1, cutoff=FUZZY_CUTOFF)
+        if close:
+            return self.by_alias[close[0]]
+        return None
+
+    def candidates(self, text, limit=3):
+        """Services sharing at least one word with the text, for "did you mean" prompts"""
+        words = _tokens(text)
+        seen = []
+        for alias_tokens, entry in self.token_aliases:
+            if alias_tokens & words and entry not in seen:
+                seen.append(entry)
+        return seen[:limit]
+
+    def names(self):
+        """Display names of all services"""
+        return [entry["name"] for entry in self.entries]
+
+
+# Test functions
+if __name__ == "__main__":
+    import json
+
+    print("Testing service catalog...")
+    with open("knowledge_base.json", 'r', encoding='utf-8') as f:
+        catalog = ServiceCatalog(json.load(f))
+
+    print(f"\nIndexed {len(catalog)} services")
+    for phrase in ["Men's Haircut", "a haircut for men please", "gel manicure", "a gel manicure please",
+                   "manicure", "pedicur", "haircut", "tattoo"]:
+        entry = catalog.resolve(phrase)
+        if entry:
+            print(f"   '{phrase}' -> {entry['name']} (${entry['price']}, {entry['duration']} min)")
+        else:
+            options = ", ".join(e["name"] for e in catalog.candidates(phrase))
+            print(f"   '{phrase}' -> no match (did you mean: {options or 'nothing'})")
+
+    # Regression: "gel manicure" must never be priced as a plain manicure
+    assert catalog.resolve("gel manicure")["key"] == "gel_nails"
+    assert catalog.resolve("a gel manicure please")["key"] == "gel_nails"
+    assert catalog.resolve("manicure")["key"] == "manicure"
+    bare = ServiceCatalog({"services": {"nails": {"manicure": {"price": 30, "duration": 45},
+                                                  "gel_nails": {"price": 50, "duration": 60}}}})
+    assert bare.resolve("gel manicure") is None  # Without the alias it's a question, not a guess
+    assert {e["key"] for e in bare.candidates("gel manicure")} == {"manicure", "gel_nails"}
+    print("   'gel manicure' resolves to Gel Nails (ambiguous without the alias)")
+
+    print("\n✓ Service catalog ready!")
@@ -0,0 +1,175 @@
+"""
+Speculative Generation for Salon Voice Assistant
+While the caller is still talking (or in the silence before endpointing fires)
+we transcribe partial audio; once the partial transcript has been stable for a
+short window the LLM request is started early. If the final transcript matches,
+the early reply is used - otherwise it is cancelled and the turn runs normally.
+"""
+
+import threading
+import time
+
+from response_cache import normalize_text
+
+PARTIAL_EVERY_CHUNKS = 2    # Transcribe the growing utterance every N audio chunks
+STABLE_WINDOW = 0.3         # Seconds a partial transcript must stay unchanged
+MIN_SPECULATION_WORDS = 2   # Don't speculate on "uh" or a single word
+
+
+class PartialTracker:
+    """Decides when a partial transcript has stopped changing"""
+
+    def __init__(self, stable_window=STABLE_WINDOW, clock=time.monotonic):
+        self.stable_window = stable_window
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        self.text = ""
+        self.key = ""
+        self.since = None
+
+    def update(self, text):
+        """Feed a partial transcript; returns it once stable, else None"""
+        key = normalize_text(text)
+        now = self.clock()
+        if key != self.key:
+            self.text, self.key, self.since = text, key, now
+            return None
+        if len(key.split()) < MIN_SPECULATION_WORDS:
+            return None
+        if now - self.since >= self.stable_window:
+            return self.text
+        return None
+
+
+class SpeculationStats:
+    """Per-call speculation counters"""
+
+    def __init__(self):
+        self.launched = 0
+        self.hits = 0
+        self.misses = 0      # Final transcript differed - reply discarded
+        self.restarts = 0    # Partial changed after launch - relaunched
+        self.saved_ms = 0.0  # How much earlier the LLM started on hits
+
+    def hit_rate(self):
+        resolved = self.hits + self.misses
+        return round(self.hits / resolved, 3) if resolved else 0.0
+
+    def as_dict(self):
+        return {
+            "launched": self.launched,
+            "hits": self.hits,
+            "misses": self.misses,
+            "restarts": self.restarts,
+            "hit_rate": self.hit_rate(),
+            "saved_ms": round(self.saved_ms),
+            "avg_saved_ms": round(self.saved_ms / self.hits) if self.hits else 0,
+        }
+
+
+class Speculation:
+    """One early LLM request: the transcript it was based on and its future"""
+
+    def __init__(self, text, future, cancel_event):
+        self.text = text
+        self.key = normalize_text(text)
+        self.future = future
+        self.cancel_event = cancel_event
+        self.started = time.perf_counter()
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.future.cancel()
+
+
+class Speculator:
+    """
+    Starts, matches and cancels speculative LLM requests for one call.
+    launch_fn(text, cancel_event) must start the request and return a Future;
+    it can return None to decline (e.g. the booking form will answer locally).
+    """
+
+    def __init__(self, launch_fn):
+        self.launch_fn = launch_fn
+        self.current = None
+        self.stats = SpeculationStats()
+
+    def reset(self):
+        """New call: cancel anything running and start fresh counters"""
+        self.cancel()
+        self.stats = SpeculationStats()
+
+    def offer(self, stable_text):
+        """A partial transcript became stable - start (or restart) speculation"""
+        key = normalize_text(stable_text)
+        if self.current is not None:
+            if self.current.key == key:
+                return
+            self.current.cancel()
+            self.current = None
+            self.stats.restarts += 1
+
+        cancel_event = threading.Event()
+        future = self.launch_fn(stable_text, cancel_event)
+        if future is None:
+            return
+        self.current = Speculation(stable_text, future, cancel_event)
+        self.stats.launched += 1
+
+    def resolve(self, final_text):
+        """
+        Endpoint fired with the final transcript. Returns the matching
+        Speculation (use its future) or None (speculation missed or absent).
+        """
+        speculation, self.current = self.current, None
+        if speculation is None:
+            return None
+        if speculation.key != normalize_text(final_text):
+            speculation.cancel()
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        self.stats.saved_ms += (time.perf_counter() - speculation.started) * 1000
+        return speculation
+
+    def cancel(self):
+        if self.current is not None:
+            self.current.cancel()
+            self.current = None
+
+
+# Test functions
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    print("Testing speculative generation...")
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    def fake_llm(text, cancel_event):
+        for _ in range(10):
+            if cancel_event.is_set():
+                return None
+            time.sleep(0.01)
+        return f"Reply to '{text}'"
+
+    speculator = Speculator(lambda text, cancel_event: executor.submit(fake_llm, text, cancel_event))
+    tracker = PartialTracker(stable_window=0.05)
+
+    for partial in ["what time", "what time do you", "what time do you close", "what time do you close"]:
+        stable = tracker.update(partial)
+        time.sleep(0.06)
+        stable = tracker.update(partial) or stable
+        if stable:
+            speculator.offer(stable)
+
+    speculation = speculator.resolve("Um, what time do you close?")
+    print(f"\n1. Final matches: {speculation.future.result() if speculation else None}")
+
+    speculator.offer("do you do nails")
+    print(f"2. Final differs: {speculator.resolve('do you do nails on sunday')}")
+
+    print(f"\nStats: {speculator.stats.as_dict()}")
+    executor.shutdown()
+    print("\n✓ Speculative generation ready!")
@@ -0,0 +1,171 @@
+"""
+Startup Orchestrator for Salon Voice Assistant
+Loads heavy components (Whisper, Silero VAD, TTS engine, cached greeting) in
+parallel background threads, lets callers wait on each one's readiness and
+prints a timing breakdown once everything is up
+"""
+
+import importlib
+import os
+import threading
+import time
+
+PROCESS_START = time.perf_counter()  # Close enough to interpreter start - imported first
+
+
+def lazy_import(module_name):
+    """Import a module on first use (returns None if it isn't installed)"""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as e:
+        print(f"[Startup] Optional module '{module_name}' unavailable: {e}")
+        return None
+
+
+class Component:
+    """One thing to load: its loader, dependencies, readiness and timings"""
+
+    def __init__(self, name, loader, depends=(), required=True):
+        self.name = name
+        self.loader = loader
+        self.depends = tuple(depends)
+        self.required = required
+        self.ready = threading.Event()   # Set when loaded successfully
+        self.done = threading.Event()    # Set when finished either way
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    @property
+    def seconds(self):
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+
+class StartupOrchestrator:
+    """Runs registered loaders concurrently, respecting dependencies"""
+
+    def __init__(self):
+        self.components = {}
+        self.marks = {}  # Named moments, e.g. "greeting" -> seconds since process start
+        self.start_time = None
+
+    def add(self, name, loader, depends=(), required=True):
+        self.components[name] = Component(name, loader, depends, required)
+
+    def start(self):
+        """Start every loader on its own daemon thread"""
+        self.start_time = time.perf_counter()
+        for component in self.components.values():
+            threading.Thread(target=self._load, args=(component,), name=f"load-{component.name}",
+                             daemon=True).start()
+
+    def _load(self, component):
+        for dependency in component.depends:
+            dep = self.components[dependency]
+            dep.done.wait()
+            if not dep.ready.is_set():
+                component.error = RuntimeError(f"dependency '{dependency}' failed")
+                component.done.set()
+                return
+
+        component.started = time.perf_counter()
+        try:
+            component.loader()
+            component.ready.set()
+        except Exception as e:
+            component.error = e
+            level = "Error" if component.required else "Warning"
+            print(f"[Startup {level}] {component.name} failed to load: {e}")
+        finally:
+            component.finished = time.perf_counter()
+            component.done.set()
+
+    def is_ready(self, name):
+        return self.components[name].ready.is_set()
+
+    def wait(self, name, timeout=None):
+        """Block until a component is loaded; True if it loaded successfully"""
+        component = self.components[name]
+        component.done.wait(timeout)
+        return component.ready.is_set()
+
+    def wait_all(self, timeout=None):
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        for component in self.components.values():
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            component.done.wait(remaining)
+        return all(c.ready.is_set() for c in self.components.values() if c.required)
+
+    def failed(self):
+        """Required components that finished without loading"""
+        return [c for c in self.components.values() if c.required and c.done.is_set() and not c.ready.is_set()]
+
+    def exit_on_failure(self):
+        """
+        End the process as soon as a required component fails to load - a line
+        without Whisper or VAD would answer the phone and then never hear anyone
+        """
+        def watch():
+            self.wait_all()
+            failed = self.failed()
+            if failed:
+                names = ", ".join(f"{c.name} ({c.error})" for c in failed)
+                print(f"[Startup Error] Required component(s) failed: {names} - exiting", flush=True)
+                os._exit(1)  # Lines may be blocked on audio or waiting for the model - don't wait for them
+        threading.Thread(target=watch, name="startup-watch", daemon=True).start()
+
+    def mark(self, label):
+        """Record a milestone (first greeting played, first turn answered, ...)"""
+        self.marks.setdefault(label, time.perf_counter() - PROCESS_START)
+
+    def report(self):
+        """Timing breakdown as text: per component offset/duration, wall vs serial time"""
+        base = self.start_time or PROCESS_START
+        lines = ["[Startup] Timing breakdown:",
+                 f"  imports + setup     {base - PROCESS_START:6.2f}s"]
+        serial = 0.0
+        for component in sorted(self.components.values(), key=lambda c: c.started or float("inf")):
+            if component.seconds is None:
+                status = "waiting" if not component.done.is_set() else f"skipped ({component.error})"
+                lines.append(f"  {component.name:<18}  {status}")
+                continue
+            serial += component.seconds
+            status = "ok" if component.ready.is_set() else f"FAILED ({component.error})"
+            lines.append(f"  {component.name:<18}  {component.seconds:6.2f}s "
+                         f"(started +{component.started - base:.2f}s) {status}")
+        finished = [c.finished for c in self.components.values() if c.finished is not None]
+        if finished:
+            wall = max(finished) - base
+            lines.append(f"  parallel load       {wall:6.2f}s (one after another: {serial:.2f}s)")
+        for label, seconds in sorted(self.marks.items(), key=lambda item: item[1]):
+            lines.append(f"  {label:<18}  at {seconds:.2f}s after launch")
+        return "\n".join(lines)
+
+    def report_when_ready(self):
+        """Print the breakdown from a background thread once everything has finished"""
+        def report():
+            self.wait_all()
+            print(self.report())
+        threading.Thread(target=report, name="startup-report", daemon=True).start()
+
+
+# Test functions
+if __name__ == "__main__":
+    print("Testing startup orchestrator...")
+    startup = StartupOrchestrator()
+    startup.add("vad", lambda: time.sleep(0.2))
+    startup.add("whisper", lambda: time.sleep(0.4))
+    startup.add("tts", lambda: time.sleep(0.1))
+    startup.add("greeting", lambda: time.sleep(0.1), depends=["tts"])
+    startup.add("alert_ui", lambda: lazy_import("tkinter") or 1 / 0, required=False)
+    startup.start()
+
+    startup.wait("greeting")
+    startup.mark("greeting played")
+    print(f"\nGreeting ready, whisper ready yet? {startup.is_ready('whisper')}")
+    startup.wait_all()
+    print("\n" + startup.report())
+    print(f"\nRequired failures: {[c.name for c in startup.failed()]}")
+    print("\n✓ Startup orchestrator ready!")
@@ -0,0 +1,385 @@
+"""
+STT Backends for Salon Voice Assistant
+Interchangeable speech-to-text engines behind one interface:
+  whisper        - faster-whisper on the whole utterance once the caller stops (the original setup)
+  whisper_stream - faster-whisper re-run on the growing utterance while the caller speaks;
+                   words two passes agree on are committed and their audio is trimmed
+                   (local agreement), so the pass after endpointing only decodes the tail
+  vosk           - Vosk/Kaldi streaming recognizer: real time on weak CPUs, partials every chunk
+Pick one with STT_BACKEND=whisper|whisper_stream|vosk (default whisper)
+
+Every backend has transcribe(bytes) for a whole utterance and new_stream() for
+feeding chunks as they arrive: stream.accept(chunk) -> partial text,
+stream.result() -> final text. Audio is 16 kHz mono int16 bytes throughout.
+"""
+
+import contextlib
+import json
+import os
+import re
+import sys
+import threading
+
+import numpy as np
+
+SAMPLERATE = 16000
+STT_BACKEND = os.environ.get("STT_BACKEND", "whisper")
+STT_STREAM_EVERY = int(os.environ.get("STT_STREAM_EVERY", "2"))  # whisper_stream: decode every N chunks
+if sys.platform == "win32":
+    _DEFAULT_VOSK = os.path.join(os.path.expanduser("~"), "vosk-models", "vosk-model-en-us-0.22")
+else:
+    _DEFAULT_VOSK = os.path.join(os.path.expanduser("~"), "vosk-models", "vosk-model-small-en-us-0.15")
+VOSK_MODEL_PATH = os.environ.get("VOSK_MODEL_PATH", _DEFAULT_VOSK)
+
+COMMIT_MARGIN = 1.0  # whisper_stream: keep this many seconds before the buffer end uncommitted
+
+
+def to_float(audio_data):
+    """int16 PCM bytes -> float32 samples in [-1, 1]"""
+    return np.frombuffer(audio_data, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def word_key(word):
+    return re.sub(r"[^a-z0-9']+", "", word.lower())
+
+
+def agreed_prefix(previous, current):
+    """How many leading words two hypotheses share (compared without case/punctuation)"""
+    count = 0
+    for a, b in zip(previous, current):
+        if word_key(a) != word_key(b):
+            break
+        count += 1
+    return count
+
+
+class STTStream:
+    """
+    One utterance fed chunk by chunk. push() queues a chunk (cheap, call it in
+    arrival order); update() decodes whatever is queued and may run on any
+    worker thread - chunks are decoded in order, never concurrently. A worker
+    that fell behind feeds the whole backlog at once, so it pays for one
+    decode rather than one per queued chunk.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.partial = ""        # Latest partial transcript (read by the speculator)
+        self.chunks = 0
+        self.pending = []
+        self.lock = threading.Lock()         # Guards pending
+        self.decode_lock = threading.Lock()  # One decode at a time, in arrival order
+
+    def push(self, audio_data):
+        with self.lock:
+            self.pending.append(audio_data)
+
+    def update(self):
+        """Decode queued chunks; returns the partial transcript so far"""
+        with self.decode_lock:
+            self._drain()
+            return self.partial
+
+    def accept(self, audio_data):
+        """Feed one chunk and decode it; returns the partial transcript so far"""
+        self.push(audio_data)
+        return self.update()
+
+    def result(self):
+        """Final transcript of everything fed (the stream is finished afterwards)"""
+        with self.decode_lock:
+            self._drain(final=True)
+            with self.backend.stage("stt"):
+                return self.finish()
+
+    def _drain(self, final=False):
+        with self.lock:
+            chunks, self.pending = self.pending, []
+        if not chunks:
+            return
+        self.chunks += len(chunks)
+        with self.backend.stage("stt"):
+            text = self.feed(b"".join(chunks), final)
+        if text is not None:
+            self.partial = text
+
+    # Backends override these (called under decode_lock)
+    def feed(self, audio_data, final=False):
+        """
+        Decode newly arrived audio (one or more chunks); return a new partial
+        transcript or None. final=True means finish() follows right away.
+        """
+        raise NotImplementedError
+
+    def finish(self):
+        raise NotImplementedError
+
+
+class BufferedStream(STTStream):
+    """No incremental decoding: keep the audio and transcribe it once at the end"""
+
+    def __init__(self, backend):
+        super().__init__(backend)
+        self.audio = []
+
+    def feed(self, audio_data, final=False):
+        self.audio.append(audio_data)
+        return None
+
+    def finish(self):
+        return self.backend.decode(b"".join(self.audio))
+
+
+class STTBackend:
+    """Interface: load() once, then transcribe(bytes) or new_stream() per utterance"""
+
+    name = "base"
+    streaming = False  # True when partials come cheaper than re-transcribing the buffer
+    stage = staticmethod(lambda name: contextlib.nullcontext())  # resources.stage in the assistant
+
+    def load(self):
+        pass
+
+    def transcribe(self, audio_data):
+        with self.stage("stt"):
+            return self.decode(audio_data)
+
+    def decode(self, audio_data):
+        raise NotImplementedError
+
+    def new_stream(self):
+        return BufferedStream(self)
+
+
+class WhisperSTT(STTBackend):
+    """faster-whisper on complete utterances, settings from whisper_profile.json"""
+
+    name = "whisper"
+
+    def __init__(self, model_size="base", profile=None, model_kwargs=None):
+        self.model_size = model_size
+        self.profile = profile or {"compute_type": "int8", "beam_size": 5, "vad_filter": True}
+        self.model_kwargs = model_kwargs or {}
+        self.model = None
+
+    def load(self):
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(self.model_size, device="cpu", compute_type=self.profile["compute_type"],
+                                  **self.model_kwargs)
+
+    def segments(self, samples, **kwargs):
+        """Segments are decoded lazily - list them inside the caller's stage"""
+        segments, info = self.model.transcribe(samples, language="en", vad_filter=self.profile["vad_filter"],
+                                               beam_size=self.profile["beam_size"], **kwargs)
+        return list(segments)
+
+    def decode(self, audio_data):
+        return " ".join(segment.text for segment in self.segments(to_float(audio_data))).strip()
+
+
+class WhisperStream(STTStream):
+    """
+    Whisper over a growing buffer. A word is committed once two consecutive
+    passes agree on it; committed audio is cut off so passes stay short.
+    """
+
+    def __init__(self, backend, every=STT_STREAM_EVERY):
+        super().__init__(backend)
+        self.every = max(1, every)
+        self.audio = np.zeros(0, dtype=np.float32)  # Uncommitted audio only
+        self.committed = []
+        self.previous = []   # Uncommitted words of the last pass
+        self.passes = 0
+        self.decoded = 0     # Chunk count at the last pass
+
+    def feed(self, audio_data, final=False):
+        self.audio = np.concatenate((self.audio, to_float(audio_data)))
+        # finish() decodes the tail anyway - a pass right before it would be wasted
+        if final or self.chunks - self.decoded < self.every:
+            return None
+        self.decoded = self.chunks
+        return self.decode_pass()
+
+    def decode_pass(self):
+        self.passes += 1
+        words = [(w.word.strip(), w.end) for segment in self.backend.segments(self.audio, word_timestamps=True)
+                 for w in (segment.words or [])]
+        texts = [text for text, _ in words]
+        agreed = agreed_prefix(self.previous, texts)
+        # Only commit words that end well before the buffer does - the last ones may still change
+        horizon = len(self.audio) / SAMPLERATE - COMMIT_MARGIN
+        while agreed and words[agreed - 1][1] > horizon:
+            agreed -= 1
+        if agreed:
+            self.committed += texts[:agreed]
+            cut = int(words[agreed - 1][1] * SAMPLERATE)
+            self.audio = self.audio[cut:]
+            texts = texts[agreed:]
+        self.previous = texts
+        return " ".join(self.committed + texts)
+
+    def finish(self):
+        tail = " ".join(segment.text for segment in self.backend.segments(self.audio)).strip() if len(self.audio) else ""
+        return " ".join(self.committed + ([tail] if tail else [])).strip()
+
+
+class WhisperStreamingSTT(WhisperSTT):
+    """Whisper with incremental passes while the caller is still talking"""
+
+    name = "whisper_stream"
+    streaming = True
+
+    def new_stream(self):
+        return WhisperStream(self)
+
+
+class VoskStream(STTStream):
+    """A KaldiRecognizer per utterance; final phrases accumulate as Vosk endpoints them"""
+
+    def __init__(self, backend):
+        super().__init__(backend)
+        self.recognizer = backend.recognizer()
+        self.phrases = []
+
+    def feed(self, audio_data, final=False):
+        if self.recognizer.AcceptWaveform(audio_data):
+            text = json.loads(self.recognizer.Result()).get("text", "")
+            if text:
+                self.phrases.append(text)
+            return " ".join(self.phrases)
+        partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        return " ".join(self.phrases + ([partial] if partial else []))
+
+    def finish(self):
+        text = json.loads(self.recognizer.FinalResult()).get("text", "")
+        return " ".join(self.phrases + ([text] if text else []))
+
+
+class VoskSTT(STTBackend):
+    """Vosk (Kaldi) - lowercase text without punctuation, much cheaper than Whisper"""
+
+    name = "vosk"
+    streaming = True
+
+    def __init__(self, model_path=None):
+        self.model_path = model_path or VOSK_MODEL_PATH
+        self.model = None
+
+    def load(self):
+        import vosk
+
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"Vosk model not found at {self.model_path} (set VOSK_MODEL_PATH; "
+                                    f"models: https://alphacephei.com/vosk/models)")
+        vosk.SetLogLevel(-1)
+        self.vosk = vosk
+        self.model = vosk.Model(self.model_path)
+
+    def recognizer(self):
+        return self.vosk.KaldiRecognizer(self.model, SAMPLERATE)
+
+    def decode(self, audio_data):
+        stream = VoskStream(self)
+        stream.feed(audio_data)
+        return stream.finish()
+
+    def new_stream(self):
+        return VoskStream(self)
+
+
+BACKENDS = {"whisper": WhisperSTT, "whisper_stream": WhisperStreamingSTT, "vosk": VoskSTT}
+
+
+def create_stt(name=None, whisper_size="base", profile=None, whisper_kwargs=None, stage=None):
+    """
+    Build and load the configured backend. A Vosk backend that fails to load
+    falls back to Whisper, like the VAD falls back to energy.
+    """
+    name = (name or STT_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown STT backend '{name}' (choose from {', '.join(BACKENDS)})")
+
+    for candidate in dict.fromkeys([name, "whisper"]):
+        if candidate == "vosk":
+            backend = VoskSTT()
+        else:
+            backend = BACKENDS[candidate](whisper_size, profile, whisper_kwargs)
+        if stage is not None:
+            backend.stage = stage
+        try:
+            backend.load()
+        except Exception as e:
+            print(f"[STT] {candidate} backend unavailable: {e}")
+            continue
+        print(f"[STT] Using {candidate} backend")
+        return backend
+    raise RuntimeError("No STT backend could be loaded")
+
+
+# Test functions
+if __name__ == "__main__":
+    print("Testing STT backends...")
+
+    # Local agreement on a scripted "Whisper" that hears one word per 0.4 s (no model needed)
+    class Word:
+        def __init__(self, word, end):
+            self.word, self.end = word, end
+
+    class Segment:
+        def __init__(self, words):
+            self.words = words
+            self.text = "".join(w.word for w in words)
+
+    class ScriptedWhisper(WhisperStreamingSTT):
+        sentence = "I'd like to book a haircut for tomorrow at three".split()
+
+        def new_stream(self):
+            self.current = super().new_stream()
+            return self.current
+
+        def segments(self, samples, **kwargs):
+            duration = len(samples) / SAMPLERATE
+            offset = self.current.chunks * 0.5 - duration  # Audio already committed and cut
+            words = []
+            for i, word in enumerate(self.sentence):
+                start, end = i * 0.4 - offset, (i + 1) * 0.4 - offset
+                if end <= 0.01 or start >= duration:
+                    continue
+                if end > duration:
+                    word = word[:2]  # Cut off mid-word: the last word keeps changing
+                words.append(Word(" " + word, min(end, duration)))
+            return [Segment(words)]
+
+    stream = ScriptedWhisper().new_stream()
+    for i in range(9):
+        partial = stream.accept(bytes(8000 * 2))
+        print(f"   chunk {i + 1}: {len(stream.committed)} words committed, "
+              f"{len(stream.audio) / SAMPLERATE:.1f}s buffered, partial '{partial}'")
+    print(f"   final: '{stream.result()}' after {stream.passes} passes")
+
+    # A worker that fell behind: six queued chunks cost one pass, not three
+    stream = ScriptedWhisper().new_stream()
+    for i in range(6):
+        stream.push(bytes(8000 * 2))
+    partial = stream.update()
+    print(f"   backlog of 6 chunks: {stream.passes} pass, partial '{partial}'")
+    for i in range(3):
+        stream.push(bytes(8000 * 2))
+    print(f"   final: '{stream.result()}' after {stream.passes} pass (tail decoded once)")
+
+    # Real engines, when installed
+    silence = bytes(SAMPLERATE * 2)
+    for name in BACKENDS:
+        try:
+            engine = create_stt(name)
+        except Exception as e:
+            print(f"   {name}: {e}")
+            continue
+        if engine.name != name:
+            continue
+        stream = engine.new_stream()
+        for i in range(0, len(silence), 16000):
+            stream.accept(silence[i:i + 16000])
+        print(f"   {name}: batch '{engine.transcribe(silence)}', stream '{stream.result()}'")
+    print("\n✓ STT backends ready!")
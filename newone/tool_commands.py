@@ -0,0 +1,78 @@
+"""
+Tool Command Parsing for Salon Voice Assistant
+Turns TOOL:BOOK lines emitted by the LLM into validated booking values
+Price and duration are looked up in the service catalog, never taken from the model
+"""
+
+BOOK_MARKER = "TOOL:BOOK:"
+BOOK_FIELDS = ["name", "phone", "date", "time", "service"]
+
+# Names the model sometimes puts in the customer field by mistake
+NON_CUSTOMER_NAMES = {"assistant", "ai", "bot", "customer", "name"}
+
+# Placeholder numbers the model invents when it has no real phone number
+FAKE_PHONE_PREFIXES = ("555-123", "555-000")
+
+
+def extract_book_line(response):
+    """Return the text after TOOL:BOOK: up to the end of that line"""
+    return response.split(BOOK_MARKER, 1)[1].split("\n")[0].strip()
+
+
+def _clean_field(value):
+    return value.strip().strip("*`\"'").strip()
+
+
+def parse_book_tool(tool_line, catalog, assistant_name=""):
+    """
+    Parse 'name|phone|YYYY-MM-DD|HH:MM AM/PM|service'.
+    Extra trailing fields (the old price|duration format) are ignored.
+    Returns booking dict, or {"error": message_for_caller, "reason": log_text}
+    """
+    parts = [_clean_field(p) for p in tool_line.split("|")]
+
+    if len(parts) < len(BOOK_FIELDS):
+        missing = BOOK_FIELDS[len(parts):]
+        return {
+            "error": f"I need more information to book. Please provide: {', '.join(missing)}",
+            "reason": f"Got {len(parts)} fields, need {len(BOOK_FIELDS)}"
+        }
+
+    name, phone, date, time_slot, service_text = parts[:len(BOOK_FIELDS)]
+
+    # Reject if using assistant's own name
+    if name.lower() in NON_CUSTOMER_NAMES or (assistant_name and name.lower() == assistant_name.lower()):
+        return {
+            "error": "I need the CUSTOMER's name, not mine! What is YOUR name?",
+            "reason": f"Cannot use assistant name '{name}' as customer"
+        }
+
+    if not name or len(name) < 2:
+        return {
+            "error": "I need your full name to complete the booking. What's your name?",
+            "reason": f"Invalid name '{name}'"
+        }
+
+    # Reject fake/placeholder phone numbers
+    digits = "".join(c for c in phone if c.isdigit())
+    if len(digits) < 7 or phone.startswith(FAKE_PHONE_PREFIXES):
+        return {
+            "error": "I need a valid phone number to complete the booking. What's your phone number?",
+            "reason": f"Invalid phone '{phone}'"
+        }
+
+    service = catalog.resolve(service_text)
+    if service is None:
+        options = catalog.candidates(service_text) or catalog.entries[:3]
+        return {
+            "error": f"Which service would you like? For example {', '.join(e['name'] for e in options)}.",
+            "reason": f"Unknown service '{service_text}'"
+        }
+
+    return {
+        "name": name,
+        "phone": phone,
+        "date": date,
+        "time": time_slot,
+        "service": service
+    }
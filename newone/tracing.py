@@ -0,0 +1,311 @@
+"""
+Turn Tracing for Salon Voice Assistant
+Records when each step of a caller's turn happened (speech end, STT, LLM
+request / first token / last token, tools, TTS, first audio out), writes one
+JSON line per turn to a rotating file and keeps per-stage latency histograms
+that are exported in Prometheus text format (file and optional HTTP endpoint).
+
+TRACE_DIR=traces      where turns.jsonl and metrics.prom go ("" disables tracing)
+METRICS_PORT=9108     also serve the metrics at http://127.0.0.1:9108/metrics
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TRACE_DIR = os.environ.get("TRACE_DIR", "traces")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))  # 0 = file only
+TRACE_MAX_BYTES = 5 * 1024 * 1024  # Rotate turns.jsonl at 5 MB
+TRACE_BACKUPS = 3                  # turns.jsonl.1 .. .3
+QUANTILE_WINDOW = 500              # Recent turns used for p50/p95
+BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0]
+
+# Stage -> (from event, to event); "tool" is the sum of tool spans
+STAGES = {
+    "stt_wait": ("speech_end", "stt_start"),        # Queued behind other lines
+    "stt": ("stt_start", "stt_end"),
+    "llm_first_token": ("llm_request", "first_token"),
+    "llm": ("llm_request", "last_token"),
+    "tts_first_audio": ("tts_start", "first_audio"),
+    "turn": ("speech_end", "first_audio"),          # What the caller waits through
+}
+
+
+class TurnTrace:
+    """Timestamps for one turn; events keep their first occurrence unless overwritten"""
+
+    def __init__(self, tracer, call_id, turn_id):
+        self.tracer = tracer
+        self.call_id = call_id
+        self.turn_id = turn_id
+        self.started = time.time()
+        self.events = {}
+        self.spans = []
+        self.attrs = {}
+        self.finished = False
+        self.outcome = None
+
+    def mark(self, event, overwrite=False):
+        if overwrite or event not in self.events:
+            self.events[event] = time.time()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    @contextmanager
+    def span(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.spans.append({"name": name, "start": start, "end": time.time()})
+
+    def adopt(self, prefix):
+        """Promote prefixed events (e.g. 'spec_first_token') to their plain names"""
+        for event, at in list(self.events.items()):
+            if event.startswith(prefix):
+                self.events[event[len(prefix):]] = at
+
+    def stages(self):
+        """Stage durations in seconds for the events present"""
+        durations = {}
+        for stage, (start, end) in STAGES.items():
+            if start in self.events and end in self.events:
+                durations[stage] = self.events[end] - self.events[start]
+        tool_time = sum(span["end"] - span["start"] for span in self.spans if span["name"] == "tool")
+        if tool_time:
+            durations["tool"] = tool_time
+        return durations
+
+    def finish(self, outcome="answered"):
+        """Write the turn out (once)"""
+        if self.finished:
+            return
+        self.finished = True
+        self.outcome = outcome
+        self.tracer.record(self, outcome)
+
+    def as_dict(self, outcome):
+        base = self.events.get("speech_end", self.started)
+        return {
+            "call_id": self.call_id,
+            "turn_id": self.turn_id,
+            "time": datetime.fromtimestamp(base).isoformat(timespec="milliseconds"),
+            "outcome": outcome,
+            # Milliseconds relative to speech end (negative = before it, e.g. speculative LLM)
+            "events": {e: round((at - base) * 1000, 1) for e, at in sorted(self.events.items(), key=lambda i: i[1])},
+            "spans": [{"name": s["name"], "start_ms": round((s["start"] - base) * 1000, 1),
+                       "ms": round((s["end"] - s["start"]) * 1000, 1)} for s in self.spans],
+            "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in self.stages().items()},
+            "attrs": self.attrs,
+        }
+
+
+class StageHistogram:
+    """Cumulative Prometheus buckets plus a recent window for quantiles"""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=QUANTILE_WINDOW)
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+
+    def quantile(self, q):
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class Tracer:
+    """Collects finished turns: JSONL log, histograms and the metrics export"""
+
+    def __init__(self, trace_dir=TRACE_DIR, max_bytes=TRACE_MAX_BYTES, backups=TRACE_BACKUPS):
+        self.enabled = bool(trace_dir)
+        self.trace_path = os.path.join(trace_dir, "turns.jsonl") if trace_dir else None
+        self.metrics_path = os.path.join(trace_dir, "metrics.prom") if trace_dir else None
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.outcomes = {}
+        self.turn_counters = {}
+        self.server = None
+        if self.enabled:
+            os.makedirs(trace_dir, exist_ok=True)
+
+    def new_call_id(self, session_id):
+        return f"{session_id}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+
+    def start_turn(self, call_id):
+        with self.lock:
+            self.turn_counters[call_id] = self.turn_counters.get(call_id, 0) + 1
+            number = self.turn_counters[call_id]
+        return TurnTrace(self, call_id, f"{call_id}-t{number}")
+
+    def record(self, trace, outcome):
+        entry = trace.as_dict(outcome)
+        with self.lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            for stage, seconds in trace.stages().items():
+                self.histograms.setdefault(stage, StageHistogram()).observe(seconds)
+            if not self.enabled:
+                return
+            self._rotate_if_needed()
+            with open(self.trace_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._write_metrics()
+
+    def _rotate_if_needed(self):
+        try:
+            if os.path.getsize(self.trace_path) < self.max_bytes:
+                return
+        except OSError:
+            return
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.trace_path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.trace_path}.{i + 1}")
+        os.replace(self.trace_path, f"{self.trace_path}.1")
+
+    def _write_metrics(self):
+        tmp_path = self.metrics_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self._render())
+        os.replace(tmp_path, self.metrics_path)
+
+    def _render(self):
+        """Prometheus text exposition format (call with self.lock held)"""
+        lines = ["# HELP salon_stage_duration_seconds Time spent in each stage of a caller's turn",
+                 "# TYPE salon_stage_duration_seconds histogram"]
+        for stage, hist in sorted(self.histograms.items()):
+            for bound, count in zip(BUCKETS, hist.counts):
+                lines.append(f'salon_stage_duration_seconds_bucket{{stage="{stage}",le="{bound:g}"}} {count}')
+            lines.append(f'salon_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist.count}')
+            lines.append(f'salon_stage_duration_seconds_sum{{stage="{stage}"}} {hist.total:.6f}')
+            lines.append(f'salon_stage_duration_seconds_count{{stage="{stage}"}} {hist.count}')
+
+        lines += ["# HELP salon_stage_latency_seconds Recent p50/p95 per stage",
+                  "# TYPE salon_stage_latency_seconds summary"]
+        for stage, hist in sorted(self.histograms.items()):
+            for q in (0.5, 0.95):
+                lines.append(f'salon_stage_latency_seconds{{stage="{stage}",quantile="{q}"}} {hist.quantile(q):.6f}')
+            lines.append(f'salon_stage_latency_seconds_sum{{stage="{stage}"}} {hist.total:.6f}')
+            lines.append(f'salon_stage_latency_seconds_count{{stage="{stage}"}} {hist.count}')
+
+        lines += ["# HELP salon_turns_total Finished turns by outcome", "# TYPE salon_turns_total counter"]
+        for outcome, count in sorted(self.outcomes.items()):
+            lines.append(f'salon_turns_total{{outcome="{outcome}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def metrics_text(self):
+        with self.lock:
+            return self._render()
+
+    def summary(self):
+        """{stage: {'p50_ms', 'p95_ms', 'count'}} for the shutdown log"""
+        with self.lock:
+            return {stage: {"p50_ms": round(hist.quantile(0.5) * 1000),
+                            "p95_ms": round(hist.quantile(0.95) * 1000),
+                            "count": hist.count}
+                    for stage, hist in sorted(self.histograms.items())}
+
+    def serve_metrics(self, port=METRICS_PORT, host="127.0.0.1"):
+        """Serve /metrics on a daemon thread (no-op when port is 0)"""
+        if not port:
+            return None
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.metrics_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes would flood the console
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+        print(f"[Tracing] Metrics at http://{host}:{port}/metrics")
+        return self.server
+
+
+def traced_stream(trace, stream_fn, prefix=""):
+    """Wrap a blocking stream_fn(model, prompt, system) to mark llm_request/first_token/last_token"""
+    def stream(model, prompt, system_prompt):
+        trace.mark(prefix + "llm_request")
+        for chunk in stream_fn(model, prompt, system_prompt):
+            trace.mark(prefix + "first_token")
+            trace.mark(prefix + "last_token", overwrite=True)
+            yield chunk
+        trace.set(model=model)
+    return stream
+
+
+async def traced_stream_async(trace, stream):
+    """Async counterpart of traced_stream for an already-opened async iterator"""
+    trace.mark("llm_request")
+    try:
+        async for chunk in stream:
+            trace.mark("first_token")
+            trace.mark("last_token", overwrite=True)
+            yield chunk
+    finally:
+        await stream.aclose()
+
+
+# Test functions
+if __name__ == "__main__":
+    import tempfile
+
+    print("Testing turn tracing...")
+    tracer = Tracer(tempfile.mkdtemp(prefix="traces_"), max_bytes=600)
+    call_id = tracer.new_call_id("line1")
+
+    def fake_llm(model, prompt, system_prompt):
+        time.sleep(0.05)
+        yield "We close "
+        time.sleep(0.01)
+        yield "at 7 PM."
+
+    for turn in range(3):
+        trace = tracer.start_turn(call_id)
+        trace.mark("speech_end")
+        trace.mark("stt_start")
+        time.sleep(0.02)
+        trace.mark("stt_end")
+        reply = "".join(traced_stream(trace, fake_llm)("qwen", "prompt", "system"))
+        if turn == 1:
+            with trace.span("tool"):
+                time.sleep(0.01)
+        trace.mark("tts_start")
+        time.sleep(0.01)
+        trace.mark("first_audio")
+        trace.finish()
+
+    print(f"\n1. Last turn: {json.dumps(trace.as_dict('answered'))}")
+    print(f"2. Files: {sorted(os.listdir(os.path.dirname(tracer.trace_path)))}")
+    print(f"3. Summary: {tracer.summary()}")
+    print("4. Metrics excerpt:")
+    print("\n".join(line for line in tracer.metrics_text().splitlines() if 'stage="turn"' in line and "quantile" in line))
+    print("\n✓ Turn tracing ready!")
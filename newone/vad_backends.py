@@ -0,0 +1,274 @@
+"""
+VAD Backends for Salon Voice Assistant
+Interchangeable voice-activity detectors behind one interface:
+  onnx   - Silero through ONNX Runtime on NumPy arrays (no torch at runtime)
+  torch  - Silero through torch/silero_vad (the original setup)
+  energy - pure NumPy energy + zero-crossing detector (no model at all)
+Pick one with VAD_BACKEND=onnx|torch|energy (default "auto": onnx, then torch, then energy)
+"""
+
+import importlib.util
+import os
+
+import numpy as np
+
+SAMPLERATE = 16000
+VAD_BACKEND = os.environ.get("VAD_BACKEND", "auto")
+SILERO_ONNX_PATH = os.environ.get("SILERO_ONNX_PATH")  # Default: the model shipped with silero-vad
+
+SPEECH_THRESHOLD = 0.5       # Silero probability that starts speech
+MIN_SPEECH_MS = 250          # Shortest speech that counts (same as get_speech_timestamps)
+AUTO_ORDER = ["onnx", "torch", "energy"]
+
+
+def to_float(audio_data):
+    """int16 PCM bytes -> float32 samples in [-1, 1]"""
+    return np.frombuffer(audio_data, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def has_speech(probs, frame_ms, threshold=SPEECH_THRESHOLD, min_speech_ms=MIN_SPEECH_MS):
+    """
+    Silero-style triggering on per-frame speech probabilities: start above
+    threshold, stop below threshold - 0.15, and require one segment of min_speech_ms.
+    """
+    neg_threshold = threshold - 0.15
+    min_frames = max(1, int(min_speech_ms / frame_ms))
+    run = 0
+    triggered = False
+    for prob in probs:
+        if prob >= threshold:
+            triggered = True
+        elif prob < neg_threshold:
+            triggered = False
+            run = 0
+        if triggered:
+            run += 1
+            if run >= min_frames:
+                return True
+    return False
+
+
+class VADBackend:
+    """
+    Interface: load() once, then is_speech(bytes) per audio chunk. Backends that
+    adapt to the line (noise floor) keep that in a new_state() object per call line;
+    one backend instance is shared by every line.
+    """
+
+    name = "base"
+    threads = 1  # Intra-op threads for model backends (set by create_vad)
+
+    def load(self):
+        pass
+
+    def new_state(self):
+        """Per-line state to pass to is_speech (None for stateless backends)"""
+        return None
+
+    def is_speech(self, audio_data, state=None):
+        raise NotImplementedError
+
+    def is_speech_batch(self, chunks, states=None):
+        """Several chunks (e.g. from different calls) at once"""
+        states = states or [None] * len(chunks)
+        return [self.is_speech(chunk, state) for chunk, state in zip(chunks, states)]
+
+
+class OnnxSileroVAD(VADBackend):
+    """Silero VAD v4/v5 ONNX model on ONNX Runtime - torch is never imported"""
+
+    name = "onnx"
+    FRAME = 512      # Samples per model step at 16 kHz (32 ms)
+    CONTEXT = 64     # v5 looks at the last 64 samples of the previous frame
+
+    def __init__(self, model_path=None):
+        self.model_path = model_path or SILERO_ONNX_PATH or self.default_model_path()
+        self.session = None
+
+    @staticmethod
+    def default_model_path():
+        """silero_vad.onnx inside the installed silero-vad package (found without importing it)"""
+        spec = importlib.util.find_spec("silero_vad")
+        if spec and spec.origin:
+            path = os.path.join(os.path.dirname(spec.origin), "data", "silero_vad.onnx")
+            if os.path.exists(path):
+                return path
+        return "silero_vad.onnx"
+
+    def load(self):
+        import onnxruntime
+
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"Silero ONNX model not found at {self.model_path} (set SILERO_ONNX_PATH)")
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.threads  # Tiny model - more threads mostly add overhead
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(self.model_path, sess_options=options,
+                                                    providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.v5 = "state" in self.input_names
+
+    def frame_probs(self, batch):
+        """batch: (n, samples) float32 -> (n, frames) speech probabilities"""
+        n = batch.shape[0]
+        frames = max(1, -(-batch.shape[1] // self.FRAME))
+        padded = np.zeros((n, frames * self.FRAME), dtype=np.float32)
+        padded[:, :batch.shape[1]] = batch
+        sr = np.array(SAMPLERATE, dtype=np.int64)
+
+        probs = np.zeros((n, frames), dtype=np.float32)
+        if self.v5:
+            state = np.zeros((2, n, 128), dtype=np.float32)
+            context = np.zeros((n, self.CONTEXT), dtype=np.float32)
+        else:
+            h = np.zeros((2, n, 64), dtype=np.float32)
+            c = np.zeros((2, n, 64), dtype=np.float32)
+
+        for i in range(frames):
+            frame = padded[:, i * self.FRAME:(i + 1) * self.FRAME]
+            if self.v5:
+                x = np.concatenate([context, frame], axis=1)
+                out, state = self.session.run(None, {"input": x, "state": state, "sr": sr})
+                context = x[:, -self.CONTEXT:]
+            else:
+                out, h, c = self.session.run(None, {"input": frame, "sr": sr, "h": h, "c": c})
+            probs[:, i] = out.reshape(n)
+        return probs
+
+    def is_speech(self, audio_data, state=None):
+        probs = self.frame_probs(to_float(audio_data)[np.newaxis, :])[0]
+        return has_speech(probs, self.FRAME * 1000 / SAMPLERATE)
+
+    def is_speech_batch(self, chunks, states=None):
+        arrays = [to_float(chunk) for chunk in chunks]
+        batch = np.zeros((len(arrays), max(len(a) for a in arrays)), dtype=np.float32)
+        for i, a in enumerate(arrays):
+            batch[i, :len(a)] = a
+        frame_ms = self.FRAME * 1000 / SAMPLERATE
+        return [has_speech(row, frame_ms) for row in self.frame_probs(batch)]
+
+
+class TorchSileroVAD(VADBackend):
+    """Silero through torch + silero_vad.get_speech_timestamps (original behaviour)"""
+
+    name = "torch"
+
+    def load(self):
+        import torch
+        from silero_vad import load_silero_vad, get_speech_timestamps
+
+        torch.set_num_threads(self.threads)  # torch defaults to every core
+        self.torch = torch
+        self.get_speech_timestamps = get_speech_timestamps
+        self.model = load_silero_vad()
+
+    def is_speech(self, audio_data, state=None):
+        audio_tensor = self.torch.from_numpy(to_float(audio_data))
+        return len(self.get_speech_timestamps(audio_tensor, self.model, sampling_rate=SAMPLERATE)) > 0
+
+    def is_speech_batch(self, chunks, states=None):
+        if not hasattr(self.model, "audio_forward"):
+            return super().is_speech_batch(chunks, states)
+        # One padded forward pass for all chunks
+        arrays = [to_float(chunk) for chunk in chunks]
+        batch = np.zeros((len(arrays), max(len(a) for a in arrays)), dtype=np.float32)
+        for i, a in enumerate(arrays):
+            batch[i, :len(a)] = a
+        probs = self.model.audio_forward(self.torch.from_numpy(batch), sr=SAMPLERATE).numpy()
+        frame_ms = 512 * 1000 / SAMPLERATE
+        return [has_speech(row, frame_ms) for row in probs]
+
+
+class EnergyVAD(VADBackend):
+    """
+    No model: a 30 ms frame is speech when it is loud enough above the adaptive
+    noise floor and its zero-crossing rate looks like voice rather than hiss.
+    The floor belongs to one line - pass each line's new_state() to is_speech.
+    """
+
+    name = "energy"
+    FRAME = 480              # 30 ms at 16 kHz
+    MARGIN_DB = 10.0         # Above the noise floor
+    MIN_LEVEL_DB = -50.0     # Never call anything quieter than this speech
+    ZCR_RANGE = (0.01, 0.35)  # Voiced speech; broadband noise crosses zero far more often
+
+    def __init__(self):
+        self.default_state = self.new_state()  # For callers with a single line (benchmarks)
+
+    def new_state(self):
+        return {"noise_floor_db": -60.0}
+
+    def frame_flags(self, samples, state=None):
+        state = state if state is not None else self.default_state
+        frames = len(samples) // self.FRAME
+        if frames == 0:
+            return np.zeros(0, dtype=bool)
+        framed = samples[:frames * self.FRAME].reshape(frames, self.FRAME)
+        rms = np.sqrt(np.mean(framed ** 2, axis=1) + 1e-12)
+        level_db = 20 * np.log10(rms)
+        zcr = np.mean(np.abs(np.diff(np.signbit(framed), axis=1)), axis=1)
+
+        # Noise floor follows quiet frames quickly and loud frames slowly
+        floor = state["noise_floor_db"]
+        for level in level_db:
+            rate = 0.3 if level < floor else 0.01
+            floor += rate * (level - floor)
+        state["noise_floor_db"] = floor
+
+        threshold = max(floor + self.MARGIN_DB, self.MIN_LEVEL_DB)
+        return (level_db > threshold) & (zcr >= self.ZCR_RANGE[0]) & (zcr <= self.ZCR_RANGE[1])
+
+    def is_speech(self, audio_data, state=None):
+        flags = self.frame_flags(to_float(audio_data), state)
+        return has_speech(flags.astype(np.float32), self.FRAME * 1000 / SAMPLERATE)
+
+
+BACKENDS = {"onnx": OnnxSileroVAD, "torch": TorchSileroVAD, "energy": EnergyVAD}
+
+
+def create_vad(name=None, threads=1):
+    """
+    Build and load the configured backend. "auto" tries onnx, torch, energy;
+    an explicit backend that fails to load falls back to energy so a line is never deaf.
+    """
+    name = (name or VAD_BACKEND).lower()
+    order = AUTO_ORDER if name == "auto" else [name, "energy"]
+    if order[0] not in BACKENDS:
+        raise ValueError(f"Unknown VAD backend '{name}' (choose from {', '.join(BACKENDS)} or auto)")
+
+    for candidate in dict.fromkeys(order):
+        backend = BACKENDS[candidate]()
+        backend.threads = threads
+        try:
+            backend.load()
+        except Exception as e:
+            print(f"[VAD] {candidate} backend unavailable: {e}")
+            continue
+        print(f"[VAD] Using {candidate} backend")
+        return backend
+    raise RuntimeError("No VAD backend could be loaded")
+
+
+# Test functions
+if __name__ == "__main__":
+    print("Testing VAD backends...")
+    t = np.arange(SAMPLERATE) / SAMPLERATE
+    rng = np.random.default_rng(0)
+    silence = (rng.normal(0, 0.002, SAMPLERATE) * 32767).astype(np.int16).tobytes()
+    # Crude voiced sound: 140 Hz fundamental with harmonics, syllable-rate modulation
+    voice = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 6)) * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t))
+    voiced = (voice / np.max(np.abs(voice)) * 0.3 * 32767).astype(np.int16).tobytes()
+
+    vad = create_vad()
+    print(f"\n1. Silence -> speech? {vad.is_speech(silence)}")
+    print(f"2. Voiced tone -> speech? {vad.is_speech(voiced)} (model backends may reject a synthetic tone)")
+    print(f"3. Batch: {vad.is_speech_batch([silence, voiced])}")
+
+    # Each line adapts to its own noise - a noisy line must not deafen a quiet one
+    noise = (rng.normal(0, 0.05, SAMPLERATE) * 32767).astype(np.int16).tobytes()
+    quiet_line, noisy_line = vad.new_state(), vad.new_state()
+    for _ in range(5):
+        vad.is_speech(noise, noisy_line)
+    print(f"4. Per-line state: {quiet_line} vs noisy {noisy_line}; "
+          f"quiet line hears the tone? {vad.is_speech(voiced, quiet_line)}")
+    print("\n✓ VAD backends ready!")
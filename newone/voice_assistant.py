@@ -1,92 +1,134 @@
+from startup import StartupOrchestrator, lazy_import  # First: marks process start for the timing report
+import asyncio
+import contextlib
+import hashlib
 import json
 import requests
-import sounddevice as sd
+try:
+    import sounddevice as sd
+except OSError:  # PortAudio missing (headless box) - only replay.py can run
+    sd = None
 import numpy as np
 import os
+import socket
 import sys
-import queue
 import threading
 import time
+import tempfile
+import wave
 from datetime import datetime
-from faster_whisper import WhisperModel
-import pyttsx3
-import tkinter as tk
-from booking_tools import check_availability, book_appointment, get_todays_appointments
-from manager_alert import trigger_manager_alert
-import torch
-from silero_vad import load_silero_vad, read_audio, get_speech_timestamps
+from booking_tools import check_availability, book_appointment
+from response_cache import ResponseCache, extract_personal_values
+from kb_manager import KnowledgeBaseManager
+from tool_commands import extract_book_line, parse_book_tool
+from dialog_state import BookingDialog
+from call_scheduler import FairScheduler
+from model_server import RemoteModels, parse_address
+from async_pipeline import (StageTimer, StageTimeout, OllamaError, AudioBridge, TurnControl,
+                            stream_ollama_async, make_executors, offload)
+from model_router import ModelRouter, on_cancel
+from resource_manager import ResourceManager
+from whisper_tuner import load_whisper_profile
+from tracing import Tracer, traced_stream, traced_stream_async
+from profiler import SamplingProfiler
+from audio_queue import AudioQueue
+from audio_input import AudioInput
+from speculative import Speculator, PartialTracker, PARTIAL_EVERY_CHUNKS
+from response_sanitizer import sanitize
+from conversation_memory import ConversationMemory
+from date_resolver import resolve_date, resolve_time, format_time, resolve_from_transcripts
 
 # --- CONFIGURATION ---
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
+OLLAMA_API_URL = os.environ.get("OLLAMA_API_URL", "http://localhost:11434/api/generate")  # fake_ollama.py for tests
 MODEL_NAME = "qwen2.5:3b"
 
-# --- Conversation History ---
-conversation_history = []
+# --- Model Tiering (see model_router.py) ---
+# With FAST_MODEL_NAME set (e.g. qwen2.5:0.5b - ollama pull it first) short turns and
+# booking-form answers go to it; if no first token arrives within FIRST_TOKEN_DEADLINE
+# seconds we switch to the fast model, then say a filler phrase while the answer finishes.
+# Unset, every turn goes to MODEL_NAME.
+model_router = ModelRouter(MODEL_NAME)
 
-# --- Load Knowledge Base ---
-KB_PATH = "knowledge_base.json"
+# --- Conversation History (token-budgeted per call, see conversation_memory.py) ---
+HISTORY_TOKEN_BUDGET = 600
 
-def load_knowledge_base():
-    """Load knowledge base from JSON file"""
-    try:
-        with open(KB_PATH, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"[Error] Knowledge base not found at: {KB_PATH}")
-        sys.exit(1)
+# --- Phone Lines ---
+# One entry per line: (input device index, output device index); None = system default
+# Override with PHONE_LINES="1:3,2:4" (input:output pairs) to serve several calls at once
+PHONE_LINES = [(None, None)]
+
+# --- Model Server (optional) ---
+# Set MODEL_SERVER="127.0.0.1:6055" to use Whisper/Silero hosted by model_server.py
+# instead of loading them in this process
+MODEL_SERVER = os.environ.get("MODEL_SERVER")
+
+# --- Async Pipeline (optional) ---
+# ASYNC_PIPELINE=1 runs calls on the asyncio core (see async_pipeline.py) with
+# per-stage deadlines; BARGE_IN=1 keeps listening while speaking so the caller
+# can interrupt (only use with echo-free audio, e.g. a headset or phone line)
+ASYNC_PIPELINE = os.environ.get("ASYNC_PIPELINE") == "1"
+BARGE_IN = os.environ.get("BARGE_IN") == "1"
+
+# --- Speculative LLM (optional, threaded pipeline) ---
+# SPECULATIVE=1 transcribes while the caller is still speaking and starts the
+# LLM once the partial transcript is stable (see speculative.py)
+SPECULATIVE = os.environ.get("SPECULATIVE") == "1"
+
+# --- CPU Budget (see resource_manager.py) ---
+# Whisper, the VAD and Ollama get thread counts from RESOURCE_PRESET (off by default; auto/4core/8core)
+# so they don't oversubscribe the CPU when stages overlap; CPU_AFFINITY=1 also pins them
+resources = ResourceManager()
+
+# --- Turn Tracing (see tracing.py) ---
+# Per-turn timings (STT, LLM first/last token, tools, TTS, first audio out) go to
+# traces/turns.jsonl with p50/p95 per stage in traces/metrics.prom; METRICS_PORT=9108 serves them
+tracer = Tracer()
+
+# --- Sampling Profiler (see profiler.py) ---
+# Off until toggled with SIGUSR1 or 'p' + Enter; writes one profile per call to profiles/ (single line)
+profiler = SamplingProfiler()
+
+# --- Load Knowledge Base (hot-reloadable, see kb_manager.py) ---
+KB_PATH = "knowledge_base.json"
 
-kb = load_knowledge_base()
+try:
+    kb_manager = KnowledgeBaseManager(KB_PATH)
+except FileNotFoundError:
+    print(f"[Error] Knowledge base not found at: {KB_PATH}")
+    sys.exit(1)
 
-# Extract configuration from KB
-ASSISTANT_NAME = kb["assistant_info"]["name"]
-BUSINESS_NAME = kb["business_info"]["name"]
-OWNER_NAME = kb["business_info"]["owner_name"]
+# Extract configuration from KB (replaced by apply_kb when the file changes)
+kb = kb_manager.current.raw
+ASSISTANT_NAME = kb_manager.current.assistant_name
+BUSINESS_NAME = kb_manager.current.business_name
+OWNER_NAME = kb_manager.current.owner_name
 
-# Build context for system prompt from KB
 def build_kb_context():
-    """Build context string from knowledge base for salon"""
-    context = f"""
-SALON INFO:
-- Name: {kb['business_info']['name']}
-- Owner: {kb['business_info']['owner_name']}
-- Phone: {kb['business_info']['phone']}
-- Address: {kb['business_info']['address']}
-
-BUSINESS HOURS:
-- Weekdays: {kb['business_hours']['monday_to_friday']}
-- Saturday: {kb['business_hours']['saturday']}
-- Sunday: {kb['business_hours']['sunday']}
-
-SERVICES:
-"""
-    
-    # Add services with pricing
-    for category, services in kb["services"].items():
-        context += f"\n{category.upper()}:\n"
-        for service_name, details in services.items():
-            context += f"  - {service_name.replace('_', ' ').title()}: ${details['price']} ({details['duration']} min)\n"
-    
-    # Add staff
-    context += f"\nSTAFF:\n"
-    for role, members in kb["staff"].items():
-        context += f"  - {role.replace('_', ' ').title()}: {', '.join(members)}\n"
-    
-    # Add policies
-    context += f"\nPOLICIES:\n"
-    for policy_name, policy_text in kb["policies"].items():
-        context += f"  - {policy_name.title()}: {policy_text}\n"
-    
-    return context
+    """Context string for the system prompt (precompiled per KB version)"""
+    return kb_manager.current.context
+
+# --- Response Cache (repeated caller questions) ---
+RESPONSE_CACHE_PATH = "response_cache.json"  # Set to None to keep the cache in memory only
+RESPONSE_CACHE_SIZE = 256
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_SIZE,
+    path=RESPONSE_CACHE_PATH,
+    kb_version=kb_manager.current.version
+)
 
-SYSTEM_PROMPT = f"""
-You are {ASSISTANT_NAME}, the AI receptionist for {BUSINESS_NAME}.
+def build_system_prompt(compiled):
+    """Render the system prompt for one compiled knowledge base version"""
+    assistant_name = compiled.assistant_name
+    owner_first_name = compiled.owner_name.split()[0]
+    return f"""
+You are {assistant_name}, the AI receptionist for {compiled.business_name}.
 
-{build_kb_context()}
+{compiled.context}
 
 === BOOKING PROCESS (STRICT VALIDATION) ===
 
 🚨 CRITICAL RULE: NEVER make up or assume customer information!
-🚨 You are NOT the customer! Do NOT use your own name "Sophia" for bookings!
+🚨 You are NOT the customer! Do NOT use your own name "{assistant_name}" for bookings!
 
 WHEN CUSTOMER WANTS TO BOOK:
 1. Customer says "book", "appointment", "schedule"
@@ -105,20 +147,21 @@ WHEN CUSTOMER WANTS TO BOOK:
 
 ⚡ IMMEDIATE EXECUTION RULE:
 AS SOON AS you have all 5 items (name, phone, service, date, time):
-→ IMMEDIATELY output: TOOL:BOOK:name|phone|YYYY-MM-DD|HH:MM AM/PM|service|price|duration
+→ IMMEDIATELY output: TOOL:BOOK:name|phone|YYYY-MM-DD|HH:MM AM/PM|service
+→ Use the service name exactly as listed under SERVICES (price and duration are added automatically)
 → DO NOT say "details are noted" or "appointment confirmed" - EXECUTE THE TOOL!
 → DO NOT ask "is this confirmed?" - JUST EXECUTE THE TOOL!
 
 ❌ FORBIDDEN - DO NOT BOOK IF:
 - Customer hasn't provided their name
 - Customer hasn't provided their phone number
-- You're using "Sophia" as name (that's YOU, not the customer!)
+- You're using "{assistant_name}" as name (that's YOU, not the customer!)
 - You're making up phone numbers like 555-1234567
 
 ✅ CORRECT BEHAVIOR:
 When customer says: "I want haircut on Monday at 10 AM"
 And you already have: Name=Davis, Phone=555462125
-Then IMMEDIATELY respond with: "TOOL:BOOK:Davis|555462125|2025-12-29|10:00 AM|Men's Haircut|25|30"
+Then IMMEDIATELY respond with: "TOOL:BOOK:Davis|555462125|2025-12-29|10:00 AM|Men's Haircut"
 NOT: "Your details are noted" ← WRONG!
 
 EXAMPLE CORRECT FLOW:
@@ -129,13 +172,13 @@ You: "Thanks Kevin! What's your phone number?"
 User: "555-8888"
 You: "Perfect! What time on Monday?"
 User: "10 AM"
-You: "TOOL:BOOK:Kevin|555-8888|2025-12-29|10:00 AM|Men's Haircut|25|30"
+You: "TOOL:BOOK:Kevin|555-8888|2025-12-29|10:00 AM|Men's Haircut"
 ← Notice: IMMEDIATELY executed tool, didn't say "confirmed" first!
 
 EXAMPLE WRONG (DO NOT DO THIS):
 User: "I want a haircut on Monday at 10 AM" (you already have name=Davis, phone=555462125)
 You: "Your details are noted" ← WRONG! Should execute TOOL:BOOK instead!
-CORRECT: "TOOL:BOOK:Davis|555462125|2025-12-29|10:00 AM|Men's Haircut|25|30"
+CORRECT: "TOOL:BOOK:Davis|555462125|2025-12-29|10:00 AM|Men's Haircut"
 
 === OTHER TOOLS ===
 - CHECK_SLOTS: "TOOL:CHECK_SLOTS:YYYY-MM-DD" - only when asking about availability
@@ -144,30 +187,58 @@ CORRECT: "TOOL:BOOK:Davis|555462125|2025-12-29|10:00 AM|Men's Haircut|25|30"
 WHEN TO CALL MANAGER:
 - Customer asks to "speak with manager", "talk to owner", "escalate"
 - Customer has special requests you cannot handle (group bookings, party events, complaints)
-- Customer mentions "manager", "owner", "Maria" (owner's name)
+- Customer mentions "manager", "owner", "{owner_first_name}" (owner's name)
 - Use: "TOOL:CALL_MANAGER"
 
 RULES:
 1. Keep responses SHORT (1 sentence)
 2. Don't use tools for general questions
 3. ALWAYS get name and phone BEFORE booking
-4. NEVER use your own name (Sophia) in bookings
+4. NEVER use your own name ({assistant_name}) in bookings
 5. Offer to connect with manager if customer seems unsatisfied or has special needs
 """
 
+SYSTEM_PROMPT = build_system_prompt(kb_manager.current)
+
+def apply_kb(compiled):
+    """Swap in a reloaded knowledge base - runs between turns, models stay loaded"""
+    global kb, ASSISTANT_NAME, BUSINESS_NAME, OWNER_NAME, SYSTEM_PROMPT
+    system_prompt = build_system_prompt(compiled)
+    kb = compiled.raw
+    ASSISTANT_NAME = compiled.assistant_name
+    BUSINESS_NAME = compiled.business_name
+    OWNER_NAME = compiled.owner_name
+    SYSTEM_PROMPT = system_prompt
+    response_cache.set_kb_version(compiled.version)
+
+kb_manager.on_swap(apply_kb)
+
+
 # --- Whisper Model Setup ---
-WHISPER_MODEL_SIZE = "base"  # Options: tiny, base, small, medium, large-v3
+# Size, compute type, beam size and vad_filter come from whisper_profile.json once
+# `python whisper_tuner.py` has calibrated this PC (defaults: base, int8, beam 5)
+WHISPER_PROFILE = load_whisper_profile()
+WHISPER_MODEL_SIZE = WHISPER_PROFILE["model_size"]  # Options: tiny, base, small, medium, large-v3
 # base = ~150MB, good balance | medium = ~1.5GB, best for accents
+# STT_BACKEND=whisper_stream decodes while the caller talks; STT_BACKEND=vosk uses
+# Vosk's streaming recognizer (VOSK_MODEL_PATH) for weak CPUs - see stt_backends.py
 
-# --- Global state management (like LiveKit agents) ---
-is_speaking = False  # Flag to indicate TTS is active
-audio_stream = None  # Reference to the audio stream
-stream_lock = threading.Lock()  # Thread-safe stream control
-whisper_model = None  # Will be initialized in main
+# --- STT Setup (Whisper with Silero VAD) ---
+SAMPLERATE = 16000
+MAX_SILENCE_CHUNKS = 8  # ~0.5 seconds of silence (8 * 0.06s per chunk)
+MIN_RECORDING_CHUNKS = 8  # Minimum ~0.5 seconds of speech
+IGNORE_WORDS = ['the', 'a', 'an', 'uh', 'um', 'huh', 'oh', 'ah', 'er', 'mm']
+
+# --- Startup (heavy components load in parallel, see startup.py) ---
+startup = StartupOrchestrator()
 
 # --- TTS Engine Setup ---
+tts_lock = threading.Lock()  # pyttsx3 is not thread-safe - one line speaks at a time
+TTS_CACHE_DIR = "tts_cache"  # Pre-rendered phrases (the greeting) play without waiting for TTS
+
 def init_tts():
     """Initialize pyttsx3 TTS engine"""
+    import pyttsx3  # Lazy: its speech driver is slow to load, so warm_tts() does it in the background
     engine = pyttsx3.init()
     engine.setProperty('rate', 165)
     engine.setProperty('volume', 0.9)
@@ -176,58 +247,60 @@ def init_tts():
         engine.setProperty('voice', voices[1].id)  # Female voice if available
     return engine
 
-def speak(text):
-    """
-    Professional TTS management with Piper:
-    1. Stop audio input stream
-    2. Clear any queued audio
-    3. Synthesize and speak with Piper
-    4. Wait for audio to clear
-    5. Restart input stream
-    """
-    global is_speaking, audio_stream, piper_voice
-    
-    print(f"\n{ASSISTANT_NAME} speaking: {text}")
-    if not text or len(text) == 0:
-        print("[Warning] Empty text, skipping TTS")
-        return
-    
-    with stream_lock:
-        try:
-            # Step 1: Stop microphone input
-            is_speaking = True
-            if audio_stream:
-                audio_stream.stop()
-                print("[Microphone] MUTED during TTS")
-            
-            # Step 2: Clear any audio data captured before muting
-            while not Q.empty():
-                try:
-                    Q.get_nowait()
-                except queue.Empty:
-                    break
-            
-            # Step 3: Initialize fresh engine and speak
-            engine = init_tts()
-            engine.say(text)
-            engine.runAndWait()
-            engine.stop()
-            del engine
-            
-            print("[TTS] Finished speaking")
-            
-            # Step 4: Wait for audio to physically clear
-            time.sleep(0.3)
-            
-        except Exception as e:
-            print(f"[TTS Error] {e}")
-        
-        finally:
-            # Step 5: Resume listening
-            if audio_stream:
-                audio_stream.start()
-                print("[Microphone] UNMUTED - Ready to listen\n" + "-"*30)
-            is_speaking = False
+def synthesize_to_file(text, path):
+    """Render speech to a WAV file (used for lines with their own output device)"""
+    with tts_lock, resources.stage("tts"):
+        engine = init_tts()
+        engine.save_to_file(text, path)
+        engine.runAndWait()
+        engine.stop()
+        del engine
+
+def warm_tts():
+    """Load the TTS driver once so the first real reply doesn't pay for it"""
+    with tts_lock:
+        engine = init_tts()
+        engine.stop()
+        del engine
+
+def cached_speech_path(text):
+    """Where a pre-rendered phrase lives (keyed by its text)"""
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(TTS_CACHE_DIR, f"phrase_{digest}.wav")
+
+def render_cached_speech(text):
+    """Render a phrase into the TTS cache unless it's already there"""
+    path = cached_speech_path(text)
+    if not os.path.exists(path):
+        os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+        tmp_path = path + ".tmp.wav"
+        synthesize_to_file(text, tmp_path)
+        os.replace(tmp_path, path)
+    return path
+
+def greeting_text():
+    return f"Hello! I'm {ASSISTANT_NAME}, your AI receptionist at {BUSINESS_NAME}. How can I help you today?"
+
+def wait_for_greeting():
+    """The greeting is rendered at startup - wait for it rather than synthesizing it twice"""
+    if "greeting" in startup.components:
+        startup.wait("greeting")
+
+def play_wav(path, device, stop_event=None, on_start=None):
+    """Play a WAV file on a specific output device (stops early when stop_event is set)"""
+    with wave.open(path, 'rb') as wf:
+        frames = wf.readframes(wf.getnframes())
+        samplerate = wf.getframerate()
+        channels = wf.getnchannels()
+    audio = np.frombuffer(frames, dtype=np.int16).reshape(-1, channels)
+    block = samplerate // 10  # 100 ms - how quickly playback reacts to stop_event
+    with sd.OutputStream(samplerate=samplerate, channels=channels, dtype='int16', device=device) as out:
+        for start in range(0, len(audio), block):
+            if stop_event is not None and stop_event.is_set():
+                break
+            out.write(audio[start:start + block])
+            if start == 0 and on_start:
+                on_start()  # First block is on its way to the caller
 
 
 # --- LLM Setup (Ollama API with Streaming) ---
@@ -236,46 +309,9 @@ def get_current_context():
     now = datetime.now()
     day_name = now.strftime("%A")
     current_time = now.strftime("%I:%M %p")
-    hour = now.hour
     
     # Determine what Kevin should be doing based on schedule from KB
-    activity = "unknown"
-    
-    # Map day to schedule key
-    if day_name in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]:
-        schedule_key = "monday_to_friday"
-    elif day_name == "Saturday":
-        schedule_key = "saturday"
-    elif day_name == "Sunday":
-        schedule_key = "sunday"
-    else:
-        schedule_key = None
-    
-    # Find current activity from KB schedule
-    if schedule_key and "daily_schedule" in kb and schedule_key in kb["daily_schedule"]:
-        schedule = kb["daily_schedule"][schedule_key]
-        # Find the most recent time slot that has passed
-        for time_key, activity_desc in schedule.items():
-            # Extract hour from time_key (e.g., "7:30_AM" -> 7, "3:30_PM" -> 15)
-            try:
-                time_parts = time_key.split("_")
-                time_str = time_parts[0]
-                period = time_parts[1] if len(time_parts) > 1 else "AM"
-                
-                hour_min = time_str.split(":")
-                schedule_hour = int(hour_min[0])
-                
-                # Convert to 24-hour format
-                if period == "PM" and schedule_hour != 12:
-                    schedule_hour += 12
-                elif period == "AM" and schedule_hour == 12:
-                    schedule_hour = 0
-                
-                # Check if current time is past this schedule time
-                if hour >= schedule_hour:
-                    activity = activity_desc
-            except:
-                continue
+    activity = kb_manager.current.activity_at(now)
     
     return f"""
 CURRENT TIME CONTEXT:
@@ -284,243 +320,918 @@ CURRENT TIME CONTEXT:
 - Kevin is likely: {activity}
 """
 
-def get_ollama_response_stream(user_input):
-    """Get LLM response and process any tool commands"""
-    global conversation_history
-    
-    print(f"\nUser said: {user_input}")
-    
-    # Add current time context
+def build_prompt(conversation_text):
+    """LLM prompt: current date/time plus the rendered conversation history"""
     now = datetime.now()
     time_context = f"Current date/time: {now.strftime('%A, %B %d, %Y at %I:%M %p')}"
     
-    # Add user message to history
-    conversation_history.append({"role": "user", "content": user_input})
-    
-    # Build conversation context (last 10 messages to keep context manageable)
-    recent_history = conversation_history[-10:]
-    conversation_text = "\n".join([
-        f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}" 
-        for msg in recent_history
-    ])
-    
     # Combine time context and conversation
-    enhanced_prompt = f"{time_context}\n\nConversation history:\n{conversation_text}"
-    
+    return f"{time_context}\n\nConversation history:\n{conversation_text}"
+
+def close_stream(response):
+    """Close a streaming response from another thread - shutting the socket ends a blocked read"""
+    sock = getattr(getattr(response.raw, "_connection", None), "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+def iter_ollama(model, prompt, system_prompt):
+    """
+    Yield response text chunks from Ollama as they stream in. Raises
+    RequestException, also when the stream breaks off before Ollama's "done"
+    line - half a reply must not be spoken or booked as if it were complete.
+    """
     payload = {
-        "model": MODEL_NAME,
-        "prompt": enhanced_prompt,
-        "system": SYSTEM_PROMPT,
+        "model": model,
+        "prompt": prompt,
+        "system": system_prompt,
         "stream": True
     }
+    if resources.ollama_options():
+        payload["options"] = resources.ollama_options()
     
-    full_response = ""
-    try:
-        with requests.post(OLLAMA_API_URL, json=payload, stream=True, timeout=180) as response:
-            response.raise_for_status()
-            for line in response.iter_lines():
-                if line:
-                    try:
-                        json_response = json.loads(line.decode('utf-8'))
-                        chunk = json_response.get('response', '')
-                        full_response += chunk
-                        
-                        if json_response.get('done'):
-                            break
-                    except json.JSONDecodeError:
-                        continue
-    except requests.exceptions.RequestException as e:
-        print(f"[Error] Ollama API: {e}")
-        return "Sorry, the assistant is offline."
+    with resources.stage("llm"), requests.post(OLLAMA_API_URL, json=payload, stream=True, timeout=180) as response:
+        on_cancel(lambda: close_stream(response))  # A discarded reply frees Ollama at once
+        response.raise_for_status()
+        done = False
+        for line in response.iter_lines():
+            if line:
+                try:
+                    json_response = json.loads(line.decode('utf-8'))
+                except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                    raise requests.exceptions.ChunkedEncodingError(f"Broken response stream from Ollama: {e}") from e
+                chunk = json_response.get('response', '')
+                if chunk:
+                    yield chunk
+                
+                if json_response.get('done'):
+                    done = True
+                    break
+        if not done:
+            raise requests.exceptions.ChunkedEncodingError("Ollama closed the stream before the reply was done")
+
+
+# --- Shared Models (loaded once, used read-only by every call session) ---
+class SharedModels:
+    """The STT and VAD backends shared by all sessions in this process"""
+    
+    def __init__(self, whisper_size=WHISPER_MODEL_SIZE, profile=WHISPER_PROFILE, stt_backend=None):
+        self.whisper_size = whisper_size
+        self.profile = profile
+        self.stt_backend = stt_backend  # None = STT_BACKEND
+        self.stt = None
+        self.vad = None
+        self.vad_states = {}  # session id -> backend state (each line's own noise floor)
+        self.vad_lock = threading.Lock()  # Backends aren't thread-safe (Silero session)
+        self.vad_ready = threading.Event()      # Set once loading finished, either way
+        self.whisper_ready = threading.Event()
+        self.load_errors = {}  # "vad"/"whisper" -> exception from its loader
     
-    # Process any tool commands
-    response = full_response.strip()
+    def load(self):
+        self.load_vad()
+        self.load_whisper()
     
-    # Check for tool commands
-    if "TOOL:CHECK_SLOTS:" in response:
-        date_str = response.split("TOOL:CHECK_SLOTS:")[1].split()[0].strip()
-        print(f"[Tool] Checking availability for {date_str}...")
-        result = check_availability(date_str)
+    # Imported in the loaders so call processes using the model server never load torch
+    def load_vad(self):
+        from vad_backends import create_vad
         
-        if "error" in result:
-            return result["error"]
+        print("[System] Loading VAD...")
+        with self._loading("vad", self.vad_ready):
+            self.vad = create_vad(threads=resources.vad_threads())  # VAD_BACKEND=onnx|torch|energy
+        print(f"[System] VAD loaded ({self.vad.name} backend)!")
+    
+    def load_whisper(self):
+        from stt_backends import create_stt
+        
+        print(f"[System] Loading speech recognition (Whisper {self.whisper_size}, profile: {self.profile})...")
+        resources.pin("stt")  # Engine threads started while loading inherit the cores (decode workers pin themselves)
+        with self._loading("whisper", self.whisper_ready):
+            self.stt = create_stt(self.stt_backend, self.whisper_size, self.profile,
+                                  resources.whisper_kwargs(), stage=resources.stage)
+        print(f"[System] Speech recognition loaded ({self.stt.name} backend)!")
+    
+    @contextlib.contextmanager
+    def _loading(self, name, ready):
+        """Run a loader; waiters are released either way and see its error"""
+        self.load_errors.pop(name, None)  # Reloading (replay switches STT backends)
+        try:
+            yield
+        except Exception as e:
+            self.load_errors[name] = e
+            raise
+        finally:
+            ready.set()
+    
+    def _wait_for(self, name, ready):
+        ready.wait()
+        if name in self.load_errors:
+            raise RuntimeError(f"{name} failed to load: {self.load_errors[name]}") from self.load_errors[name]
+    
+    def detect_speech(self, audio_data, session_id=None):
+        """Ask the configured VAD backend whether audio contains speech (state kept per line)"""
+        self._wait_for("vad", self.vad_ready)  # Audio queues up meanwhile; nothing is lost while warming
+        with self.vad_lock, resources.stage("vad"):
+            if session_id not in self.vad_states:
+                self.vad_states[session_id] = self.vad.new_state()
+            return self.vad.is_speech(audio_data, self.vad_states[session_id])
+    
+    def transcribe(self, audio_data):
+        """Transcribe a whole utterance with the STT backend"""
+        self._wait_for("whisper", self.whisper_ready)
+        try:
+            return self.stt.transcribe(audio_data)
+        except Exception as e:
+            print(f"[Whisper Error] {e}")
+            return ""
+    
+    def new_stream(self):
+        """A per-utterance stream when the backend decodes incrementally, else None (batch at the end)"""
+        if not self.whisper_ready.is_set() or "whisper" in self.load_errors:
+            return None  # Still loading - this utterance is transcribed in one go later
+        return self.stt.new_stream() if self.stt.streaming else None
+
+
+# --- Call Session (one per phone line) ---
+class CallSession:
+    """
+    Everything that belongs to one caller: audio stream and queue, TTS muting,
+    booking form and conversation memory. Models and workers are shared.
+    """
+    
+    def __init__(self, session_id, models, scheduler, input_device=None, output_device=None):
+        self.session_id = session_id
+        self.models = models
+        self.scheduler = scheduler
+        self.input_device = input_device
+        self.output_device = output_device
+        
+        self.Q = AudioQueue()  # Bounded; overload policy from AUDIO_QUEUE_POLICY
+        self.is_speaking = False  # Flag to indicate TTS is active
+        self.audio_stream = None  # Reference to the audio stream
+        self.audio_input = None   # AudioInput adapter (device format -> 16 kHz mono)
+        self.stream_lock = threading.Lock()  # Thread-safe stream control
+        
+        self.memory = ConversationMemory(token_budget=HISTORY_TOKEN_BUDGET)
+        self.dialog = BookingDialog(lambda: kb_manager.current)
+        self.caller_details = set()  # Names/phones given this call (outlive the booking form)
+        
+        self.speculator = Speculator(self.launch_speculation)
+        self.partials = PartialTracker()
+        self.partial_future = None  # Partial transcription in flight
+        self.stt_stream = None      # Streaming STT of the utterance being recorded (streaming backends)
+        
+        self.call_id = tracer.new_call_id(session_id)
+        self.trace = None  # TurnTrace of the utterance being recorded/answered
+    
+    def log(self, message):
+        print(f"[{self.session_id}] {message}")
+    
+    def start_new_call(self):
+        """Forget the previous caller: history, pinned facts and half-filled booking form"""
+        self.log_speculation_stats()
+        self.memory.reset()
+        self.dialog.reset()
+        self.caller_details = set()
+        self.speculator.reset()
+        self.call_id = tracer.new_call_id(self.session_id)
+        profiler.next_call(self.call_id)
+    
+    def log_speculation_stats(self):
+        if SPECULATIVE and self.speculator.stats.launched:
+            self.log(f"[Speculate] Call stats: {self.speculator.stats.as_dict()}")
+    
+    def log_queue_stats(self):
+        """Audio queue counters, plus the depth timeline next to the traces (for sizing it)"""
+        self.log(f"[Audio] Queue: {self.Q.stats()}")
+        if tracer.enabled:
+            self.Q.save_report(os.path.join(os.path.dirname(tracer.trace_path), f"audio_queue_{self.session_id}.json"))
+    
+    def get_dialog_state(self):
+        """Dialog phase used in cache keys: 'general' or 'booking:<awaited slot>'"""
+        return self.dialog.state()
+    
+    def caller_transcripts(self):
+        """What the caller said this call, oldest first (for resolving dates/times)"""
+        return self.memory.user_texts()
+    
+    def start_trace(self):
+        """Speech started - new turn trace (speculative LLM events land in it too)"""
+        self.trace = tracer.start_turn(self.call_id)
+        self.trace.mark("speech_start")
+        return self.trace
+    
+    def mark_first_audio(self):
+        if self.trace:
+            self.trace.mark("first_audio")
+    
+    def transcribe_traced(self, trace, audio_data, stream=None):
+        """models.transcribe (or the stream's final result) with stt_start/stt_end marks (queue time shows up as stt_wait)"""
+        trace.mark("stt_start")
+        if stream is not None:
+            try:
+                text = stream.result()
+            except Exception as e:
+                print(f"[Whisper Error] {e}")
+                text = ""
         else:
-            slots_count = result.get("total", 0)
-            if slots_count > 0:
-                # Show first 5 slots
-                slots_preview = ", ".join(result["available_slots"][:5])
-                return f"We have {slots_count} openings on that day. Available times include {slots_preview}. Would you like to book one?"
+            text = self.models.transcribe(audio_data)
+        trace.mark("stt_end")
+        return text
+    
+    def start_stream(self):
+        """Begin streaming STT for a new utterance (no-op for batch backends)"""
+        self.stt_stream = self.models.new_stream()
+    
+    def feed_stream(self, data, submit=None):
+        """Queue the chunk now (so the final result can't miss it) and decode it on the STT worker"""
+        if self.stt_stream is not None:
+            self.stt_stream.push(data)
+            if submit:
+                submit(self.stt_stream.update)
             else:
-                return "That day is fully booked. Would you like to try a different day?"
+                self.scheduler.submit("stt", self.session_id, self.stt_stream.update)
     
-    elif "TOOL:BOOK:" in response:
-        # Parse booking details: name|phone|date|time|service|price|duration
-        try:
-            # Extract only the TOOL:BOOK line, ignore any text after it
-            tool_line = response.split("TOOL:BOOK:")[1].split("\n")[0].strip()
-            parts = tool_line.split("|")
-            
-            # Validate we have all 7 required fields
-            if len(parts) < 7:
-                print(f"[Tool Error] Missing booking information. Got {len(parts)} fields, need 7")
-                missing = []
-                if len(parts) < 1: missing.append("name")
-                if len(parts) < 2: missing.append("phone")
-                if len(parts) < 3: missing.append("date")
-                if len(parts) < 4: missing.append("time")
-                if len(parts) < 5: missing.append("service")
-                if len(parts) < 6: missing.append("price")
-                if len(parts) < 7: missing.append("duration")
-                return f"I need more information to book. Please provide: {', '.join(missing)}"
-            
-            name, phone, date, time_slot, service, price_str, duration_str = parts[:7]
-            
-            # 🚨 CHECKSUM VALIDATION: Must have name and phone
-            name = name.strip()
-            phone = phone.strip()
-            
-            # Reject if using assistant's own name
-            if name.lower() in ["sophia", "assistant", "ai", "bot"]:
-                print(f"[Tool Error] ❌ CHECKSUM FAILED: Cannot use assistant name '{name}' as customer")
-                return "I need the CUSTOMER's name, not mine! What is YOUR name?"
-            
-            if not name or len(name) < 2:
-                print(f"[Tool Error] ❌ CHECKSUM FAILED: Invalid name '{name}'")
-                return "I need your full name to complete the booking. What's your name?"
-            
-            # Reject fake/placeholder phone numbers
-            if not phone or len(phone) < 7 or phone.startswith("555-123") or phone.startswith("555-000"):
-                print(f"[Tool Error] ❌ CHECKSUM FAILED: Invalid phone '{phone}'")
-                return "I need a valid phone number to complete the booking. What's your phone number?"
-            
-            # Clean up all fields - remove extra characters, newlines, asterisks
-            date = date.strip()
-            time_slot = time_slot.strip()
-            service = service.strip()
-            
-            # Clean up price (remove $, spaces, commas, extra chars)
-            price_str = price_str.strip().replace('$', '').replace(',', '').replace('*', '')
-            # Extract just the number from price_str
-            price_str = ''.join(c for c in price_str if c.isdigit())
-            
-            # Clean up duration (remove min, spaces, asterisks, newlines, extra text)
-            duration_str = duration_str.strip().replace('min', '').replace('*', '').split()[0]
-            # Extract just the number from duration_str
-            duration_str = ''.join(c for c in duration_str if c.isdigit())
-            
-            print(f"[Tool] ✓ CHECKSUM PASSED - Name: {name}, Phone: {phone}")
-            print(f"[Tool] Booking appointment for {name}...")
-            print(f"[Tool] Details: {phone}, {date}, {time_slot}, {service}, ${price_str}, {duration_str}min")
+    def callback(self, indata, frames, time_info, status):
+        """Audio callback - queues audio for Whisper processing"""
+        if status:
+            print(status, file=sys.stderr)
+        
+        # Critical: Do not capture audio during TTS playback
+        if not self.is_speaking:
+            self.Q.put(bytes(indata))
+    
+    def speak(self, text):
+        """
+        TTS with microphone muting:
+        1. Stop audio input stream
+        2. Clear any queued audio
+        3. Synthesize and speak (default device, or this line's output device)
+        4. Wait for audio to clear
+        5. Restart input stream
+        """
+        print(f"\n{ASSISTANT_NAME} speaking ({self.session_id}): {text}")
+        if not text or len(text) == 0:
+            print("[Warning] Empty text, skipping TTS")
+            return
+        
+        if self.trace:
+            self.trace.mark("tts_start")
+        
+        with self.stream_lock:
+            try:
+                # Step 1: Stop microphone input
+                self.is_speaking = True
+                if self.audio_stream:
+                    self.audio_stream.stop()
+                    self.log("[Microphone] MUTED during TTS")
+                
+                # Step 2: Clear any audio data captured before muting
+                self.Q.flush("tts")
+                
+                # Step 3: Speak (pre-rendered phrases play straight from the cache)
+                cached_path = cached_speech_path(text)
+                if os.path.exists(cached_path):
+                    play_wav(cached_path, self.output_device, on_start=self.mark_first_audio)
+                elif self.output_device is None:
+                    with tts_lock, resources.stage("tts"):
+                        engine = init_tts()
+                        engine.connect('started-utterance', lambda name: self.mark_first_audio())
+                        engine.say(text)
+                        engine.runAndWait()
+                        engine.stop()
+                        del engine
+                else:
+                    wav_path = os.path.join(tempfile.gettempdir(), f"tts_{self.session_id}.wav")
+                    synthesize_to_file(text, wav_path)
+                    play_wav(wav_path, self.output_device, on_start=self.mark_first_audio)
+                
+                print("[TTS] Finished speaking")
+                
+                # Step 4: Wait for audio to physically clear
+                time.sleep(0.3)
+                
+            except Exception as e:
+                print(f"[TTS Error] {e}")
             
-            result = book_appointment(
-                customer_name=name,
-                phone=phone,
-                date_str=date,
-                time_str=time_slot,
-                service=service,
-                price=int(price_str),
-                duration=int(duration_str)
-            )
+            finally:
+                # Step 5: Resume listening
+                if self.audio_stream:
+                    self.audio_stream.start()
+                    self.log("[Microphone] UNMUTED - Ready to listen\n" + "-"*30)
+                self.is_speaking = False
+    
+    def respond(self, user_input, speculation=None):
+        """Get LLM response and process any tool commands (speculation: early reply to reuse)"""
+        reply, enhanced_prompt, dialog_state = self.prepare_turn(user_input)
+        if reply:
+            if speculation:
+                speculation.cancel()
+            return reply
+        
+        trace = self.trace
+        
+        # Filler phrases are spoken on their own thread so generation keeps going
+        def say_filler(phrase):
+            trace.set(filler=True)
+            threading.Thread(target=self.speak, args=(phrase,), daemon=True).start()
+        
+        try:
+            if speculation:
+                full_response, model = speculation.future.result()
+                trace.adopt("spec_")  # The early request's timings are this turn's LLM timings
+                trace.set(speculation="hit")
+                self.log(f"[Speculate] Using reply started early by {model}")
+            else:
+                # Shared LLM worker - sessions take turns fairly; the router picks the model
+                full_response, model = self.scheduler.run(
+                    "llm", self.session_id, model_router.generate,
+                    user_input, dialog_state, traced_stream(trace, iter_ollama), enhanced_prompt,
+                    SYSTEM_PROMPT, say_filler
+                )
+                self.log(f"[Router] Answered by {model}")
+            trace.set(answered_by=model)
+        except requests.exceptions.RequestException as e:
+            print(f"[Error] Ollama API: {e}")
+            trace.set(error="ollama")
+            return "Sorry, the assistant is offline."
+        except TimeoutError as e:
+            print(f"[Timeout] {e}")
+            trace.set(error="timeout")
+            return "Sorry, that took me too long. Could you say that again?"
+        
+        return self.finish_turn_traced(trace, user_input, full_response, dialog_state)
+    
+    def finish_turn_traced(self, trace, user_input, full_response, dialog_state):
+        """finish_turn, timing tool execution as a 'tool' span"""
+        if "TOOL:" not in full_response:
+            return self.finish_turn(user_input, full_response, dialog_state)
+        with trace.span("tool"):
+            return self.finish_turn(user_input, full_response, dialog_state)
+    
+    def prepare_turn(self, user_input):
+        """
+        Record the caller's words and answer locally when possible.
+        Returns (reply, None, None) or (None, llm_prompt, dialog_state).
+        """
+        self.log(f"User said: {user_input}")
+        
+        # Add user message to history
+        self.memory.add("user", user_input)
+        
+        # Booking form step (name, phone, service, date, time)? Answer locally
+        dialog_reply = self.dialog.handle(user_input)
+        self.memory.pin_facts(self.dialog.facts())
+        self.memory.unpin(self.dialog.take_rejected())
+        self.caller_details |= self.dialog.personal_values()
+        if dialog_reply:
+            self.log(f"[Dialog] Form step handled locally ({self.dialog.state()})")
+            if self.trace:
+                self.trace.set(answered_by="dialog")
+            self.memory.add("assistant", dialog_reply)
+            return dialog_reply, None, None
+        
+        # Repeated question? Answer from cache without calling Ollama
+        dialog_state = self.get_dialog_state()
+        cached_response = response_cache.get(user_input, dialog_state)
+        if cached_response:
+            self.log("[Cache] Hit - skipping LLM call")
+            if self.trace:
+                self.trace.set(answered_by="cache")
+            self.memory.add("assistant", cached_response)
+            return cached_response, None, None
+        
+        # Build conversation context (pinned facts + summary + recent turns, within token budget)
+        return None, build_prompt(self.memory.render()), dialog_state
+    
+    def launch_speculation(self, text, cancel_event):
+        """Start the LLM on a stable partial transcript - no history or form changes"""
+        if self.dialog.wants_turn(text):
+            return None  # Booking form will answer locally
+        dialog_state = self.get_dialog_state()
+        if response_cache.peek(text, dialog_state):
+            return None  # Cache will answer
+        self.log(f"[Speculate] Starting LLM early on '{text}'")
+        prompt = build_prompt(self.memory.preview("user", text))
+        stream_fn = traced_stream(self.trace, iter_ollama, prefix="spec_")  # Adopted only on a hit
+        return self.scheduler.submit("llm", self.session_id, model_router.generate,
+                                     text, dialog_state, stream_fn, prompt, SYSTEM_PROMPT, None, cancel_event)
+    
+    def speculate(self, audio_buffer):
+        """Partial STT of the utterance so far; offer stable transcripts to the speculator"""
+        if self.stt_stream is not None:
+            # Streaming backend: partials come from the chunks already fed
+            stable = self.partials.update(self.stt_stream.partial) if self.stt_stream.partial else None
+            if stable:
+                self.speculator.offer(stable)
+            return
+        
+        if self.partial_future is not None:
+            if not self.partial_future.done():
+                return
+            try:
+                partial = self.partial_future.result()
+            except Exception:
+                partial = ""
+            self.partial_future = None
+            stable = self.partials.update(partial) if partial else None
+            if stable:
+                self.speculator.offer(stable)
+        
+        if len(audio_buffer) % PARTIAL_EVERY_CHUNKS == 0:
+            self.partial_future = self.scheduler.submit(
+                "stt", self.session_id, self.models.transcribe, b''.join(audio_buffer))
+    
+    def finish_turn(self, user_input, full_response, dialog_state):
+        """Run tool commands in the model's reply, clean it up, remember and cache it"""
+        # Process any tool commands
+        response = full_response.strip()
+        
+        # Check for tool commands
+        if "TOOL:CHECK_SLOTS:" in response:
+            model_date = response.split("TOOL:CHECK_SLOTS:")[1].split()[0].strip()
+            # Trust the caller's own words over the date the model computed
+            caller_date, _ = resolve_from_transcripts(self.caller_transcripts())
+            date_str = caller_date or resolve_date(model_date) or model_date
+            print(f"[Tool] Checking availability for {date_str}...")
+            result = check_availability(date_str)
             
-            if result["success"]:
-                print(f"[Tool] ✓ Appointment #{result['appointment']['id']} created successfully!")
-                return f"Perfect! Your appointment is confirmed for {date} at {time_slot}. See you then, {name}!"
+            if "error" in result:
+                return result["error"]
             else:
-                return f"Sorry, that time isn't available. {result.get('error', '')}"
-        except Exception as e:
-            print(f"[Tool Error] Booking failed: {e}")
-            import traceback
-            traceback.print_exc()
-            return "I had trouble with that booking. Can you confirm your name, phone number, date, time, and service?"
+                slots_count = result.get("total", 0)
+                if slots_count > 0:
+                    # Show first 5 slots
+                    slots_preview = ", ".join(result["available_slots"][:5])
+                    return f"We have {slots_count} openings on that day. Available times include {slots_preview}. Would you like to book one?"
+                else:
+                    return "That day is fully booked. Would you like to try a different day?"
+        
+        elif "TOOL:BOOK:" in response:
+            # Parse booking details: name|phone|date|time|service (price/duration come from the KB)
+            try:
+                # Extract only the TOOL:BOOK line, ignore any text after it
+                tool_line = extract_book_line(response)
+                booking = parse_book_tool(tool_line, kb_manager.current.services, ASSISTANT_NAME)
+                
+                # 🚨 CHECKSUM VALIDATION: name, phone and a known service
+                if "error" in booking:
+                    print(f"[Tool Error] ❌ CHECKSUM FAILED: {booking['reason']}")
+                    return booking["error"]
+                
+                name = booking["name"]
+                service = booking["service"]
+                
+                # Date/time the caller actually said wins over the model's fields
+                caller_date, caller_time = resolve_from_transcripts(self.caller_transcripts())
+                date = caller_date or resolve_date(booking["date"]) or booking["date"]
+                model_minutes = resolve_time(booking["time"], loose=True)
+                time_slot = caller_time or (format_time(model_minutes) if model_minutes is not None else booking["time"])
+                
+                print(f"[Tool] ✓ CHECKSUM PASSED - Name: {name}, Phone: {booking['phone']}")
+                print(f"[Tool] Booking appointment for {name}...")
+                print(f"[Tool] Details: {booking['phone']}, {date}, {time_slot}, {service['name']}, ${service['price']}, {service['duration']}min")
+                
+                result = book_appointment(
+                    customer_name=name,
+                    phone=booking["phone"],
+                    date_str=date,
+                    time_str=time_slot,
+                    service=service["name"],
+                    price=service["price"],
+                    duration=service["duration"]
+                )
+                
+                if result["success"]:
+                    print(f"[Tool] ✓ Appointment #{result['appointment']['id']} created successfully!")
+                    self.dialog.reset()
+                    return f"Perfect! Your {service['name']} is confirmed for {date} at {time_slot}. See you then, {name}!"
+                else:
+                    return f"Sorry, that time isn't available. {result.get('error', '')}"
+            except Exception as e:
+                print(f"[Tool Error] Booking failed: {e}")
+                import traceback
+                traceback.print_exc()
+                return "I had trouble with that booking. Can you confirm your name, phone number, date, time, and service?"
+        
+        elif "TOOL:CALL_MANAGER" in response:
+            print("[Tool] Calling manager...")
+            try:
+                self.alert_manager()
+            except Exception as e:
+                print(f"[Tool Error] Manager alert failed: {e}")
+            return "One moment please, I'm getting the manager for you."
+        
+        # Clean up regular response: Markdown, leftover tool commands, prompt echoes, length
+        response = sanitize(response)
+        
+        # Add assistant response to history
+        self.memory.add("assistant", response.strip())
+        
+        # Remember generic answers for the next caller (never personal details)
+        personal_values = self.caller_details | self.dialog.personal_values() | extract_personal_values(
+            self.memory.user_texts()
+        )
+        response_cache.put(user_input, response.strip(), dialog_state, personal_values)
+        
+        return response.strip()
     
-    elif "TOOL:CALL_MANAGER" in response:
-        print("[Tool] Calling manager...")
+    def alert_manager(self):
+        """Show the manager popup; say we'll call back when it times out"""
         # Trigger manager alert (runs in main thread to avoid tkinter issues)
+        from manager_alert import trigger_manager_alert  # Lazy: tkinter is only needed for this popup
+        trigger_manager_alert(lambda: self.speak("The manager will call you back shortly."))
+    
+    def handle_utterance(self, audio_buffer):
+        """Transcribe one endpointed utterance and answer it. Returns False on 'exit'."""
+        self.log(f"[⏹️  Stopped] Processing speech ({len(audio_buffer) * 0.06:.1f}s)...")
+        
+        trace = self.trace
+        
+        # Transcribe on the shared STT worker (a streaming backend only finishes the tail)
+        combined_audio = b''.join(audio_buffer)
+        stream, self.stt_stream = self.stt_stream, None
+        user_spoken_text = self.scheduler.run("stt", self.session_id, self.transcribe_traced,
+                                              trace, combined_audio, stream)
+        
+        # Keep the early LLM reply only if it was for exactly what the caller said
+        speculation = self.speculator.resolve(user_spoken_text) if SPECULATIVE else None
+        self.partial_future = None
+        
+        if not user_spoken_text or len(user_spoken_text) <= 4 or user_spoken_text.lower() in IGNORE_WORDS:
+            if user_spoken_text:
+                self.log(f"[Ignored] '{user_spoken_text}' (too short or noise)")
+            if speculation:
+                speculation.cancel()
+            trace.finish("ignored")
+            return True
+        
+        self.log(f"[Detected] '{user_spoken_text}'")
+        
+        if user_spoken_text.lower() == 'exit':
+            self.log("[System] Exit command received. Shutting down...")
+            if speculation:
+                speculation.cancel()
+            trace.finish("exit")
+            return False
+        
+        # Pick up knowledge_base.json edits between turns
+        kb_manager.swap_if_pending()
+        
+        self.log("[System] Sending request to Ollama...")
+        assistant_response = self.respond(user_spoken_text, speculation)
+        self.log(f"[Response] '{assistant_response}'")
+        
+        if assistant_response:
+            self.speak(assistant_response)
+        trace.finish()
+        return True
+    
+    def run(self):
+        """Open this line's microphone, greet the caller and run the VAD endpointing loop"""
         try:
-            trigger_manager_alert(lambda: speak("The manager will call you back shortly."))
-        except Exception as e:
-            print(f"[Tool Error] Manager alert failed: {e}")
-        return "One moment please, I'm getting the manager for you."
+            # Native device rate/channels, resampled to 16 kHz mono in the callback
+            self.audio_input = AudioInput(self.callback, self.input_device)
+            with self.audio_input.open() as stream:
+                
+                self.audio_stream = stream
+                self.log(f"[System] Audio stream started successfully "
+                         f"({self.audio_input.samplerate} Hz x{self.audio_input.channels}).")
+                self.converse()
+        
+        except sd.PortAudioError as e:
+            print(f"[Error] Audio device error on {self.session_id}: {e}")
+            list_audio_devices()
+        finally:
+            self.audio_stream = None
+            self.speculator.cancel()
+            self.log_speculation_stats()
+            self.log_queue_stats()
+            if self.audio_input:
+                self.log(f"[Audio] Input: {self.audio_input.stats()}")
     
-    # Clean up regular response
-    response = response.replace('**', '').replace('```', '').replace('###', '')
+    def converse(self):
+        """Greet the caller, then endpoint the audio arriving in self.Q into turns (None ends it)"""
+        # Silero VAD state
+        audio_buffer = []
+        is_recording = False
+        silence_chunks = 0
+        
+        # Introduction greeting
+        self.start_new_call()
+        greeting = greeting_text()
+        self.log(f"[Greeting] {greeting}")
+        wait_for_greeting()
+        self.speak(greeting)
+        startup.mark("greeting played")
+        
+        self.log("[Ready] 🎤 Listening for speech...\n")
+        
+        while True:
+            data = self.Q.get()
+            if data is None:
+                break  # End of input (replay)
+            
+            if self.is_speaking:
+                continue
+            
+            # Use Silero VAD to detect speech
+            has_speech = self.models.detect_speech(data, self.session_id)
+            
+            if has_speech:
+                # Speech detected
+                if not is_recording:
+                    self.log("[🔴 Recording] Speech detected...")
+                    is_recording = True
+                    audio_buffer = []
+                    self.partials.reset()
+                    self.start_trace()
+                    self.start_stream()
+                
+                silence_chunks = 0  # Reset silence counter
+                audio_buffer.append(data)
+                self.feed_stream(data)
+                if SPECULATIVE:
+                    self.speculate(audio_buffer)
+                
+            elif is_recording:
+                # No speech detected
+                silence_chunks += 1
+                audio_buffer.append(data)  # Keep buffering during silence
+                self.feed_stream(data)
+                if SPECULATIVE and silence_chunks < MAX_SILENCE_CHUNKS:
+                    self.speculate(audio_buffer)
+                
+                # Check if silence threshold reached
+                if silence_chunks >= MAX_SILENCE_CHUNKS:
+                    utterance = audio_buffer
+                    self.trace.mark("speech_end")
+                    
+                    # Reset state
+                    is_recording = False
+                    silence_chunks = 0
+                    audio_buffer = []
+                    
+                    # Check minimum duration (too short = ignore)
+                    if len(utterance) >= MIN_RECORDING_CHUNKS:
+                        self.trace.set(queue_depth=self.Q.qsize())
+                        if not self.handle_utterance(utterance):
+                            break
+                        stale = self.Q.turn_boundary()
+                        if stale:
+                            self.log(f"[Audio] Dropped {stale} block(s) queued while answering")
+                        self.log("[Ready] 🎤 Listening for speech...\n")
+                    else:
+                        self.stt_stream = None
+                        self.trace.finish("too_short")
+
+
+# --- Async Call Session (ASYNC_PIPELINE=1) ---
+class AsyncCallSession(CallSession):
+    """
+    The same call logic on the asyncio core: VAD/STT/TTS run in executors, the
+    LLM reply is streamed without threads, every stage has a deadline and a
+    new utterance can cancel the turn still being answered (BARGE_IN=1).
+    """
     
-    # Remove any remaining tool commands from response
-    for tool_marker in ["TOOL:CHECK_SLOTS:", "TOOL:BOOK:", "TOOL:CALL_MANAGER"]:
-        if tool_marker in response:
-            response = response.split(tool_marker)[0].strip()
+    def __init__(self, session_id, models, executors, timer, llm_slot, input_device=None, output_device=None):
+        super().__init__(session_id, models, None, input_device, output_device)
+        self.executors = executors
+        self.timer = timer
+        self.llm_slot = llm_slot  # asyncio.Semaphore shared by every session (FIFO = fair)
+        self.turns = TurnControl()
+        self.bridge = None
+        self.loop = None
     
-    # Stop at common markers
-    stop_markers = ['---', 'Example:', 'Transcript:', 'Caller:', 'NOTE:', 'RULES:', 'TOOL:']
-    for marker in stop_markers:
-        if marker in response:
-            response = response.split(marker)[0].strip()
+    def alert_manager(self):
+        """Tkinter popup on the single UI worker; the timeout reply is spoken on the event loop"""
+        from manager_alert import trigger_manager_alert
+        
+        def on_timeout():
+            asyncio.run_coroutine_threadsafe(self.speak_async("The manager will call you back shortly."), self.loop)
+        self.executors["ui"].submit(trigger_manager_alert, on_timeout)
     
-    # Limit to first 2-3 sentences max
-    sentences = response.split('. ')
-    if len(sentences) > 2:
-        response = '. '.join(sentences[:2]) + '.'
+    def _synthesize_and_play(self, text, stop_event):
+        wav_path = cached_speech_path(text)
+        if not os.path.exists(wav_path):
+            wav_path = os.path.join(tempfile.gettempdir(), f"tts_{self.session_id}.wav")
+            synthesize_to_file(text, wav_path)
+        play_wav(wav_path, self.output_device, stop_event, on_start=self.mark_first_audio)
     
-    # Hard limit on length
-    if len(response) > 300:
-        response = response[:300].rsplit(' ', 1)[0] + '.'
+    def _unmute(self):
+        self.bridge.flush()
+        self.bridge.muted = False
+        self.log("[Microphone] UNMUTED - Ready to listen\n" + "-"*30)
     
-    # Add assistant response to history
-    conversation_history.append({"role": "assistant", "content": response.strip()})
+    async def speak_async(self, text):
+        """TTS within the 'tts' budget; cancelling the turn stops playback"""
+        print(f"\n{ASSISTANT_NAME} speaking ({self.session_id}): {text}")
+        if not text:
+            print("[Warning] Empty text, skipping TTS")
+            return
+        
+        if not BARGE_IN:
+            self.bridge.muted = True
+            self.bridge.flush()
+            self.log("[Microphone] MUTED during TTS")
+        stop_event = threading.Event()  # Per utterance - a filler ending must not stop the reply
+        self.is_speaking = True
+        if self.trace:
+            self.trace.mark("tts_start")
+        try:
+            await self.timer.run("tts", offload(self.executors["tts"], self._synthesize_and_play, text, stop_event))
+            print("[TTS] Finished speaking")
+        except StageTimeout as e:
+            print(f"[TTS Error] {e}")
+        finally:
+            stop_event.set()  # Ends playback still running in the executor
+            self.is_speaking = False
+            if not BARGE_IN:
+                self.loop.call_later(0.3, self._unmute)  # Let the audio physically clear
     
-    return response.strip()
-
-# --- STT Setup (Whisper with Silero VAD) ---
-SAMPLERATE = 16000
-Q = queue.Queue()
-
-# Initialize Silero VAD model
-print("[System] Loading Silero VAD model...")
-silero_model = load_silero_vad()
-print("[System] Silero VAD loaded!")
-
-def detect_speech_silero(audio_data):
-    """Use Silero VAD to detect if audio contains speech"""
-    # Convert bytes to torch tensor
-    audio_np = np.frombuffer(audio_data, dtype=np.int16).astype(np.float32) / 32768.0
-    audio_tensor = torch.from_numpy(audio_np)
+    async def respond_async(self, user_input, trace=None):
+        """respond() with the LLM streamed on the event loop under its deadlines"""
+        reply, enhanced_prompt, dialog_state = self.prepare_turn(user_input)
+        if reply:
+            return reply
+        
+        trace = trace or self.trace  # A queued turn may run while the next one is being recorded
+        
+        def open_stream(model):
+            return traced_stream_async(trace, stream_ollama_async(enhanced_prompt, SYSTEM_PROMPT, model, OLLAMA_API_URL,
+                                                                  resources.ollama_options() or None))
+        
+        async def say_filler(phrase):
+            trace.set(filler=True)
+            await self.speak_async(phrase)
+        
+        try:
+            async with self.llm_slot:
+                start = time.perf_counter()
+                with resources.stage("llm"):
+                    full_response, model = await model_router.generate_async(
+                        user_input, dialog_state, open_stream, on_filler=say_filler)
+                self.timer.record("llm", time.perf_counter() - start)
+            self.log(f"[Router] Answered by {model}")
+            trace.set(answered_by=model)
+        except OllamaError as e:
+            print(f"[Error] Ollama API: {e}")
+            trace.set(error="ollama")
+            return "Sorry, the assistant is offline."
+        except asyncio.TimeoutError as e:
+            print(f"[Timeout] {e}")
+            trace.set(error="timeout")
+            return "Sorry, that took me too long. Could you say that again?"
+        
+        return self.finish_turn_traced(trace, user_input, full_response, dialog_state)
     
-    # Get speech timestamps
-    speech_timestamps = get_speech_timestamps(audio_tensor, silero_model, sampling_rate=SAMPLERATE)
+    async def take_turn(self, audio_buffer, trace, stream=None):
+        """STT -> respond -> TTS for one utterance (cancelled on barge-in)"""
+        outcome = "answered"
+        try:
+            outcome = await self._take_turn(audio_buffer, trace, stream)
+        except asyncio.CancelledError:
+            outcome = "interrupted"
+            raise
+        finally:
+            trace.finish(outcome)
     
-    return len(speech_timestamps) > 0
-
-def transcribe_audio(audio_data):
-    """Transcribe audio using Whisper"""
-    global whisper_model
+    async def _take_turn(self, audio_buffer, trace, stream=None):
+        """Returns the trace outcome"""
+        self.log(f"[⏹️  Stopped] Processing speech ({len(audio_buffer) * 0.06:.1f}s)...")
+        try:
+            user_spoken_text = await self.timer.run(
+                "stt", offload(self.executors["stt"], self.transcribe_traced, trace, b''.join(audio_buffer), stream))
+        except StageTimeout as e:
+            print(f"[Whisper Error] {e}")
+            return "stt_timeout"
+        
+        if not user_spoken_text or len(user_spoken_text) <= 4 or user_spoken_text.lower() in IGNORE_WORDS:
+            if user_spoken_text:
+                self.log(f"[Ignored] '{user_spoken_text}' (too short or noise)")
+            return "ignored"
+        
+        self.log(f"[Detected] '{user_spoken_text}'")
+        
+        if user_spoken_text.lower() == 'exit':
+            self.log("[System] Exit command received. Shutting down...")
+            self.bridge.queue.put_nowait(None)  # Ends the listen loop
+            return "exit"
+        
+        # Pick up knowledge_base.json edits between turns
+        kb_manager.swap_if_pending()
+        
+        assistant_response = await self.respond_async(user_spoken_text, trace)
+        self.log(f"[Response] '{assistant_response}'")
+        
+        if assistant_response:
+            await self.speak_async(assistant_response)
+        self.log("[Ready] 🎤 Listening for speech...\n")
+        return "answered"
     
-    try:
-        # Convert to float32
-        audio_np = np.frombuffer(audio_data, dtype=np.int16).astype(np.float32) / 32768.0
-        
-        # Transcribe with Whisper
-        segments, info = whisper_model.transcribe(
-            audio_np,
-            language="en",
-            vad_filter=True,
-            beam_size=5
-        )
+    async def run_async(self):
+        """Open this line's microphone, greet the caller and endpoint speech into turns"""
+        self.loop = asyncio.get_running_loop()
+        self.bridge = AudioBridge(self.loop)
         
-        text = " ".join([segment.text for segment in segments]).strip()
-        return text
+        # Silero VAD state
+        audio_buffer = []
+        is_recording = False
+        silence_chunks = 0
         
-    except Exception as e:
-        print(f"[Whisper Error] {e}")
-        return ""
+        try:
+            self.audio_input = AudioInput(self.bridge.callback, self.input_device)
+            with self.audio_input.open():
+                self.log(f"[System] Audio stream started successfully "
+                         f"({self.audio_input.samplerate} Hz x{self.audio_input.channels}).")
+                
+                # Introduction greeting
+                self.start_new_call()
+                greeting = greeting_text()
+                self.log(f"[Greeting] {greeting}")
+                await offload(self.executors["tts"], wait_for_greeting)
+                await self.speak_async(greeting)
+                startup.mark("greeting played")
+                
+                self.log("[Ready] 🎤 Listening for speech...\n")
+                
+                while True:
+                    data = await self.bridge.queue.get()
+                    if data is None:
+                        break
+                    
+                    try:
+                        has_speech = await self.timer.run(
+                            "vad", offload(self.executors["vad"], self.models.detect_speech, data, self.session_id))
+                    except StageTimeout:
+                        continue
+                    
+                    if has_speech:
+                        if not is_recording:
+                            if BARGE_IN and self.turns.cancel():
+                                self.log("[Barge-in] Caller interrupted - dropping current reply")
+                            self.log("[🔴 Recording] Speech detected...")
+                            is_recording = True
+                            audio_buffer = []
+                            self.start_trace()
+                            self.start_stream()
+                        
+                        silence_chunks = 0
+                        audio_buffer.append(data)
+                        self.feed_stream(data, self.executors["stt"].submit)
+                    
+                    elif is_recording:
+                        silence_chunks += 1
+                        audio_buffer.append(data)
+                        self.feed_stream(data, self.executors["stt"].submit)
+                        
+                        if silence_chunks >= MAX_SILENCE_CHUNKS:
+                            utterance = audio_buffer
+                            stream, self.stt_stream = self.stt_stream, None
+                            is_recording = False
+                            silence_chunks = 0
+                            audio_buffer = []
+                            self.trace.mark("speech_end")
+                            
+                            if len(utterance) >= MIN_RECORDING_CHUNKS:
+                                if BARGE_IN:
+                                    self.turns.start(self.take_turn(utterance, self.trace, stream))
+                                else:
+                                    self.turns.queue(self.take_turn(utterance, self.trace, stream))
+                            else:
+                                self.trace.finish("too_short")
+                
+                self.turns.cancel()
+        
+        except sd.PortAudioError as e:
+            print(f"[Error] Audio device error on {self.session_id}: {e}")
+            list_audio_devices()
+
+async def serve_async(models, phone_lines):
+    """Run every line's AsyncCallSession on one event loop"""
+    executors = make_executors(initializer=resources.thread_initializer)  # Pins workers with CPU_AFFINITY=1
+    timer = StageTimer()
+    llm_slot = asyncio.Semaphore(1)  # Ollama answers one prompt at a time
+    sessions = [
+        AsyncCallSession(f"line{i + 1}", models, executors, timer, llm_slot, input_device, output_device)
+        for i, (input_device, output_device) in enumerate(phone_lines)
+    ]
+    print(f"[System] Serving {len(sessions)} line(s) on the async pipeline. Budgets: {timer.deadlines}")
+    try:
+        await asyncio.gather(*(session.run_async() for session in sessions))
+    finally:
+        print(f"[System] Stage latency: {timer.stats()}")
+        print(f"[System] Model routing: {model_router.stats()}")
+        print(f"[System] CPU contention: {resources.stats()}")
+        print(f"[System] Turn latency: {tracer.summary()}")
+        profiler.stop()
+        if MODEL_SERVER:
+            models.close()
+        for executor in executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
 
-def callback(indata, frames, time, status):
-    """Audio callback - queues audio for Whisper processing"""
-    if status:
-        print(status, file=sys.stderr)
-    
-    # Critical: Do not capture audio during TTS playback
-    if not is_speaking:
-        Q.put(bytes(indata))
 
 # --- Helper Functions ---
 def list_audio_devices():
@@ -529,114 +1240,79 @@ def list_audio_devices():
     devices = sd.query_devices()
     for i, dev in enumerate(devices):
         if dev['max_input_channels'] > 0:
-            print(f"  [{i}] {dev['name']}")
+            print(f"  [{i}] {dev['name']} ({dev['default_samplerate']:.0f} Hz, {dev['max_input_channels']} ch)")
     print()
 
+def parse_phone_lines(spec):
+    """'1:3,2:4' -> [(1, 3), (2, 4)]; an empty side means the default device"""
+    lines = []
+    for entry in spec.split(","):
+        input_dev, _, output_dev = entry.strip().partition(":")
+        lines.append((int(input_dev) if input_dev else None, int(output_dev) if output_dev else None))
+    return lines
+
 # --- MAIN EXECUTION LOGIC ---
 if __name__ == "__main__":
     list_audio_devices()
 
     print(f"[System] Starting assistant using {MODEL_NAME} via API.")
+    print(f"[System] CPU budget: preset {resources.name}, threads {resources.threads}")
+    kb_manager.start_watching()
+    tracer.serve_metrics()
+    profiler.install()
     
-    print(f"[System] Loading Whisper {WHISPER_MODEL_SIZE} model...")
+    phone_lines = parse_phone_lines(os.environ["PHONE_LINES"]) if os.environ.get("PHONE_LINES") else PHONE_LINES
+    profiler.per_call = len(phone_lines) == 1  # Overlapping calls on several lines share one profile
     
-    # Initialize Whisper model
-    whisper_model = WhisperModel(WHISPER_MODEL_SIZE, device="cpu", compute_type="int8")
-    print("[System] Whisper model loaded successfully!")
+    # Models are loaded once and shared by every line (or by every process via the model server).
+    # Everything heavy loads in parallel; the greeting plays while STT is still warming.
+    models = RemoteModels(parse_address(MODEL_SERVER)) if MODEL_SERVER else SharedModels()
+    if MODEL_SERVER:
+        startup.add("model_server", models.load)
+    else:
+        startup.add("vad", models.load_vad)
+        startup.add("whisper", models.load_whisper)
+    startup.add("tts", warm_tts)
+    startup.add("greeting", lambda: render_cached_speech(greeting_text()), depends=["tts"], required=False)
+    startup.add("manager_alert", lambda: lazy_import("manager_alert"), required=False)
+    startup.start()
+    startup.report_when_ready()
+    startup.exit_on_failure()
     
-    print("[System] Listening... Speak clearly into your microphone.")
-    print("[Info] Using Silero VAD: Records until you stop speaking")
+    if ASYNC_PIPELINE:
+        try:
+            asyncio.run(serve_async(models, phone_lines))
+        except KeyboardInterrupt:
+            print("\n[System] Shutting down...")
+        sys.exit(0)
     
-    # Silero VAD state
-    audio_buffer = []
-    is_recording = False
-    silence_chunks = 0
-    MAX_SILENCE_CHUNKS = 8  # ~0.5 seconds of silence (8 * 0.06s per chunk)
-    MIN_RECORDING_CHUNKS = 8  # Minimum ~0.5 seconds of speech
-
-    try:
-        with sd.RawInputStream(samplerate=SAMPLERATE, blocksize=8000, 
-                               dtype='int16', channels=1, callback=callback) as stream:
-            
-            audio_stream = stream
-            print("[System] Audio stream started successfully.")
-            
-            # Introduction greeting
-            greeting = f"Hello! I'm {ASSISTANT_NAME}, your AI receptionist at {BUSINESS_NAME}. How can I help you today?"
-            print(f"[Greeting] {greeting}")
-            speak(greeting)
-            
-            print("[Ready] 🎤 Listening for speech...\n")
-            
-            while True:
-                data = Q.get()
-                
-                if is_speaking:
-                    continue
-                
-                # Use Silero VAD to detect speech
-                has_speech = detect_speech_silero(data)
-                
-                if has_speech:
-                    # Speech detected
-                    if not is_recording:
-                        print("[🔴 Recording] Speech detected...")
-                        is_recording = True
-                        audio_buffer = []
-                    
-                    silence_chunks = 0  # Reset silence counter
-                    audio_buffer.append(data)
-                    
-                else:
-                    # No speech detected
-                    if is_recording:
-                        silence_chunks += 1
-                        audio_buffer.append(data)  # Keep buffering during silence
-                        
-                        # Check if silence threshold reached
-                        if silence_chunks >= MAX_SILENCE_CHUNKS:
-                            # Check minimum duration
-                            if len(audio_buffer) >= MIN_RECORDING_CHUNKS:
-                                print(f"[⏹️  Stopped] Processing speech ({len(audio_buffer) * 0.06:.1f}s)...")
-                                
-                                # Transcribe
-                                combined_audio = b''.join(audio_buffer)
-                                user_spoken_text = transcribe_audio(combined_audio)
-                                
-                                # Reset state
-                                is_recording = False
-                                silence_chunks = 0
-                                audio_buffer = []
-                                
-                                # Process transcription
-                                ignore_words = ['the', 'a', 'an', 'uh', 'um', 'huh', 'oh', 'ah', 'er', 'mm']
-                                
-                                if user_spoken_text and len(user_spoken_text) > 4 and user_spoken_text.lower() not in ignore_words:
-                                    print(f"[Detected] '{user_spoken_text}'")
-                                    
-                                    if user_spoken_text.lower() == 'exit':
-                                        print("[System] Exit command received. Shutting down...")
-                                        break
-                                    
-                                    print("[System] Sending request to Ollama...")
-                                    assistant_response = get_ollama_response_stream(user_spoken_text)
-                                    print(f"[Response] '{assistant_response}'")
-
-                                    if assistant_response:
-                                        speak(assistant_response)
-                                    
-                                    print("\n[Ready] 🎤 Listening for speech...\n")
-                                else:
-                                    if user_spoken_text:
-                                        print(f"[Ignored] '{user_spoken_text}' (too short or noise)")
-                                    print("[Ready] 🎤 Listening for speech...\n")
-                            else:
-                                # Too short, ignore
-                                is_recording = False
-                                silence_chunks = 0
-                                audio_buffer = []
-                            
-    except sd.PortAudioError as e:
-        print(f"[Error] Audio device error: {e}")
-        list_audio_devices()
-        sys.exit(1)
+    scheduler = FairScheduler(initializer=resources.thread_initializer)  # Pins workers with CPU_AFFINITY=1
+    
+    sessions = [
+        CallSession(f"line{i + 1}", models, scheduler, input_device, output_device)
+        for i, (input_device, output_device) in enumerate(phone_lines)
+    ]
+    
+    print(f"[System] Serving {len(sessions)} line(s). Speak clearly into your microphone.")
+    print("[Info] Using voice activity detection: Records until you stop speaking")
+    
+    if len(sessions) == 1:
+        sessions[0].run()
+    else:
+        threads = [threading.Thread(target=session.run, name=session.session_id, daemon=True) for session in sessions]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            print("\n[System] Shutting down...")
+    
+    print(f"[System] Worker stats: {scheduler.stats()}")
+    print(f"[System] Model routing: {model_router.stats()}")
+    print(f"[System] CPU contention: {resources.stats()}")
+    print(f"[System] Turn latency: {tracer.summary()}")
+    profiler.stop()
+    scheduler.shutdown()
+    if MODEL_SERVER:
+        models.close()
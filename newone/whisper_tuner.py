@@ -0,0 +1,254 @@
+"""
+Whisper Auto-Tuner for Salon Voice Assistant
+Benchmarks Whisper model size, compute type, beam size and vad_filter on sample
+salon utterances using this PC's CPU, measures real-time factor (RTF) and word
+error rate (WER), and writes whisper_profile.json - the fastest configuration
+that meets the accuracy target. voice_assistant.py and model_server.py load it
+at startup (defaults below are used until the shop has run a calibration).
+
+Run:  python whisper_tuner.py [--target-wer 0.10] [--sizes tiny,base,small]
+Sample audio lives in calibration_samples/ as name.wav + name.txt pairs; any
+bundled sentence without a recording is synthesized with pyttsx3 first. Add
+real recordings of your own callers there for a more honest calibration.
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+from date_resolver import words_to_numbers
+
+WHISPER_PROFILE_PATH = os.environ.get("WHISPER_PROFILE", "whisper_profile.json")
+SAMPLES_DIR = "calibration_samples"
+SAMPLERATE = 16000
+TARGET_WER = 0.10
+
+# Current behaviour until a calibration says otherwise
+DEFAULT_PROFILE = {
+    "model_size": "base",
+    "compute_type": "int8",
+    "beam_size": 5,
+    "vad_filter": True,
+}
+
+SEARCH_SPACE = {
+    "model_size": ["tiny", "base", "small"],
+    "compute_type": ["int8", "float32"],
+    "beam_size": [1, 2, 5],
+    "vad_filter": [False, True],  # Audio is already gated by our VAD - the second pass may be wasted
+}
+
+# Typical caller turns (names, times, numbers and services are where errors hurt)
+SAMPLE_UTTERANCES = [
+    "Hi, I'd like to book a haircut for tomorrow at three.",
+    "What time do you close on Saturday?",
+    "Do you have any openings on Friday afternoon?",
+    "My name is Sarah Johnson and my number is 555 123 4567.",
+    "How much is a beard trim?",
+    "Can I cancel my appointment for Monday?",
+    "Is Kevin available next Tuesday at ten in the morning?",
+    "Yes, that works for me.",
+    "I'd like to speak to the manager please.",
+    "Do you do hair coloring and how long does it take?",
+]
+SYNTH_RATES = [150, 185]  # Alternate speaking rates so samples aren't all one speed
+
+
+def load_whisper_profile(path=WHISPER_PROFILE_PATH):
+    """Calibrated settings merged over DEFAULT_PROFILE ('calibrated_at' is set when one was found)"""
+    profile = dict(DEFAULT_PROFILE)
+    if not os.path.exists(path):
+        return profile
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"[Whisper] Ignoring unreadable profile {path}: {e}")
+        return profile
+    profile.update({key: saved["config"][key] for key in DEFAULT_PROFILE if key in saved.get("config", {})})
+    profile["calibrated_at"] = saved.get("calibrated_at")
+    return profile
+
+
+# --- Word error rate ---
+def normalize_words(text):
+    """
+    Lowercase words without punctuation, spoken numbers as digits and one token per
+    digit - "three"/"3" and "five five five"/"555" are the same words to a caller
+    """
+    words = []
+    for word in re.sub(r"[^a-z0-9' ]+", " ", words_to_numbers(text)).split():
+        words.extend(word if word.isdigit() else [word])
+    return words
+
+
+def word_errors(reference, hypothesis):
+    """Levenshtein distance over words: substitutions + deletions + insertions"""
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return previous[-1], len(ref)
+
+
+def wer(pairs):
+    """Corpus WER over (reference, hypothesis) pairs"""
+    errors = words = 0
+    for reference, hypothesis in pairs:
+        e, n = word_errors(reference, hypothesis)
+        errors += e
+        words += n
+    return errors / words if words else 0.0
+
+
+# --- Samples ---
+def synthesize_missing(samples_dir=SAMPLES_DIR):
+    """Render bundled sentences that don't have a recording yet"""
+    os.makedirs(samples_dir, exist_ok=True)
+    missing = [(i, text) for i, text in enumerate(SAMPLE_UTTERANCES)
+               if not os.path.exists(os.path.join(samples_dir, f"sample_{i:02d}.wav"))]
+    if not missing:
+        return 0
+    import pyttsx3
+
+    print(f"[Tuner] Synthesizing {len(missing)} sample utterance(s) with pyttsx3...")
+    for i, text in missing:
+        base = os.path.join(samples_dir, f"sample_{i:02d}")
+        engine = pyttsx3.init()
+        engine.setProperty("rate", SYNTH_RATES[i % len(SYNTH_RATES)])
+        engine.save_to_file(text, base + ".wav")
+        engine.runAndWait()
+        engine.stop()
+        del engine
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(text)
+    return len(missing)
+
+
+def load_samples(samples_dir=SAMPLES_DIR):
+    """[(name, 16 kHz float32 audio, reference text)] for every .wav with a .txt transcript"""
+    from faster_whisper import decode_audio  # Resamples whatever rate the recording has
+
+    samples = []
+    for name in sorted(os.listdir(samples_dir)):
+        if not name.lower().endswith(".wav"):
+            continue
+        transcript = os.path.join(samples_dir, name[:-4] + ".txt")
+        if not os.path.exists(transcript):
+            print(f"[Tuner] Skipping {name}: no {os.path.basename(transcript)}")
+            continue
+        with open(transcript, "r", encoding="utf-8") as f:
+            reference = f.read().strip()
+        audio = decode_audio(os.path.join(samples_dir, name), sampling_rate=SAMPLERATE)
+        samples.append((name, audio, reference))
+    return samples
+
+
+# --- Calibration ---
+def run_config(model, samples, beam_size, vad_filter):
+    """Transcribe every sample; returns (RTF, WER, hypotheses)"""
+    audio_seconds = sum(len(audio) for _, audio, _ in samples) / SAMPLERATE
+    pairs = []
+    start = time.perf_counter()
+    for _, audio, reference in samples:
+        segments, _ = model.transcribe(audio, language="en", beam_size=beam_size, vad_filter=vad_filter)
+        pairs.append((reference, " ".join(segment.text for segment in segments).strip()))
+    elapsed = time.perf_counter() - start
+    return elapsed / audio_seconds, wer(pairs), [h for _, h in pairs]
+
+
+def calibrate(samples, space=SEARCH_SPACE, target_wer=TARGET_WER, whisper_kwargs=None):
+    """Try every combination; returns (best result, all results)"""
+    from faster_whisper import WhisperModel
+
+    results = []
+    for size in space["model_size"]:
+        for compute_type in space["compute_type"]:
+            print(f"[Tuner] Loading {size} ({compute_type})...")
+            try:
+                model = WhisperModel(size, device="cpu", compute_type=compute_type, **(whisper_kwargs or {}))
+            except Exception as e:  # e.g. compute type not supported on this CPU
+                print(f"[Tuner] Skipping {size}/{compute_type}: {e}")
+                continue
+            run_config(model, samples[:1], 1, False)  # Warm-up
+            for beam_size in space["beam_size"]:
+                for vad_filter in space["vad_filter"]:
+                    rtf, error_rate, _ = run_config(model, samples, beam_size, vad_filter)
+                    config = {"model_size": size, "compute_type": compute_type,
+                              "beam_size": beam_size, "vad_filter": vad_filter}
+                    results.append({"config": config, "rtf": round(rtf, 4), "wer": round(error_rate, 4)})
+                    print(f"  beam={beam_size} vad_filter={str(vad_filter):<5}  RTF {rtf:.3f}  WER {error_rate:.1%}")
+            del model
+
+    if not results:
+        return None, results
+    passing = [r for r in results if r["wer"] <= target_wer]
+    best = min(passing, key=lambda r: r["rtf"]) if passing else min(results, key=lambda r: (r["wer"], r["rtf"]))
+    return dict(best, meets_target=bool(passing)), results
+
+
+def save_profile(best, results, target_wer, sample_count, path=WHISPER_PROFILE_PATH, whisper_kwargs=None):
+    profile = {
+        "config": best["config"],
+        "rtf": best["rtf"],
+        "wer": best["wer"],
+        "target_wer": target_wer,
+        "meets_target": best["meets_target"],
+        "samples": sample_count,
+        "cpu_cores": os.cpu_count(),
+        "whisper_kwargs": whisper_kwargs or {},
+        "calibrated_at": datetime.now().isoformat(timespec="seconds"),
+        "results": sorted(results, key=lambda r: r["rtf"]),
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp_path, path)
+    return profile
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pick the fastest Whisper settings that meet a WER target")
+    parser.add_argument("--target-wer", type=float, default=TARGET_WER)
+    parser.add_argument("--sizes", help="Comma-separated model sizes (default: tiny,base,small)")
+    parser.add_argument("--compute-types", help="Comma-separated compute types (default: int8,float32)")
+    parser.add_argument("--samples", default=SAMPLES_DIR, help="Directory of .wav + .txt pairs")
+    parser.add_argument("--output", default=WHISPER_PROFILE_PATH)
+    args = parser.parse_args()
+
+    space = dict(SEARCH_SPACE)
+    if args.sizes:
+        space["model_size"] = args.sizes.split(",")
+    if args.compute_types:
+        space["compute_type"] = args.compute_types.split(",")
+
+    from resource_manager import ResourceManager
+    whisper_kwargs = ResourceManager().whisper_kwargs()  # Calibrate with the threads the assistant will use
+
+    try:
+        synthesize_missing(args.samples)
+        samples = load_samples(args.samples)
+    except ImportError as e:
+        print(f"[Error] Missing dependency: {e}")
+        raise SystemExit(1)
+    if not samples:
+        print(f"[Error] No samples with transcripts in {args.samples}")
+        raise SystemExit(1)
+
+    print(f"[Tuner] {len(samples)} samples, target WER {args.target_wer:.0%}, threads {whisper_kwargs or 'default'}")
+    best, results = calibrate(samples, space, args.target_wer, whisper_kwargs)
+    if best is None:
+        print("[Error] No configuration could be loaded")
+        raise SystemExit(1)
+
+    save_profile(best, results, args.target_wer, len(samples), args.output, whisper_kwargs)
+    verdict = "meets" if best["meets_target"] else "MISSES"
+    print(f"\n[Tuner] Best: {best['config']} - RTF {best['rtf']:.3f}, WER {best['wer']:.1%} ({verdict} target)")
+    print(f"[Tuner] Saved to {args.output}")
+    print("\n✓ Whisper calibration done!")
@@ -9,6 +9,10 @@ import numpy as np
 import json
 import queue
 
+# Shared helpers live with the new assistant
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "newone"))
+from response_sanitizer import sanitize, LEGACY_PROFILE
+
 # --- PLATFORM DETECTION ---
 CURRENT_OS = platform.system()  # 'Windows', 'Linux', or 'Darwin' (macOS)
 IS_WINDOWS = CURRENT_OS == "Windows"
@@ -160,32 +164,8 @@ def get_chat_response_cli(user_input):
         )
         if result.returncode != 0: return "Sorry, offline."
         
-        # Filter out model artifacts and hallucinations
-        raw_output = result.stdout.strip()
-        
-        # Stop at common hallucination markers
-        stop_markers = ['---', '**', '```', 'NOTE:', 'RULES:', 'Constraints:', 
-                        'You are an', 'You are a', '<|', '>>>', 'Loading']
-        
-        # Take only the first part before any stop marker
-        clean_output = raw_output
-        for marker in stop_markers:
-            if marker in clean_output:
-                clean_output = clean_output.split(marker)[0]
-        
-        # Filter lines
-        output_lines = [line for line in clean_output.split('\n') 
-                        if line.strip() and not line.startswith(('[', '>>>'))]
-        
-        assistant_response_content = ' '.join(output_lines).strip()
-        
-        # Limit response length (prevent runaway responses)
-        if len(assistant_response_content) > 500:
-            # Cut at last complete sentence within limit
-            truncated = assistant_response_content[:500]
-            last_period = truncated.rfind('.')
-            if last_period > 100:
-                assistant_response_content = truncated[:last_period + 1]
+        # Filter out model artifacts and hallucinations (shared single-pass sanitizer)
+        assistant_response_content = sanitize(result.stdout.strip(), LEGACY_PROFILE)
         
         if not assistant_response_content: return "Sorry, no response."
         messages.append({"role": "assistant", "content": assistant_response_content})